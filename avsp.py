@@ -33,12 +33,25 @@
 #         Visual C++
 #     avisynth_c.h (only for x86-64, interface 5, or at least 3 + colorspaces
 #                   from 5, tested with the header used by x264)
+#     NumPy (optional, for the video scopes, comparison metrics and the
+#            display conversion without AviSynth filters)
 # Scripts:
 #     wxp.py (general wxPython framework classes)
 #     avisynth.py (Python AviSynth/AvxSynth wrapper, only for x86-32)
 #     avisynth_cffi.py (Python AviSynth wrapper, only for x86-64)
 #     pyavs.py (AvsP AviSynth support by loading AviSynth directly as a library)
 #     pyavs_avifile.py (AvsP AviSynth support through Windows AVIFile routines)
+#     pyavs_display.py (NumPy RGB conversion for the video preview)
+#     scopes.py (histogram, waveform and vectorscope computation)
+#     metrics.py (PSNR, SSIM and maximum difference between clips)
+#     splice.py (balanced Trim splices for lists of frame ranges)
+#     sweep.py (parallel parameter sweeps over the user sliders)
+#     timecodes.py (frame timestamps of variable frame rate clips)
+#     farm.py (render worker daemon and job dispatcher)
+#     remote.py (remote control protocol of the single instance server)
+#     frameserver.py (yuv4mpeg2 stream of a loaded clip for external programs)
+#     framecache.py (frame caches of the preview)
+#     probes.py (timing of the stages of the preview)
 #     icon.py (icons embedded in a Python script)
 #     i18n.py (internationalization and localization)
 #     global_vars.py (application info and other shared variables)
@@ -113,6 +126,9 @@ except ImportError:
     import builtins
 
 import collections
+import csv
+import multiprocessing
+import weakref
 
 if hasattr(sys,'frozen'):
     programdir = os.path.dirname(sys.executable)
@@ -138,6 +154,14 @@ from wx import stc
 import wx.lib.buttons as wxButtons
 import wx.lib.colourselect as colourselect
 import wxp
+import scopes
+import metrics
+import pyavs_display
+import splice
+import timecodes
+import remote
+import frameserver
+import probes
 
 from icons import AvsP_icon, next_icon, play_icon, pause_icon, external_icon, \
                   skip_icon, spin_icon, ok_icon, smile_icon, question_icon, \
@@ -1236,12 +1260,25 @@ class AvsStyledTextCtrl(stc.StyledTextCtrl):
         return argInfo
 
     def GetFilterCalltipArgInfo(self, word=None, calltip=None, ignore_opt_args=False):
+        '''Return the list of arguments of a filter from its calltip
+
+        Each item is (text, type, name, repeated, optional, info).  Calltips are
+        parsed once, see MainFrame.calltipArgInfo.
+        '''
         if calltip is None:
             # Get the user slider info from the filter's calltip
             try:
                 calltip = self.avsfilterdict[word.lower()][0].split('\n\n')[0]
             except KeyError:
                 return
+        key = calltip, ignore_opt_args
+        argInfo = self.app.calltipArgInfo.get(key)
+        if argInfo is None:
+            argInfo = self.app.calltipArgInfo[key] = tuple(
+                self._ParseFilterCalltip(calltip, ignore_opt_args))
+        return list(argInfo)
+
+    def _ParseFilterCalltip(self, calltip, ignore_opt_args=False):
         # Delete open and close parentheses
         if calltip.startswith('(') and calltip.endswith(')'):
             calltip = calltip[1:-1]
@@ -2894,6 +2931,328 @@ class ScrapWindow(wx.Dialog):
     def write(self, msg):
         self.parent.MacroWriteToScrap(msg)
 
+# Dialog for the video scopes
+class ScopesWindow(wx.Dialog):
+    def __init__(self, parent, title=_('Video scopes'), pos=wx.DefaultPosition, size=(280,600)):
+        style = wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER
+        wx.Dialog.__init__(self, parent, wx.ID_ANY, title, pos, size, style=style)
+        self.parent = parent
+        self.images = {}
+        self.request = None
+        self.requestLock = threading.Lock()
+        self.requestEvent = threading.Event()
+        self.lastRequestTime = 0
+        self.workerThread = None
+        # Scope selection
+        self.scopeLabels = (
+            ('histogram', _('Histogram')),
+            ('waveform', _('Waveform')),
+            ('vectorscope', _('Vectorscope')),
+        )
+        self.checkBoxes = {}
+        checkSizer = wx.BoxSizer(wx.HORIZONTAL)
+        for key, label in self.scopeLabels:
+            checkBox = wx.CheckBox(self, wx.ID_ANY, label)
+            checkBox.SetValue(key in self.parent.options['scopes'])
+            self.Bind(wx.EVT_CHECKBOX, self.OnCheckBox, checkBox)
+            self.checkBoxes[key] = checkBox
+            checkSizer.Add(checkBox, 0, wx.ALL, 3)
+        # Drawing area
+        self.canvas = wx.Window(self, wx.ID_ANY, style=wx.FULL_REPAINT_ON_RESIZE)
+        self.canvas.SetBackgroundColour(wx.BLACK)
+        self.canvas.Bind(wx.EVT_PAINT, self.OnPaint)
+        # Event binding
+        self.Bind(wx.EVT_CLOSE, self.OnClose)
+        # Misc
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(checkSizer, 0, wx.EXPAND)
+        sizer.Add(self.canvas, 1, wx.EXPAND)
+        self.SetSizer(sizer)
+        self.neverShown = True
+
+    def OnClose(self, event):
+        self.Hide()
+
+    def OnCheckBox(self, event):
+        self.parent.options['scopes'] = [key for key, label in self.scopeLabels
+                                         if self.checkBoxes[key].GetValue()]
+        self.UpdateScopes()
+
+    def OnPaint(self, event):
+        dc = wx.PaintDC(self.canvas)
+        keys = [key for key, label in self.scopeLabels
+                if key in self.parent.options['scopes'] and key in self.images]
+        if not keys:
+            return
+        w, h = self.canvas.GetClientSize()
+        totalHeight = sum(self.images[key].GetHeight() for key in keys)
+        y = 0
+        for key in keys:
+            image = self.images[key]
+            height = max(1, image.GetHeight() * h // totalHeight - 2)
+            if key == 'vectorscope':
+                width = height = min(w, height)
+                x = (w - width) // 2
+            else:
+                width, x = w, 0
+            if width > 0:
+                dc.DrawBitmap(image.Scale(width, height).ConvertToBitmap(), x, y)
+            y += height + 2
+
+    def Show(self):
+        if scopes.numpy is None:
+            wx.MessageBox(_('NumPy is required to display the video scopes'),
+                          _('Error'), style=wx.OK|wx.ICON_ERROR)
+            return False
+        if self.neverShown:
+            xp, yp = self.parent.GetPositionTuple()
+            wp, hp = self.parent.GetSizeTuple()
+            wd, hd = wx.ScreenDC().GetSizeTuple()
+            ws, hs = self.GetSizeTuple()
+            self.SetPosition((min(xp+wp-50, wd-ws),-1))
+            self.neverShown = False
+        super(ScopesWindow, self).Show()
+        self.UpdateScopes()
+        return True
+
+    def UpdateScopes(self, script=None, framenum=None):
+        '''Queue the computation of the scopes for a frame
+
+        Only the source planes are copied on the main thread, the scopes are
+        computed on a worker thread.  A pending request is replaced by newer
+        ones, and requests are rate-limited while playing the video.
+        '''
+        if not self.IsShown():
+            return
+        if script is None:
+            script = self.parent.currentScript
+        if framenum is None:
+            framenum = self.parent.GetFrameNumber()
+        if script.AVI is None:
+            return
+        if self.parent.playing_video:
+            interval = self.parent.options['scopesplayinterval'] / 1000.0
+            if time.time() - self.lastRequestTime < interval:
+                return
+        planes = script.AVI.GetPlanes(framenum)
+        if planes is None:
+            return
+        self.lastRequestTime = time.time()
+        with self.requestLock:
+            self.request = (planes, script.AVI.BitsPerComponent, script.AVI.IsRGB,
+                            script.AVI.matrix, self.parent.options['scopes'][:])
+            self.requestEvent.set()
+        if self.workerThread is None:
+            self.workerThread = threading.Thread(target=self.ScopesWorker, name='ScopesWorker')
+            self.workerThread.daemon = True
+            self.workerThread.start()
+
+    def ScopesWorker(self):
+        while True:
+            self.requestEvent.wait()
+            with self.requestLock:
+                request, self.request = self.request, None
+                self.requestEvent.clear()
+            if request is None:
+                continue
+            try:
+                arrays = scopes.ComputeScopes(*request)
+            except Exception:
+                traceback.print_exc()
+                continue
+            wx.CallAfter(self.SetImages, arrays)
+
+    def SetImages(self, arrays):
+        if not self:
+            return
+        for key, array in arrays.items():
+            height, width = array.shape[:2]
+            self.images[key] = wx.ImageFromData(width, height, array.tostring())
+        self.canvas.Refresh()
+
+# Dialog for comparing the tabs of a group
+class MetricsDialog(wx.Dialog):
+    def __init__(self, parent, tabs, scripts, names, offsets):
+        style = wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER
+        wx.Dialog.__init__(self, parent, wx.ID_ANY, _('Compare tabs'), size=(640, 480), style=style)
+        self.parent = parent
+        self.tabs = tabs
+        self.scripts = scripts
+        self.offsets = offsets
+        self.rows = []
+        self.sortColumn = 0
+        self.sortReverse = False
+        self.stopEvent = threading.Event()
+        self.thread = None
+        # Columns: frame, then psnr, ssim and max diff for every compared tab
+        self.columns = [_('Frame')]
+        for name in names[1:]:
+            self.columns.extend((u'PSNR {0}'.format(name), u'SSIM {0}'.format(name),
+                                 _('Max diff {0}').format(name)))
+        # Range and processes
+        self.rangeRadioBox = wx.RadioBox(self, wx.ID_ANY, _('Range'),
+                                         choices=[_('Whole clip'), _('Selections')])
+        if not parent.GetSliderSelections(parent.invertSelection):
+            self.rangeRadioBox.EnableItem(1, False)
+        processesLabel = wx.StaticText(self, wx.ID_ANY, _('Processes'))
+        self.processesCtrl = wx.SpinCtrl(self, wx.ID_ANY, size=(60, -1), min=1, max=64,
+                                         initial=multiprocessing.cpu_count())
+        # Results table
+        dlg = self
+        class VListCtrl(wxp.ListCtrl):
+            def OnGetItemText(self, item, column):
+                frame, results = dlg.rows[item]
+                if column == 0:
+                    return str(frame)
+                result = results[(column - 1) // 3]
+                if result is None:
+                    return '-'
+                value = result[(column - 1) % 3]
+                if isinstance(value, float):
+                    return '%.4f' % value if column % 3 == 2 else '%.2f' % value
+                return str(value)
+        self.listCtrl = VListCtrl(self, wx.ID_ANY, style=wx.LC_REPORT|wx.LC_SINGLE_SEL|wx.LC_VIRTUAL|wx.LC_HRULES|wx.LC_VRULES)
+        for i, label in enumerate(self.columns):
+            self.listCtrl.InsertColumn(i, label, wx.LIST_FORMAT_RIGHT)
+            self.listCtrl.SetColumnWidth(i, wx.LIST_AUTOSIZE_USEHEADER)
+        self.listCtrl.Bind(wx.EVT_LIST_ITEM_ACTIVATED, self.OnListCtrlActivated)
+        self.listCtrl.Bind(wx.EVT_LIST_COL_CLICK, self.OnListCtrlColClick)
+        self.statusText = wx.StaticText(self, wx.ID_ANY, '')
+        # Buttons
+        self.runButton = wx.Button(self, wx.ID_ANY, _('Run'))
+        self.Bind(wx.EVT_BUTTON, self.OnButtonRun, self.runButton)
+        exportButton = wx.Button(self, wx.ID_ANY, _('Export CSV...'))
+        self.Bind(wx.EVT_BUTTON, self.OnButtonExport, exportButton)
+        closeButton = wx.Button(self, wx.ID_CANCEL, _('Close'))
+        self.Bind(wx.EVT_BUTTON, self.OnClose, closeButton)
+        self.Bind(wx.EVT_CLOSE, self.OnClose)
+        # Size the elements
+        topSizer = wx.BoxSizer(wx.HORIZONTAL)
+        topSizer.Add(self.rangeRadioBox, 0, wx.ALL, 5)
+        topSizer.Add(processesLabel, 0, wx.ALIGN_CENTER_VERTICAL|wx.LEFT, 10)
+        topSizer.Add(self.processesCtrl, 0, wx.ALIGN_CENTER_VERTICAL|wx.ALL, 5)
+        buttonSizer = wx.BoxSizer(wx.HORIZONTAL)
+        buttonSizer.Add(self.runButton, 0, wx.ALL, 5)
+        buttonSizer.Add(exportButton, 0, wx.ALL, 5)
+        buttonSizer.Add((-1, -1), 1)
+        buttonSizer.Add(closeButton, 0, wx.ALL, 5)
+        dlgSizer = wx.BoxSizer(wx.VERTICAL)
+        dlgSizer.Add(topSizer, 0, wx.EXPAND)
+        dlgSizer.Add(self.listCtrl, 1, wx.EXPAND|wx.ALL, 5)
+        dlgSizer.Add(self.statusText, 0, wx.EXPAND|wx.LEFT|wx.RIGHT, 5)
+        dlgSizer.Add(buttonSizer, 0, wx.EXPAND|wx.ALL, 5)
+        self.SetSizer(dlgSizer)
+
+    def GetFrameList(self):
+        if self.rangeRadioBox.GetSelection() == 1:
+            frames = []
+            for start, end in self.parent.GetSliderSelections(self.parent.invertSelection):
+                frames.extend(xrange(start, end + 1))
+            return frames
+        return range(self.parent.currentScript.AVI.Framecount)
+
+    def OnButtonRun(self, event):
+        if self.thread is not None:
+            self.stopEvent.set()
+            return
+        frames = self.GetFrameList()
+        self.rows = []
+        self.listCtrl.SetItemCount(0)
+        self.stopEvent.clear()
+        self.runButton.SetLabel(_('Stop'))
+        self.statusText.SetLabel(_('Comparing {0} frames...').format(len(frames)))
+        options = {'errormessagefont': self.parent.options['errormessagefont']}
+        args = (self.scripts, self.offsets, frames, self.processesCtrl.GetValue())
+        kwargs = dict(library_dir=global_vars.avisynth_library_dir, options=options)
+        self.thread = threading.Thread(target=self.CompareThread, args=args, kwargs=kwargs)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def CompareThread(self, scripts, offsets, frames, processes, **kwargs):
+        total = len(frames)
+        rows = []
+        lastUpdate = time.time()
+        error = None
+        results = metrics.CompareClips(scripts, offsets, frames, processes, **kwargs)
+        try:
+            for row in results:
+                rows.append(row)
+                if self.stopEvent.is_set():
+                    break
+                if time.time() - lastUpdate > 0.25:
+                    wx.CallAfter(self.AddRows, rows, total)
+                    rows = []
+                    lastUpdate = time.time()
+        except Exception as err:
+            error = err
+        finally:
+            results.close()
+        wx.CallAfter(self.AddRows, rows, total, True, error)
+
+    def AddRows(self, rows, total, done=False, error=None):
+        if not self:
+            return
+        self.rows.extend(rows)
+        self.SortRows()
+        if done:
+            self.thread = None
+            self.runButton.SetLabel(_('Run'))
+            if error is not None:
+                self.statusText.SetLabel(_('Error: {0}').format(error))
+                return
+        self.statusText.SetLabel(_('{0} of {1} frames compared').format(len(self.rows), total))
+
+    def SortRows(self):
+        column = self.sortColumn
+        if column == 0:
+            key = lambda row: row[0]
+        else:
+            i, j = divmod(column - 1, 3)
+            key = lambda row: (row[1][i] is not None, row[1][i] and row[1][i][j])
+        self.rows.sort(key=key, reverse=self.sortReverse)
+        self.listCtrl.SetItemCount(len(self.rows))
+        self.listCtrl.Refresh()
+
+    def OnListCtrlColClick(self, event):
+        column = event.GetColumn()
+        if column == self.sortColumn:
+            self.sortReverse = not self.sortReverse
+        else:
+            self.sortColumn = column
+            # Worst frames first: lowest PSNR and SSIM, highest difference
+            self.sortReverse = column > 0 and column % 3 == 0
+        self.SortRows()
+
+    def OnListCtrlActivated(self, event):
+        frame = self.rows[event.GetIndex()][0]
+        script = self.parent.currentScript
+        if script in self.tabs:
+            frame += self.offsets[self.tabs.index(script)]
+        self.parent.ShowVideoFrame(frame)
+
+    def OnButtonExport(self, event):
+        filefilter = _('CSV files') + ' (*.csv)|*.csv|' + _('All files') + ' (*.*)|*.*'
+        initialdir = self.parent.GetProposedPath(only='dir')
+        dlg = wx.FileDialog(self, _('Export comparison results'), initialdir, '',
+                            filefilter, wx.SAVE | wx.OVERWRITE_PROMPT)
+        ID = dlg.ShowModal()
+        if ID == wx.ID_OK:
+            filename = dlg.GetPath()
+            with open(filename, 'wb') as f:
+                writer = csv.writer(f)
+                writer.writerow([label.encode('utf-8') for label in self.columns])
+                for frame, results in sorted(self.rows):
+                    row = [frame]
+                    for result in results:
+                        row.extend(result if result is not None else ('', '', ''))
+                    writer.writerow(row)
+            self.parent.options['recentdir'] = os.path.dirname(filename)
+        dlg.Destroy()
+
+    def OnClose(self, event):
+        self.stopEvent.set()
+        self.Destroy()
+
 # Make safe calls to the main thread from other threads
 # Adapted from <http://thread.gmane.org/gmane.comp.python.wxpython/54892/focus=55223>
 class AsyncCall:
@@ -4378,6 +4737,9 @@ class SliderPlus(wx.Panel):
             self.wH += 4
         self.selections = None
         self.selmode = 0
+        self.filled = None
+        self.heatmap = None
+        self.heatmapColumns = None
         self._DefineBrushes()
         # Event binding
         self.Bind(wx.EVT_PAINT, self._OnPaint)
@@ -4558,6 +4920,21 @@ class SliderPlus(wx.Panel):
                 pixelstart = int(start * wB / float(self.maxValue - self.minValue)) + self.xo
                 pixelstop = int(stop * wB / float(self.maxValue - self.minValue)) + self.xo
                 dc.DrawRectangle(pixelstart, yB, pixelstop - pixelstart, hB)
+        # Then the frames rendered ahead, as a strip at the bottom of the bar
+        if self.filled:
+            color = wx.Colour(40,170,60) if boolEnabled else wx.Colour(180,220,190)
+            dc.SetPen(wx.Pen(color))
+            dc.SetBrush(wx.Brush(color))
+            hF = max(2, hB / 4)
+            for start, stop in self.filled:
+                start = min(max(start, self.minValue), self.maxValue)
+                stop = min(max(stop, self.minValue), self.maxValue)
+                pixelstart = int(start * wB / float(self.maxValue - self.minValue)) + self.xo
+                pixelstop = int(stop * wB / float(self.maxValue - self.minValue)) + self.xo
+                dc.DrawRectangle(pixelstart, yB + hB - hF, max(1, pixelstop - pixelstart), hF)
+        # Then the render time of the frames, as a strip at the top of the bar
+        if self.heatmap is not None:
+            self._PaintHeatmap(dc, xB, yB, wB, max(2, hB / 4), boolEnabled)
         # Then draw the bookmark triangles
         dc.SetPen(self.penWindowBackground)
         if boolEnabled:
@@ -4807,6 +5184,101 @@ class SliderPlus(wx.Panel):
         else:
             return self.selections
 
+    def SetFilled(self, ranges, refresh=True):
+        '''Show a list of (start, stop) ranges as rendered ahead'''
+        ranges = list(ranges) if ranges else None
+        if ranges == self.filled:
+            return False
+        self.filled = ranges
+        if refresh:
+            if self.IsDoubleBuffered():
+                dc = wx.ClientDC(self)
+            else:
+                dc = wx.BufferedDC(wx.ClientDC(self))
+            dc.Clear()
+            self._PaintSlider(dc)
+        return True
+
+    # Colors of the render time relative to the slowest frame, by halves:
+    # < 1/16, < 1/8, < 1/4, < 1/2 and the slowest half
+    heatmapColors = ((255,235,150), (255,200,90), (250,150,50), (235,90,30), (200,20,20))
+
+    def _GetHeatmapColumns(self, wB):
+        '''Return the highest render time of the frames under each pixel of the bar'''
+        key = (wB, self.minValue, self.maxValue, len(self.heatmap))
+        if self.heatmapColumns is None or self.heatmapColumns[0] != key:
+            columns = array.array('H', [0]) * (wB + 1)
+            scale = wB / float(max(1, self.maxValue - self.minValue))
+            for frame, cost in enumerate(self.heatmap):
+                if cost and self.minValue <= frame <= self.maxValue:
+                    pixel = int((frame - self.minValue) * scale)
+                    if cost > columns[pixel]:
+                        columns[pixel] = cost
+            self.heatmapColumns = [key, columns, max(columns) if columns else 0, None]
+        return self.heatmapColumns
+
+    def _PaintHeatmap(self, dc, xB, yB, wB, hF, boolEnabled):
+        item = self._GetHeatmapColumns(wB)
+        key, columns, maxcost, levels = item
+        if not maxcost:
+            return
+        colors = self.heatmapColors
+        if not boolEnabled:
+            colors = [((r + 510) / 3, (g + 510) / 3, (b + 510) / 3) for r, g, b in colors]
+        if levels is None:
+            levels = item[3] = [0 if not cost else len(colors) - min(len(colors),
+                                int(math.log(maxcost / float(cost), 2)) + 1) + 1
+                                for cost in columns]
+        # Draw the runs of pixels of the same level together
+        pixel = 0
+        while pixel < len(levels):
+            level = levels[pixel]
+            end = pixel + 1
+            while end < len(levels) and levels[end] == level:
+                end += 1
+            if level:
+                color = wx.Colour(*colors[level - 1])
+                dc.SetPen(wx.Pen(color))
+                dc.SetBrush(wx.Brush(color))
+                dc.DrawRectangle(xB + pixel, yB, end - pixel, hF)
+            pixel = end
+
+    def _RefreshSlider(self):
+        if self.IsDoubleBuffered():
+            dc = wx.ClientDC(self)
+        else:
+            dc = wx.BufferedDC(wx.ClientDC(self))
+        dc.Clear()
+        self._PaintSlider(dc)
+
+    def SetHeatmap(self, costs, refresh=True):
+        '''Show the render time of every frame, a sequence of numbers with 0
+        for the frames not measured.  None hides the heatmap'''
+        if costs is None and self.heatmap is None:
+            return False
+        self.heatmap = costs
+        self.heatmapColumns = None
+        if refresh:
+            self._RefreshSlider()
+        return True
+
+    def UpdateHeatmap(self, frame, refresh=True):
+        '''Update the heatmap after the render time of a frame changed'''
+        if self.heatmap is None or not self.minValue <= frame <= self.maxValue:
+            return False
+        if self.heatmapColumns is not None:
+            key, columns, maxcost, levels = self.heatmapColumns
+            cost = self.heatmap[frame]
+            pixel = int((frame - self.minValue) * key[0] / float(max(1, self.maxValue - self.minValue)))
+            if cost <= columns[pixel]:
+                return False
+            columns[pixel] = cost
+            self.heatmapColumns[2] = max(maxcost, cost)
+            self.heatmapColumns[3] = None
+        if refresh:
+            self._RefreshSlider()
+        return True
+
     def ToggleSelectionMode(self, mode=0):
         if self.selmode == 0 or mode == 1:
             self.selmode = 1
@@ -5063,27 +5535,29 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         self.port = 50009
         self.instance = wx.SingleInstanceChecker(title+wx.GetUserId())
         self.boolSingleInstance = self.options.setdefault('singleinstance', False)
-        if self.boolSingleInstance:
-            if self.instance.IsAnotherRunning():
-                # Send data to the main instance via socket
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.connect(('localhost', self.port))
-                pickledstring = StringIO.StringIO()
-                cPickle.dump(sys.argv[1:],pickledstring)
-                sock.sendall(pickledstring.getvalue())
-                response = sock.recv(8192)
-                self.Destroy()
-                return None
-            else:
-                def OnArgs(evt):
-                    self.ProcessArguments(evt.data)
-                self.Bind(wxp.EVT_POST_ARGS, OnArgs)
-                # Start socket server (in a separate thread) to receive arguments from other instances
-                self.argsPosterThread = wxp.ArgsPosterThread(self)
-                self.argsPosterThread.Start()
-        else:
-            if self.instance.IsAnotherRunning():
-                self.options['exitstatus'] = 0
+        remoteAddress = self.options.setdefault('remoteaddress', '').strip() or ('localhost', self.port)
+        if self.boolSingleInstance and self.instance.IsAnotherRunning():
+            # Send data to the main instance via socket
+            try:
+                client = remote.RemoteClient(remoteAddress, timeout=remote.COMMAND_TIMEOUT)
+                client.Call('args', *[arg.decode(sys.stdin.encoding or encoding)
+                                      for arg in sys.argv[1:]])
+                client.Close()
+            except (remote.RemoteError, remote.FarmError, socket.error):
+                pass
+            self.Destroy()
+            return None
+        if not self.boolSingleInstance and self.instance.IsAnotherRunning():
+            self.options['exitstatus'] = 0
+        self.argsPosterThread = None
+        if self.boolSingleInstance or self.options.setdefault('remotecontrol', False):
+            def OnArgs(evt):
+                self.ProcessArguments(evt.data)
+            self.Bind(wxp.EVT_POST_ARGS, OnArgs)
+            # Start socket server (in a separate thread) to receive arguments from other
+            # instances and the commands of remote control clients
+            self.argsPosterThread = wxp.ArgsPosterThread(self, remoteAddress)
+            self.argsPosterThread.Start()
 
         # Program size and position options
         self.separatevideowindow = self.options['separatevideowindow']
@@ -5209,9 +5683,23 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         # Create all the program's controls and dialogs
         self.NewFileName = _('New File')
         self.scrapWindow = ScrapWindow(self)
+        self.scopesWindow = ScopesWindow(self)
         self.bookmarkDict = {}
         self.recentframes = []
         self.bmpVideo = None
+        self.videoRender = None
+        self.tabBitmaps = collections.OrderedDict()
+        self.clipCache = collections.OrderedDict()
+        self.diskFrameCache = None
+        self.timestampPasses = {} # source key -> threading.Event stopping the pass
+        self.timestampIndexes = collections.OrderedDict() # source key -> built index
+        self.frameServers = []
+        probes.Enable(self.options['timingprobes'])
+        self.renderAheadThread = None
+        self.renderAheadPainted = 0
+        self.userSliderCall = None
+        self.userSliderPending = None
+        self.draftPreview = False
         self.createWindowElements()
         if not __debug__:
             sys.stdout = self.scrapWindow
@@ -5245,6 +5733,8 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         self.saveViewPos = False        # GPo, keep view XY and zoom for each script
         self.play_speed_factor = 1.0
         self.play_drop = False          # GPo 2018 change to False
+        self.play_buffered = False
+        self.play_last_frame = 0
         self.playing_video = False
         self.getPixelInfo = False
         self.sliderOpenString = '[<'
@@ -5446,6 +5936,8 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         self.ReloadModifiedScripts()
         self.scriptNotebook.SetSelection(index)
         self.currentScript.SetFocus()
+        # Run the encode queue of the last session unattended
+        wx.CallAfter(self.ResumeEncodeQueue)
 
         # Warn if option files are damaged
         if self.loaderror:
@@ -5566,7 +6058,8 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             first = True
             self.HidePreviewWindow()
             for arg in args:
-                arg = arg.decode(sys.stdin.encoding or encoding)
+                if not isinstance(arg, unicode):
+                    arg = arg.decode(sys.stdin.encoding or encoding)
                 if os.path.isfile(arg):
                     if os.path.dirname(arg) == '':
                         arg = os.path.join(self.initialworkdir, arg)
@@ -5595,6 +6088,63 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                         wx.CallAfter(self.ShowVideoFrame, self.startupframe)
 ### GPo end ###
 
+    def RemoteCommand(self, command, args):
+        '''Run a command of a remote control client, see remote.py
+
+        Called from the server threads, the command runs in the main thread.
+        '''
+        commands = {'open': self.RemoteOpen, 'seek': self.MacroShowVideoFrame,
+                    'frame': self.GetFrameNumber, 'info': self.RemoteInfo,
+                    'bookmarks': self.RemoteBookmarks, 'setbookmarks': self.RemoteSetBookmarks}
+        if command not in commands:
+            raise remote.RemoteError('Unknown command: {0}'.format(command))
+        call = AsyncCall(commands[command], *args)
+        if not call.complete.wait(remote.COMMAND_TIMEOUT):
+            raise remote.RemoteError('Timeout, the program is busy')
+        return call.Wait()
+
+    def RemoteOpen(self, filename):
+        if not os.path.isfile(filename):
+            raise remote.RemoteError('File not found: {0}'.format(filename))
+        self.OpenFile(filename=filename)
+        return self.scriptNotebook.GetSelection()
+
+    def RemoteInfo(self, frame=None, index=None):
+        script, index = self.getScriptAtIndex(index)
+        if script is None:
+            raise remote.RemoteError('Invalid tab index')
+        if self.UpdateScriptAVI(script) is None:
+            raise remote.RemoteError('Error loading the script')
+        if frame is None:
+            frame = self.GetFrameNumber()
+        avi = script.AVI
+        return dict(index=index, filename=script.filename, frame=frame,
+                    time=self.GetTimestamps(script).FrameTime(frame) / 1000.0,
+                    framecount=avi.Framecount, framerate=avi.Framerate,
+                    width=avi.Width, height=avi.Height,
+                    error=avi.IsErrorClip())
+
+    def RemoteBookmarks(self):
+        return sorted([frame, self.bookmarkDict.get(frame, '')] for frame, bmtype in
+                      self.GetBookmarkFrameList().items() if bmtype == 0)
+
+    def RemoteSetBookmarks(self, frames, replace=False):
+        '''Add bookmarks (frame or [frame, title]) without toggling existing ones'''
+        if replace:
+            self.DeleteAllFrameBookmarks(bmtype=0)
+        for item in frames:
+            if isinstance(item, (list, tuple)):
+                frame, title = int(item[0]), item[1].strip()
+                if title:
+                    self.bookmarkDict[frame] = title
+                else:
+                    self.bookmarkDict.pop(frame, None)
+            else:
+                frame = int(item)
+            self.AddFrameBookmark(frame, 0, toggle=False, refreshProgram=False)
+        self.UpdateBookmarkMenu()
+        return self.RemoteBookmarks()
+
     def getOptionsDict(self):
         oldOptions = None
         if os.path.isfile(self.optionsfilename):
@@ -5894,6 +6444,7 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             'alwaysworkdir': False,
             'externalplayer': '',
             'externalplayerargs': '',
+            'externalplayerserve': False,
             'docsearchpaths': ';'.join(['%pluginsdir%',
                     os.path.join('%avisynthdir%' if os.name == 'nt'
                         else '/usr/local/share', 'docs', 'english', 'corefilters'),
@@ -5952,6 +6503,26 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             'enableframepertab_same': True,
             'applygroupoffsets': True,
             'offsetbookmarks': False,
+            'scopes': list(scopes.SCOPES),
+            'scopesplayinterval': 200,
+            'numpydisplay': True,
+            'zoominterpolation': 'nearest',
+            'proxypreview': True,
+            'tabbitmapcache': 256,
+            'timingprobes': False,
+            'timinghud': False,
+            'clipcachecount': 8,
+            'clipcachememory': 512,
+            'diskframecache': False,
+            'diskframecachesize': 4096,
+            'diskframecachedir': '',
+            'renderaheadmemory': 1024,
+            'renderheatmap': False,
+            'prefetchthreads': 0,
+            'prefetchmaxthreads': 0,
+            'sliderdragupdate': True,
+            'sliderdragdelay': 150,
+            'timestampindex': False,
             # AUTOSLIDER OPTIONS
             'keepsliderwindowhidden': False,
             'autoslideron': True,
@@ -5991,6 +6562,8 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             'alwaysontop': False,
             'previewalwaysontop': False,
             'singleinstance': False,
+            'remotecontrol': False,
+            'remoteaddress': '',
             'usemonospacedfont': False,
             'disablepreview': False,
             'paranoiamode': False,
@@ -6344,6 +6917,11 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         f.close()
 
     def defineScriptFilterInfo(self):
+        # Parsed calltips, by calltip text: {(calltip, ignore_opt_args): argInfo}
+        # and {argument info: (schema, uses_script_value)}.  Kept until the
+        # filter database is defined again
+        self.calltipArgInfo = {}
+        self.calltipArgSchema = {}
         # Create the basic filter dictionnary - {lowername: (args, style_constant)}
         styleList = [  # order is important here!
             AvsStyledTextCtrl.STC_AVS_COREFILTER,
@@ -6701,6 +7279,7 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                 ((_('Working directory:'), wxp.OPT_ELEM_DIR, 'workdir', _('Specify an alternative working directory'), dict(buttonText='...', buttonWidth=30) ), ),
                 ((_('External player:'), wxp.OPT_ELEM_FILE, 'externalplayer', _('Location of external program for script playback'), dict(fileMask=(_('Executable files') + ' (*.exe)|*.exe|' if os.name == 'nt' else '') + _('All files') + ' (*.*)|*.*', buttonText='...', buttonWidth=30) ), ),
                 ((_('External player extra args:'), wxp.OPT_ELEM_STRING, 'externalplayerargs', _('Additional arguments when running the external player'), dict() ), ),
+                ((_('Serve the frames to the external player'), wxp.OPT_ELEM_CHECK, 'externalplayerserve', _('Pass a yuv4mpeg2 stream of the clip already loaded instead of the script (a FIFO, or a localhost TCP URL on Windows), so the player does not evaluate the script again. The player must accept y4m input'), dict() ), ),
                 ((_('Avisynth help file/url:'), wxp.OPT_ELEM_FILE_URL, 'avisynthhelpfile', _('Location of the avisynth help file or url'), dict(buttonText='...', buttonWidth=30) ), ),
                 ((_('Documentation search paths:'), wxp.OPT_ELEM_STRING, 'docsearchpaths', _('Specify which directories to search for docs when you click on a filter calltip'), dict() ), ),
                 ((_('Documentation search url:'), wxp.OPT_ELEM_STRING, 'docsearchurl', _("The web address to search if docs aren't found (the filter's name replaces %filtername%)"), dict() ), ),
@@ -6745,6 +7324,22 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                 ((_('Allow AvsPmod to resize the window'), wxp.OPT_ELEM_CHECK, 'allowresize', _('Allow AvsPmod to resize and/or move the program window when updating the video preview'), dict() ), ),
                 ((_('Separate video preview window')+' *', wxp.OPT_ELEM_CHECK, 'separatevideowindow', _('Use a separate window for the video preview'), dict() ), ),
                 ((_('Keep it on top of the main window')+' *', wxp.OPT_ELEM_CHECK, 'previewontopofmain', _('Keep the video preview window always on top of the main one and link its visibility'), dict(ident=20) ), ),
+                ((_('Convert to RGB for display with NumPy'), wxp.OPT_ELEM_CHECK, 'numpydisplay', _('Convert the frames for the video preview directly from the source planes instead of with AviSynth filters. Changing the matrix is instant and every bit depth is displayed without plugins. Requires NumPy'), dict() ), ),
+                ((_('Zoom interpolation'), wxp.OPT_ELEM_RADIO, 'zoominterpolation', _('Resizing method used for the zoomed video preview. Only the visible part of the frame is resized. Requires NumPy'), dict(choices=[(_('Nearest neighbour'), 'nearest'),(_('Bilinear'), 'bilinear')]) ), ),
+                ((_('Reduced resolution when zoomed out'), wxp.OPT_ELEM_CHECK, 'proxypreview', _('Below 50% zoom, copy and convert only the samples needed for the zoom level instead of the whole frame. The script is still rendered at full resolution, and frames read from the disk cache or in interleaved formats are copied whole. Saved images and zoom levels of 50% or more use the full resolution. Requires the NumPy display conversion'), dict() ), ),
+                ((_('Memory for the last frame of each tab (MB)'), wxp.OPT_ELEM_SPIN, 'tabbitmapcache', _('Keep the last frame shown on each tab to display it immediately when switching back to it. 0 to disable'), dict(min_val=0, max_val=65536) ), ),
+                ((_('Evaluated scripts to keep'), wxp.OPT_ELEM_SPIN, 'clipcachecount', _('Keep the last evaluated versions of the scripts, so going back to one of them (undo, toggle tags, sliders) is instant. Refreshing the preview evaluates the script again. 0 to disable'), dict(min_val=0, max_val=100) ), ),
+                ((_('Memory for evaluated scripts (MB)'), wxp.OPT_ELEM_SPIN, 'clipcachememory', _('Approximate memory limit for the kept evaluated scripts. A kept script with its own AviSynth environment has its frame cache limited (SetMemoryMax) to its share of this memory, counted with its current frame. The memory of the source decoders is not counted'), dict(min_val=0, max_val=65536, ident=20) ), ),
+                ((_('Keep the frames shown on disk'), wxp.OPT_ELEM_CHECK, 'diskframecache', _('Store the source frames shown, compressed, to show them without rendering when the same script is opened again, also in later sessions. Frames are reused while the script text and the files it names are unchanged. Refreshing the preview discards them. Requires the NumPy display conversion'), dict() ), ),
+                ((_('Disk space for the frames (MB)'), wxp.OPT_ELEM_SPIN, 'diskframecachesize', _('The least recently shown frames are deleted beyond this size'), dict(min_val=16, max_val=1048576, ident=20) ), ),
+                ((_('Frame cache directory:'), wxp.OPT_ELEM_DIR, 'diskframecachedir', _('Leave blank to use the framecache folder in the program directory'), dict(buttonText='...', buttonWidth=30, ident=20) ), ),
+                ((_('Memory for rendering ahead (MB)'), wxp.OPT_ELEM_SPIN, 'renderaheadmemory', _('Ranges rendered ahead for playback that need more memory are kept in a temporary file'), dict(min_val=0, max_val=65536) ), ),
+                ((_('Prefetch threads for new tabs (AviSynth+)'), wxp.OPT_ELEM_SPIN, 'prefetchthreads', _('Append Prefetch with this number of threads to the clip evaluated for the preview, without changing the script text. 0 to evaluate the scripts as written. It can be changed for each tab in the Video menu'), dict(min_val=0, max_val=256) ), ),
+                ((_('Maximum threads of the benchmark'), wxp.OPT_ELEM_SPIN, 'prefetchmaxthreads', _('The multithreading benchmark measures the frame rate from 1 thread up to this number. 0 for the number of processors'), dict(min_val=0, max_val=256, ident=20) ), ),
+                ((_('Update video while dragging user sliders'), wxp.OPT_ELEM_CHECK, 'sliderdragupdate', _('Update the preview while dragging a user slider, only for the latest value. The script is evaluated and rendered at full resolution; with the NumPy display conversion only one sample out of four is converted. The full quality preview is shown on release'), dict() ), ),
+                ((_('User slider update delay (ms)'), wxp.OPT_ELEM_SPIN, 'sliderdragdelay', _('Time to wait while dragging a user slider before evaluating the script. Intermediate values are skipped'), dict(min_val=0, max_val=5000, ident=20) ), ),
+                ((_('Index the frame times of variable frame rate sources'), wxp.OPT_ELEM_CHECK, 'timestampindex', _('Read the time of every frame of FFMS2 sources in a background process, for the status bar, the bookmark times and the chapter macros. The process renders the whole script once per source, the index is reused while the script file and its sources are unchanged'), dict() ), ),
+                ((_('Scopes update interval while playing (ms)'), wxp.OPT_ELEM_SPIN, 'scopesplayinterval', _('Minimum time between two updates of the video scopes window during playback'), dict(min_val=0, max_val=10000) ), ),
                 ((_('Min text lines on video preview'), wxp.OPT_ELEM_SPIN, 'mintextlines', _('Minimum number of lines to show when displaying the video preview'), dict(min_val=0) ), ),
                 ((_('Customize video status bar...'), wxp.OPT_ELEM_BUTTON, 'videostatusbarinfo', _('Customize the video information shown in the program status bar'), dict(handler=self.OnConfigureVideoStatusBarMessage) ), ),
                 ((_('Error message font...'), wxp.OPT_ELEM_BUTTON, 'errormessagefont', _('Set the font used for displaying the error if evaluating the script fails'), dict(handler=self.OnConfigureErrorFont) ), ),    # GPo, change to Button
@@ -6791,6 +7386,8 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                 ((_('On first script load bookmarks from script'), wxp.OPT_ELEM_CHECK, 'bookmarksfromscript', _('Automatically load bookmarks from script only if tab count 1'), dict() ), ),
                 ((_('Tabs changing load bookmarks from script'), wxp.OPT_ELEM_CHECK, 'tabsbookmarksfromscript', _('Automatically load bookmarks from script if tab changed'), dict() ), ),
                 ((_('Only allow a single instance of AvsPmod')+' *', wxp.OPT_ELEM_CHECK, 'singleinstance', _('Only allow a single instance of AvsPmod'), dict() ), ),
+                ((_('Allow remote control')+' *', wxp.OPT_ELEM_CHECK, 'remotecontrol', _('Accept commands from other programs (open, seek, frame info, bookmarks), see remote.py'), dict() ), ),
+                ((_('Remote control address:')+' *', wxp.OPT_ELEM_STRING, 'remoteaddress', _('HOST:PORT or the path of a Unix socket for the single instance and remote control server. Empty for localhost:50009'), dict() ), ),
                 ((_('Show warning for bad plugin naming at startup'), wxp.OPT_ELEM_CHECK, 'dllnamewarning', _('Show warning at startup if there are dlls with bad naming in default plugin folder'), dict() ), ),
                 ((_('Max number of recent filenames'), wxp.OPT_ELEM_SPIN, 'nrecentfiles', _('This number determines how many filenames to store in the recent files menu'), dict(min_val=0) ), ),
                 ((_('Custom jump size:'), wxp.OPT_ELEM_SPIN, 'customjump', _('Jump size used in video menu'), dict(min_val=0) ), ),
@@ -7391,6 +7988,9 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                     (_('Offset also bookmarks'), '', self.OnMenuVideoGroupOffsetBookmarks,
                         _('Apply the offset also to the currently set bookmarks'),
                         wx.ITEM_CHECK, self.options['offsetbookmarks']),
+                    (''),
+                    (_('Compare tabs in group...'), '', self.OnMenuVideoGroupCompare,
+                        _('Compute PSNR, SSIM and maximum difference per frame between the current tab and the other tabs of its group')),
                     ),
                 ),
                 (_('&Navigate'),
@@ -7427,6 +8027,9 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                     (_('Maximum speed'), 'Shift+Numpad *', self.OnMenuVideoPlayMax, _('Play the video as fast as possible without dropping frames')),
                     (''),
                     (_('Drop frames'), 'Shift+Numpad .', self.OnMenuVideoPlayDropFrames, _('Maintain correct video speed by skipping frames'), wx.ITEM_CHECK, False),
+                    (''),
+                    (_('Render ahead'), '', self.OnMenuVideoRenderAhead, _('Render the trim selections, or the frames between the bookmarks around the current frame, to play them at the exact frame rate')),
+                    (_('Clear rendered frames'), '', self.OnMenuVideoRenderAheadClear, _('Stop rendering ahead and free the frames rendered')),
                     ),
                 ),
                 (''),
@@ -7520,6 +8123,27 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                 (_('External player'), 'F6', self.OnMenuVideoExternalPlayer, _('Play the current script in an external program')),
                 (''),
                 (_('Video information'), '', self.OnMenuVideoInfo, _('Show information about the video in a dialog box')),
+                (_('Toggle scopes window'), '', self.OnMenuVideoShowScopesWindow, _('Show the histogram, waveform and vectorscope of the current frame')),
+                (_('&Timings'),
+                    (
+                    (_('Record timings'), '', self.OnMenuVideoTimingsRecord, _('Measure the time taken by the evaluation, the frame requests and the painting of the preview'), wx.ITEM_CHECK, self.options['timingprobes']),
+                    (_('Show timings on the preview'), '', self.OnMenuVideoTimingsHUD, _('Show the last and average time of each stage over the video preview'), wx.ITEM_CHECK, self.options['timinghud']),
+                    (''),
+                    (_('Save timings...'), '', self.OnMenuVideoTimingsSave, _('Save the summary and the recorded times to a text file')),
+                    (_('Clear timings'), '', self.OnMenuVideoTimingsClear, _('Discard the recorded times')),
+                    (''),
+                    (_('Render time heatmap'), '', self.OnMenuVideoRenderHeatmap, _('Show the render time of the frames requested on the video slider, red for the slowest ones'), wx.ITEM_CHECK, self.options['renderheatmap']),
+                    (_('Go to next slow frame'), '', self.OnMenuVideoNextSlowFrame, _('Go to the next frame that took at least half the time of the slowest one to render')),
+                    (_('Go to slowest frame'), '', self.OnMenuVideoSlowestFrame, _('Go to the frame that took the most time to render')),
+                    (_('Clear render times'), '', self.OnMenuVideoRenderTimesClear, _('Discard the render times measured for the current clip')),
+                    ),
+                ),
+                (_('&Multithreading (AviSynth+)'),
+                    (
+                    (_('Prefetch threads...'), '', self.OnMenuVideoPrefetchThreads, _('Set the threads of the Prefetch appended to the clip of the current tab for the preview. The script text is not changed')),
+                    (_('Benchmark threads...'), '', self.OnMenuVideoPrefetchBenchmark, _('Measure the frame rate of the trim selections, or of the frames between the bookmarks around the current frame, from 1 thread up to the maximum set in the options')),
+                    ),
+                ),
             ),
             (_('&Options'),
                 (_('Always on top'), '', self.OnMenuOptionsAlwaysOnTop, _('Keep this window always on top of others'), wx.ITEM_CHECK, self.options['alwaysontop']),
@@ -7862,6 +8486,7 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         scriptWindow.encoding = 'latin1'
         scriptWindow.eol = None
         scriptWindow.AVI = None
+        scriptWindow.clipKey = None
         scriptWindow.display_clip_refresh_needed = False
         scriptWindow.previewtxt = []
         scriptWindow.sliderTexts = []
@@ -7875,6 +8500,11 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         scriptWindow.lastLength = None
         scriptWindow.group = None
         scriptWindow.group_frame = 0
+        scriptWindow.frameCosts = None # (key, compressed render times) from a session
+        scriptWindow.frameCostsKey = None
+        scriptWindow.prefetchThreads = self.options['prefetchthreads']
+        scriptWindow.prefetchError = None # last one reported, see ReportPrefetchError
+        scriptWindow.timestampKey = None
         scriptWindow.old_group = None
         scriptWindow.old_modified = False
         scriptWindow.sliderWindowShown = not self.options['keepsliderwindowhidden']
@@ -8834,6 +9464,90 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         else:
             scrap.Show()
 
+    def OnMenuVideoTimingsRecord(self, event):
+        self.options['timingprobes'] = not self.options['timingprobes']
+        probes.Enable(self.options['timingprobes'])
+        self.videoWindow.Refresh()
+
+    def OnMenuVideoTimingsHUD(self, event):
+        self.options['timinghud'] = not self.options['timinghud']
+        self.videoWindow.Refresh()
+
+    def OnMenuVideoTimingsSave(self, event):
+        dlg = wx.FileDialog(self, _('Save timings'), self.GetProposedPath(only='dir'),
+                            'timings.txt', _('Text files') + ' (*.txt)|*.txt',
+                            wx.SAVE | wx.OVERWRITE_PROMPT)
+        ID = dlg.ShowModal()
+        filename = dlg.GetPath()
+        dlg.Destroy()
+        if ID == wx.ID_OK:
+            try:
+                probes.Dump(filename)
+            except IOError as err:
+                wx.MessageBox(unicode(err), _('Error'), style=wx.OK|wx.ICON_ERROR)
+
+    def OnMenuVideoTimingsClear(self, event):
+        probes.Clear()
+        self.videoWindow.Refresh()
+
+    def OnMenuVideoRenderHeatmap(self, event):
+        self.options['renderheatmap'] = not self.options['renderheatmap']
+        self.UpdateRenderTimeHeatmap()
+
+    def OnMenuVideoNextSlowFrame(self, event):
+        frame = self.FindSlowFrame(self.currentframenum + 1)
+        if frame is None:
+            wx.MessageBox(_('No render times measured for the current clip'), _('Message'))
+        else:
+            self.ShowVideoFrame(frame)
+
+    def OnMenuVideoSlowestFrame(self, event):
+        frame = self.FindSlowFrame(slowest=True)
+        if frame is None:
+            wx.MessageBox(_('No render times measured for the current clip'), _('Message'))
+        else:
+            self.ShowVideoFrame(frame)
+
+    def OnMenuVideoPrefetchThreads(self, event):
+        if not self.avisynth_p:
+            wx.MessageBox(_('Multithreading requires AviSynth+'), _('Error'), style=wx.OK|wx.ICON_ERROR)
+            return
+        ret = self.MacroGetTextEntry(_('Threads, 0 to evaluate the script as written'),
+                                     (self.currentScript.prefetchThreads, 0, 256), _('Prefetch threads'),
+                                     'spin', 200)
+        if ret != '':
+            self.SetPrefetchThreads(ret)
+
+    def OnMenuVideoPrefetchBenchmark(self, event):
+        if not self.avisynth_p:
+            wx.MessageBox(_('Multithreading requires AviSynth+'), _('Error'), style=wx.OK|wx.ICON_ERROR)
+            return
+        results = self.BenchmarkPrefetch()
+        if not results:
+            return
+        base = results[0][1]
+        lines = [_('Threads') + '\t' + _('fps') + '\t' + _('Speedup')]
+        for threads, fps in results:
+            lines.append(u'{0}\t{1:#.4g}\t{2:.2f}x'.format(threads, fps, fps / base if base else 0))
+        best = max(results, key=lambda item: item[1])[0]
+        message = u'\n'.join(lines) + u'\n\n' + _('Use {threads} threads for this tab?').format(threads=best)
+        if wx.MessageBox(message, _('Benchmark threads'), style=wx.YES_NO|wx.ICON_QUESTION) == wx.YES:
+            self.SetPrefetchThreads(best)
+
+    def OnMenuVideoRenderTimesClear(self, event):
+        script = self.currentScript
+        if script.AVI is not None:
+            script.AVI.frame_costs = None
+        script.frameCosts = None
+        self.UpdateRenderTimeHeatmap()
+
+    def OnMenuVideoShowScopesWindow(self, event):
+        scopesWindow = self.scopesWindow
+        if scopesWindow.IsShown():
+            scopesWindow.Hide()
+        else:
+            scopesWindow.Show()
+
     def OnMenuVideoBookmark(self, event):
         framenum = self.GetFrameNumber()
         self.AddFrameBookmark(framenum)
@@ -8915,9 +9629,10 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         bookmarkList += historyList
         if not bookmarkList:
             return
+        timestamps = self.GetTimestamps()
         for bookmark in bookmarkList:
             if self.currentScript.AVI:
-                sec = bookmark / self.currentScript.AVI.Framerate
+                sec = timestamps.FrameTime(bookmark) / 1000.0
                 min, sec = divmod(sec, 60)
                 hr, min = divmod(min, 60)
                 timecode = '%02d:%02d:%06.3f' % (hr, min, sec)
@@ -9021,6 +9736,9 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         label = event.GetEventObject().GetLabel(event.GetId())
         self.AssignTabGroup(label)
 
+    def OnMenuVideoGroupCompare(self, event):
+        self.CompareTabGroup()
+
     def OnMenuVideoGotoLastScrolled(self, event):
         if self.playing_video:
             self.PlayPauseVideo()
@@ -9330,6 +10048,7 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         else:
             self.flip.append(value)
         self.bmpVideo = None
+        self.videoRender = None
         self.videoWindow.Refresh()
 
     def OnMenuVideoYUV2RGB(self, event):
@@ -9566,9 +10285,9 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         initial_time = previous_time = time.time()
         previous_frame = -1
         for frame in range(frame_count):
-            script.AVI.clip.get_frame(frame)
-            error = script.AVI.clip.get_error()
+            error = script.AVI.RequestFrame(frame)
             if error:
+                self.UpdateRenderTimeHeatmap(script)
                 progress.Destroy()
                 wx.MessageBox(u'\n\n'.join((_('Error requesting frame {number}').format(number=frame),
                               error)), _('Error'), style=wx.OK|wx.ICON_ERROR)
@@ -9581,8 +10300,10 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                 previous_frame = frame
                 if not progress.Update(frame * 100/ frame_count,
                                        _('Frame %s/%s (%#.4g fps)') % (frame, frame_count, fps))[0]:
+                    self.UpdateRenderTimeHeatmap(script)
                     progress.Destroy()
                     return False
+        self.UpdateRenderTimeHeatmap(script)
         elapsed_time = time.time() - initial_time
         progress.Update(100, _('Finished (%s fps average)') % (
                         '%#.4g' % (frame_count / elapsed_time) if elapsed_time else 'INF'))
@@ -9626,6 +10347,19 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
     def OnMenuVideoPlayDropFrames(self, event):
         self.play_drop = not self.play_drop
 
+    def OnMenuVideoRenderAhead(self, event):
+        if not self.StartRenderAhead():
+            wx.MessageBox(_('Rendering ahead requires a clip without errors and NumPy'),
+                          _('Error'), style=wx.OK|wx.ICON_ERROR)
+
+    def OnMenuVideoRenderAheadClear(self, event):
+        self.StopRenderAhead()
+        for index in xrange(self.scriptNotebook.GetPageCount()):
+            avi = self.scriptNotebook.GetPage(index).AVI
+            if avi is not None and hasattr(avi, 'ClearFrameBuffer'):
+                avi.ClearFrameBuffer()
+        self.UpdateRenderAheadIndicator()
+
     def OnMenuSaveViewPos(self, event):
         self.saveViewPos = not self.saveViewPos
 
@@ -9705,6 +10439,14 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             GenerateMacroReadme(readme)
         startfile(readme)
 
+    def ResumeEncodeQueue(self):
+        '''Load the encode queue saved on exit, see encode_queue.ResumeQueue'''
+        try:
+            import encode_queue
+        except ImportError:
+            return
+        encode_queue.ResumeQueue(self)
+
     def OnMenuToolsRunSelected(self, event):
         try:
             name = self.toolsImportNames[event.GetId()]
@@ -10283,7 +11025,7 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         def OnContextMenuCopyTime(event):
             frame = self.GetFrameNumber()
             try:
-                m, s = divmod(frame/self.MacroGetVideoFramerate(), 60)
+                m, s = divmod(self.MacroFrameToTime(frame), 60)
             except:
                 return
             h, m = divmod(m, 60)
@@ -10497,7 +11239,12 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             else:
                 if script.videoZoom != None:
                     self.zoomfactor = script.videoZoom
-                self.ShowVideoFrame(forceLayout=True, focus=False, scroll=script.videoXY, forceCursor=True)
+                if self.PaintTabBitmap(script):
+                    # The last frame is already shown, update the rest when idle
+                    self.IdleCall.append((self.ShowVideoFrame, tuple(), {'forceLayout': True, 'focus': False,
+                                          'scroll': script.videoXY}, ''))
+                else:
+                    self.ShowVideoFrame(forceLayout=True, focus=False, scroll=script.videoXY, forceCursor=True)
 
             if not script.sliderWindowShown:
                 self.HideSliderWindow(script)
@@ -10572,6 +11319,7 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                 self.oldSliderWindowShown = oldScript.sliderWindowShown
                 self.oldBoolSliders = bool(oldScript.sliderTexts or oldScript.sliderProperties or oldScript.toggleTags or oldScript.autoSliderInfo)
                 self.oldVideoSize = (oldScript.AVI.Width, oldScript.AVI.Height)
+                self.CacheTabBitmap(oldScript)
             else:
                 self.oldLastSplitVideoPos = None
                 self.oldLastSplitSliderPos = None
@@ -10686,6 +11434,47 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         label = group_menu.FindItemById(id).GetLabel()
         self.AssignTabGroup(label)
 
+    def CompareTabGroup(self):
+        '''Show the metrics dialog for the current tab against its group'''
+        if metrics.numpy is None:
+            wx.MessageBox(_('NumPy is required to compare tabs'), _('Error'),
+                          style=wx.OK|wx.ICON_ERROR)
+            return
+        reference = self.currentScript
+        group = reference.group
+        if group is None:
+            wx.MessageBox(_('The current tab is not assigned to a group'), _('Error'),
+                          style=wx.OK|wx.ICON_ERROR)
+            return
+        if self.UpdateScriptAVI(reference, prompt=True) is None:
+            return
+        indexes = [self.scriptNotebook.GetSelection()]
+        indexes += [index for index in xrange(self.scriptNotebook.GetPageCount())
+                    if index != indexes[0] and self.scriptNotebook.GetPage(index).group == group]
+        if len(indexes) < 2:
+            wx.MessageBox(_('There are no other tabs in the current group'), _('Error'),
+                          style=wx.OK|wx.ICON_ERROR)
+            return
+        workdir_exp = self.ExpandVars(self.options['workdir'])
+        always_workdir = (self.options['useworkdir'] and self.options['alwaysworkdir'] and
+                          os.path.isdir(workdir_exp))
+        tabs, scripts, names, offsets = [], [], [], []
+        for index in indexes:
+            script = self.scriptNotebook.GetPage(index)
+            name = self.scriptNotebook.GetPageText(index)
+            filename = os.path.join(os.path.dirname(script.filename), name)
+            workdir = workdir_exp if always_workdir else script.workdir
+            if self.options['applygroupoffsets']:
+                offset = (script.group_frame or 0) - (reference.group_frame or 0)
+            else:
+                offset = 0
+            tabs.append(script)
+            scripts.append((self.getCleanText(script.GetText()), filename, workdir))
+            names.append(name)
+            offsets.append(offset)
+        dlg = MetricsDialog(self, tabs, scripts, names, offsets)
+        dlg.Show()
+
     def AssignTabGroup(self, group, index=None):
         if group == _('None'):
             group = None
@@ -11485,7 +12274,31 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         self.UserSliderVideoUpdate(slider)
         event.Skip()
 
-    def UserSliderVideoUpdate(self, slider):
+    def ScheduleUserSliderUpdate(self, slider):
+        '''Coalesce the preview updates requested while dragging a user slider
+
+        Only the value at the end of the delay is evaluated, and the updates
+        still pending on release are dropped.
+        '''
+        if not self.options['sliderdragupdate']:
+            return
+        self.userSliderPending = slider
+        if self.userSliderCall is None:
+            self.userSliderCall = wx.CallLater(self.options['sliderdragdelay'],
+                                               self.OnUserSliderDragTimer)
+        elif not self.userSliderCall.IsRunning():
+            self.userSliderCall.Restart(self.options['sliderdragdelay'])
+
+    def OnUserSliderDragTimer(self):
+        slider, self.userSliderPending = self.userSliderPending, None
+        if slider:
+            self.UserSliderVideoUpdate(slider, draft=True)
+
+    def UserSliderVideoUpdate(self, slider, draft=False):
+        if not draft:
+            self.userSliderPending = None
+            if self.userSliderCall is not None:
+                self.userSliderCall.Stop()
         script = self.currentScript
         keep_env = not self.ScriptChanged(script)
         label = slider.GetName()
@@ -11507,7 +12320,14 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                 newSliderText = '%s"%s", %s, %s, %s%s' % (sOpen, label, items[1], items[2], newVal, sClose)
             script.ReplaceTarget(newSliderText)
             self.refreshAVI = True
-        self.ShowVideoFrame(userScrolling=True, keep_env=keep_env)
+        # Draft frames are converted at half resolution, see AvsClip.SetDraft
+        self.draftPreview = draft
+        if hasattr(script.AVI, 'SetDraft'):
+            script.AVI.SetDraft(draft)
+        try:
+            self.ShowVideoFrame(userScrolling=True, keep_env=keep_env)
+        finally:
+            self.draftPreview = False
 
     def OnToggleTagChecked(self, event):
         script = self.currentScript
@@ -11865,11 +12685,15 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             f.close()
         # Clean up
         wx.TheClipboard.Flush()
+        for server in self.frameServers:
+            server.Stop()
+        self.StopRenderAhead()
+        self.StopTimestampPasses(stop_all=True)
         for index in xrange(self.scriptNotebook.GetPageCount()):
             script = self.scriptNotebook.GetPage(index)
             script.AVI = None
         pyavs.ExitRoutines()
-        if self.boolSingleInstance:
+        if self.argsPosterThread is not None:
             self.argsPosterThread.Stop()
         self.Destroy()
 
@@ -11980,7 +12804,8 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
     @AsyncCallWrapper
     def OpenFile(self, filename='', default='', f_encoding=None, eol=-1, workdir=None,
                  scripttext=None, setSavePoint=True, splits=None, framenum=None,
-                 last_length=None, group=-1, group_frame=None):
+                 last_length=None, group=-1, group_frame=None, frame_costs=None,
+                 prefetch_threads=None):
         r'''OpenFile(filename='', default='')
 
         If the string 'filename' is a path to an Avisynth script, this function opens
@@ -12109,6 +12934,10 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                     self.UpdateScriptTabname(index=index)
                 if group_frame is not None:
                     script.group_frame = group_frame
+                if frame_costs is not None:
+                    script.frameCosts = frame_costs
+                if prefetch_threads is not None:
+                    script.prefetchThreads = prefetch_threads
                 if setSavePoint:
                     script.EmptyUndoBuffer()
                     script.SetSavePoint()
@@ -12298,6 +13127,7 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             rows = self.scriptNotebook.GetRowCount()
         self.scriptNotebook.DeletePage(index)
         self.currentScript = self.scriptNotebook.GetPage(self.scriptNotebook.GetSelection())
+        self.StopTimestampPasses()
         self.UpdateTabImages()
         if self.options['multilinetab']:
             if rows != self.scriptNotebook.GetRowCount():
@@ -12768,7 +13598,9 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                               eol=item.get('eol'), workdir=item['workdir'], scripttext=item['text'],
                               setSavePoint=setSavePoint, splits=item['splits'],
                               framenum=item['current_frame'], last_length=item.get('last_length'),
-                              group=item.get('group', -1), group_frame=item.get('group_frame'))
+                              group=item.get('group', -1), group_frame=item.get('group_frame'),
+                              frame_costs=item.get('frame_costs'),
+                              prefetch_threads=item.get('prefetch_threads'))
         if reload and index is not None:
             # index is None -> the script was already loaded, different to this other version
             # but the user chose not to replace it.  If that's the case, don't prompt again
@@ -12853,7 +13685,8 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         return dict(name=scriptname, selected=boolSelected, text=script.GetText(),
                     hash=hash, splits=splits, current_frame=script.lastFramenum,
                     last_length=script.lastLength, f_encoding=script.encoding, eol=script.eol,
-                    workdir=script.workdir, group=script.group, group_frame=script.group_frame)
+                    workdir=script.workdir, group=script.group, group_frame=script.group_frame,
+                    frame_costs=self.GetFrameCostsInfo(script), prefetch_threads=script.prefetchThreads)
 
     def SaveImage(self, filename='', frame=None, silent=False, index=None, avs_clip=None, default='', quality=None, depth=None):
         script, index = self.getScriptAtIndex(index)
@@ -13340,22 +14173,24 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         selections = self.GetSliderSelections(invert=cutSelected)
         if not selections:
             return False
+        # Long lists of trims are joined in a balanced tree of splices, see splice.py
+        trims = [splice.Trim(start, stop) for start, stop in selections]
         if singleClips:     # GPo
             clipText = ''
-            trimLine = ''
-            i = 0
-            for start, stop in selections:
-                clipText += '%s%i = Trim(%i, %i)' % (clipPrefix, i, start, stop) + '\n'
-                trimLine += '%s%i ++ ' % (clipPrefix, i)
-                i += 1
-            trimLine = trimLine[: len(trimLine)-4]
+            clips = []
+            for i, trim in enumerate(trims):
+                clipText += '%s%i = %s' % (clipPrefix, i, trim) + '\n'
+                clips.append('%s%i' % (clipPrefix, i))
             if useDissolve and len(selections) > 1:
-                trimLine = 'Dissolve(%s, %s)' % (trimLine.replace(' ++', ','), useDissolve-1)
+                trimLine = 'Dissolve(%s, %s)' % (', '.join(clips), useDissolve-1)
+            else:
+                trimLine = splice.Splice(clips)
             trimText = clipText + trimLine + '\n'
         else:
-            trimText = ' ++ '.join(['Trim(%i, %i)' % (start, stop) for start, stop in selections])
             if useDissolve and len(selections) > 1:
-                trimText = 'Dissolve(%s, %s)' % (trimText.replace(' ++', ','), useDissolve-1)
+                trimText = 'Dissolve(%s, %s)' % (', '.join(trims), useDissolve-1)
+            else:
+                trimText = splice.Splice(trims)
         #~ script.ReplaceSelection(trimText)
         if insertMode == 0:
             self.InsertTextAtScriptEnd(trimText, script)
@@ -13699,12 +14534,13 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             bookmarkList.sort()
         width = len(str(max(bookmarkList)[0])) if bookmarkList else 0
         fmt = '%%%dd ' % width
+        timestamps = self.GetTimestamps()
         for bookmark, bmtype in bookmarkList:
             if bmtype == 0:
                 label = fmt % bookmark
                 if timecodeItem.IsChecked():
                     if self.currentScript.AVI:
-                        sec = bookmark / self.currentScript.AVI.Framerate
+                        sec = timestamps.FrameTime(bookmark) / 1000.0
                         min, sec = divmod(sec, 60)
                         hr, min = divmod(min, 60)
                         label += '[%02d:%02d:%06.3f]' % (hr, min, sec)
@@ -13841,17 +14677,9 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         self.DeleteAllFrameBookmarks(bmtype=0)
         self.MacroSetBookmark(new_bookmarks)
 
-        # Fix case Trim(0,0)
-        new_timeline2 = new_timeline[:]
-        try: # 'end' parameter is only available in avisynth v2.6+
-            new_timeline2[new_timeline.index((0,0))] = (0, -1)
-        except ValueError:
-            pass
-
         # Insert a line of Trims at the end of the script
         pos = script.GetLength()
-        new_timeline_str = '++'.join(
-                     ['Trim({},{})'.format(*trim) for trim in new_timeline2])
+        new_timeline_str = splice.SpliceRanges(new_timeline)
         script.InsertText(pos, '\n' + new_timeline_str)
         script.GotoPos(pos + 1 + len(new_timeline_str))
 
@@ -13922,9 +14750,10 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             frame = self.videoSlider.GetValue()
         script = self.currentScript
         if script.AVI:
-            text = self.status_bar_formatter.vformat(
-                                ' ' + self.videoStatusBarInfoParsed + '      ',
-                                [], self.GetVideoInfoDict(script, frame, addon))
+            with probes.Probe('status'):
+                text = self.status_bar_formatter.vformat(
+                                    ' ' + self.videoStatusBarInfoParsed + '      ',
+                                    [], self.GetVideoInfoDict(script, frame, addon))
         else:
             text = ' %s %i'  % (_('Frame'), frame)
         text2 = text.rsplit('\\T\\T', 1)
@@ -14048,10 +14877,10 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         if not frame:
             frame = self.videoSlider.GetValue()
         v = script.AVI
-        # read ffms global variables
-        try:
-            ffms_encodedframetype, ffms_sourcetime = v.ffms_info_cache[self.currentframenum]
-        except KeyError:
+        # read ffms global variables, only once per frame
+        if v.ffms_info is not None and v.ffms_info[0] == self.currentframenum:
+            ffms_encodedframetype, ffms_sourcetime = v.ffms_info[1:]
+        else:
             try:
                 ffms_prefix = script.AVI.env.get_var('FFSARFFVAR_PREFIX')
             except avisynth.AvisynthError as err:
@@ -14064,13 +14893,18 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                 if str(err) != "NotFound":
                     raise
                 ffms_encodedframetype = ''
-            try:
-                ffms_sourcetime = self.FormatTime(script.AVI.env.get_var(ffms_prefix + 'FFVFR_TIME') / 1000.0)
-            except avisynth.AvisynthError as err:
-                if str(err) != "NotFound":
-                    raise
-                ffms_sourcetime = ''
-            v.ffms_info_cache[self.currentframenum] = ffms_encodedframetype, ffms_sourcetime
+            if v.timestamps is not None:
+                ffms_sourcetime = self.FormatTime(v.timestamps.FrameTime(self.currentframenum) / 1000.0)
+            else:
+                try:
+                    ffms_sourcetime = self.FormatTime(script.AVI.env.get_var(ffms_prefix + 'FFVFR_TIME') / 1000.0)
+                    if self.options['timestampindex']:
+                        self.BuildTimestampIndex(script)
+                except avisynth.AvisynthError as err:
+                    if str(err) != "NotFound":
+                        raise
+                    ffms_sourcetime = ''
+            v.ffms_info = self.currentframenum, ffms_encodedframetype, ffms_sourcetime
         framerate = v.Framerate
         framecount = v.Framecount
         time = self.FormatTime(frame/framerate)
@@ -14541,7 +15375,10 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             if script.AVI is None:
                 forceRefresh = True
             display_clip_refresh_needed = script.display_clip_refresh_needed
-            if self.UpdateScriptAVI(script, forceRefresh, keep_env=keep_env, showCursor=not forceCursor) is None:
+            with probes.Probe('update'):
+                updated = self.UpdateScriptAVI(script, forceRefresh, keep_env=keep_env,
+                                               showCursor=not forceCursor)
+            if updated is None:
                 #~ wx.MessageBox(_('Error loading the script'), _('Error'), style=wx.OK|wx.ICON_ERROR)
                 return False
 
@@ -14554,6 +15391,8 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                 self.videoSlider.SetRange(0, script.AVI.Framecount-1, refresh=False)
                 if self.separatevideowindow:
                     self.videoSlider2.SetRange(0, script.AVI.Framecount-1, refresh=False)
+            self.UpdateRenderAheadIndicator(script)
+            self.UpdateRenderTimeHeatmap(script)
             # Get the desired AVI frame to display
             if framenum is None:
                 framenum = script.lastFramenum
@@ -14603,8 +15442,12 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                 self.frameTextCtrl2.Replace(0, -1, str(framenum))
 
             # Check for errors when retrieving the frame before updating the gui
-            script.AVI.display_clip.get_frame(framenum)
-            error = script.AVI.display_clip.get_error()
+            if script.AVI.IsFrameStored(framenum):
+                error = None
+            else:
+                error = script.AVI.RequestFrame(framenum, script.AVI.display_clip)
+                if error is None:
+                    self.UpdateRenderTimeHeatmap(script, framenum)
             if error is not None:
                 self.HidePreviewWindow()
                 if forceCursor:                 # GPo 2018
@@ -14612,6 +15455,7 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                 ID = wx.MessageBox(u'\n\n'.join((_('Error requesting frame {number}').format(number=framenum),
                               error)), _('Error'), style=wx.OK|wx.CANCEL|wx.ICON_ERROR)
                 if ID == wx.CANCEL:
+                    self.clipCache.clear()
                     for index in xrange(self.scriptNotebook.GetPageCount()):  # GPo ID, wx.CANCEL, AVI = None
                         script = self.scriptNotebook.GetPage(index)
                         script.AVI = None
@@ -14671,6 +15515,7 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             oldVideoSize = (self.oldWidth, self.oldHeight)
             newVideoSize = (videoWidth, videoHeight)
             self.bmpVideo = None
+            self.videoRender = None
             if scroll is not None:
                 self.Freeze()
             if newSize != oldSize or newVideoSize != oldVideoSize or not self.previewWindowVisible:
@@ -14733,6 +15578,7 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             script.oldToggleTags = script.toggleTags
             script.lastFramenum = framenum
             script.lastLength = script.AVI.Framecount
+            self.scopesWindow.UpdateScopes(script, framenum)
         finally:
             if forceCursor:
                 wx.SetCursor(wx.StockCursor(wx.CURSOR_DEFAULT))
@@ -14957,6 +15803,10 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                     if script == self.scriptNotebook.GetPage(index):
                         break
             updateDisplayClip = False
+            # A forced refresh evaluates the sources again
+            if forceRefresh:
+                self.clipCache.clear()
+            useClipCache = not forceRefresh
             if script.AVI is None:
                 self.firstToggled = forceRefresh = True
             elif self.zoomwindow:
@@ -14993,10 +15843,12 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                     filename = os.path.join(sDirname, sBasename)
                     if script.AVI is None:
                         oldFramecount = 240
+                        oldTimestamps = None
                         boolOldAVI = False
                         env = None
                     else:
                         oldFramecount = script.AVI.Framecount
+                        oldTimestamps = script.AVI.timestamps
                         oldWidth, oldHeight = script.AVI.DisplayWidth, script.AVI.DisplayHeight
                         boolOldAVI = True
                         env = script.AVI.env if keep_env or self.reuse_environment else None
@@ -15013,15 +15865,39 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                         if os.name == 'nt' and filename.endswith('.vpy'):
                             self.SaveScript(filename)
 
-                        if showCursor:
-                            cursor = True
-                            wx.BeginBusyCursor()
-                        script.AVI = None
-                        script.AVI = pyavs.AvsClip(
-                            self.getCleanText(scripttxt), filename, workdir=workdir, env=env,
-                            fitHeight=fitHeight, fitWidth=fitWidth, oldFramecount=oldFramecount,
-                            matrix=self.matrix, interlaced=self.interlaced, swapuv=self.swapuv,
-                            bit_depth=self.bit_depth)
+                        script.OnStyleNeeded(None, forceAll=True)
+                        prefetch = script.prefetchThreads if self.avisynth_p else 0
+                        key = self.ClipCacheKey(self.ScriptChanged(script, return_styledtext=True)[1],
+                                                filename, workdir, prefetch, scripttxt)
+                        cached = self.clipCache.pop(key, None) if useClipCache else None
+                        self.CacheClip(script, shared_env=env is not None and cached is None)
+                        if cached is not None:
+                            script.AVI = cached[0]
+                            # Give back its frame cache limit
+                            if cached[2]:
+                                script.AVI.SetMemoryMax(cached[2])
+                        else:
+                            if showCursor:
+                                cursor = True
+                                wx.BeginBusyCursor()
+                            script.AVI = None
+                            script.AVI = pyavs.AvsClip(
+                                self.getCleanText(scripttxt), filename, workdir=workdir, env=env,
+                                fitHeight=fitHeight, fitWidth=fitWidth, oldFramecount=oldFramecount,
+                                matrix=self.matrix, interlaced=self.interlaced, swapuv=self.swapuv,
+                                bit_depth=self.bit_depth, prefetch=prefetch)
+                        script.clipKey = key
+                        if getattr(script.AVI, 'prefetch_error', None):
+                            wx.CallAfter(self.ReportPrefetchError, script, script.AVI.prefetch_error)
+                        elif script.AVI.initialized:
+                            script.prefetchError = None
+                        if hasattr(script.AVI, 'SetDraft'):
+                            script.AVI.SetDraft(self.draftPreview)
+                        if hasattr(script.AVI, 'SetDiskCache') and script.AVI.initialized:
+                            self.SetDiskFrameCache(script, scripttxt, filename, workdir,
+                                                   discard=forceRefresh)
+                        if hasattr(script.AVI, 'SetFrameCosts') and script.AVI.initialized:
+                            self.RestoreFrameCosts(script, scripttxt)
 
                     if not script.AVI.initialized:
                         if self.customHandler > 0:      # GPo
@@ -15045,6 +15921,13 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                             wx.MessageBox('%s\n\n%s' % (s1, s2), _('Error'), style=wx.OK|wx.ICON_ERROR)
                         script.AVI = None
                         return None
+                    # Keep the timecodes loaded from a file while the length doesn't change
+                    if (script.AVI.timestamps is None and oldTimestamps is not None and
+                            oldTimestamps.filename and script.AVI.Framecount == oldFramecount):
+                        script.AVI.timestamps = oldTimestamps
+                    # Reuse the index built for the same sources, stop the passes
+                    # of sources no longer used
+                    self.UpdateTimestampKey(script, scripttxt, workdir)
                     # Update the script tag properties
                     self.UpdateScriptTagProperties(script, scripttxt)
                     self.GetAutoSliderInfo(script, scripttxt)
@@ -15061,6 +15944,8 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                     wx.BeginBusyCursor()
                 ok = script.AVI.CreateDisplayClip(matrix=self.matrix, interlaced=self.interlaced,
                                                   swapuv=self.swapuv, bit_depth=self.bit_depth)
+                if script.clipKey is not None:
+                    script.clipKey = (script.clipKey[0], self.ClipCacheKey()[1])
                 if ok:
                     boolNewAVI = True
                 else:
@@ -15082,6 +15967,230 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
 
         return boolNewAVI
 
+    def GetDiskFrameCache(self):
+        '''Return the framecache.DiskFrameCache of the current options, or None'''
+        if not self.options['diskframecache']:
+            self.diskFrameCache = None
+            return
+        directory = (self.ExpandVars(self.options['diskframecachedir']) or
+                     os.path.join(self.programdir, 'framecache'))
+        size = self.options['diskframecachesize'] * 1024 * 1024
+        cache = self.diskFrameCache
+        if cache is None or cache.directory != directory:
+            try:
+                import framecache
+                cache = self.diskFrameCache = framecache.DiskFrameCache(directory, size)
+            except (ImportError, EnvironmentError):
+                self.diskFrameCache = None
+                return
+        elif cache.max_size != size:
+            cache.max_size = size
+            cache.Evict()
+        return cache
+
+    def SetDiskFrameCache(self, script, scripttxt, filename, workdir, discard=False):
+        '''Store the frames of the clip of a tab on disk, if enabled
+
+        With 'discard' the frames stored for the same script are deleted first.
+        '''
+        avi = script.AVI
+        cache = None if avi.IsErrorClip() else self.GetDiskFrameCache()
+        if cache is None:
+            avi.SetDiskCache(None, None)
+            return
+        import framecache
+        key = framecache.ScriptKey(self.getCleanText(scripttxt), filename, workdir,
+                                   (avi.Width, avi.Height, avi.Colorspace, avi.Framecount,
+                                    avi.BitsPerComponent))
+        if discard:
+            cache.Discard(key)
+        avi.SetDiskCache(cache, key)
+
+    def ClipCacheKey(self, styledtxt=None, filename=None, workdir=None, prefetch=0,
+                     scripttxt=None):
+        '''Key of an evaluated script in the clip cache, see CacheClip
+
+        'styledtxt' is the normalized script returned by ScriptChanged.  The
+        size and modification time of every existing file named in a string
+        of 'scripttxt' are part of the key, as in framecache.ScriptKey, so a
+        clip is not reused if a source or an imported script changes.
+        '''
+        if styledtxt is not None:
+            styledtxt = md5(repr(styledtxt)).hexdigest()
+        files = []
+        if scripttxt is not None:
+            basedir = workdir or os.path.dirname(filename or '')
+            for name in sorted(set(re.findall(r'"([^"\r\n]+)"', self.getCleanText(scripttxt)))):
+                path = os.path.join(basedir, name)
+                try:
+                    if os.path.isfile(path):
+                        stat = os.stat(path)
+                        files.append((os.path.abspath(path), stat.st_size, stat.st_mtime))
+                except (OSError, ValueError, UnicodeError):
+                    pass
+        return ((styledtxt, filename, workdir, prefetch, tuple(files)),
+                (tuple(self.matrix), self.interlaced, self.swapuv, self.bit_depth))
+
+    def CacheClip(self, script, shared_env=False):
+        '''Keep the clip of a tab before replacing it, to reuse it if the script
+        returns to the same text
+
+        The least recently used clips are dropped beyond 'clipcachecount' clips
+        or when their estimated memory exceeds 'clipcachememory'.  A clip with
+        its own AviSynth environment (not 'shared_env' with the next clip of
+        the tab) has the frame cache of the environment limited to its share of
+        'clipcachememory' while kept, and that limit is counted with its
+        current source and display frames.  The memory of the source decoders
+        is not known and not counted.
+        '''
+        avi, key = script.AVI, script.clipKey
+        script.clipKey = None
+        # The frames rendered ahead are of the replaced script
+        if avi is not None and hasattr(avi, 'ClearFrameBuffer'):
+            avi.ClearFrameBuffer()
+        count = self.options['clipcachecount']
+        budget = self.options['clipcachememory'] * 1024 * 1024
+        if not count or key is None or avi is None or not avi.initialized or avi.IsErrorClip():
+            return
+        size = (avi.Width * avi.Height * max(1, getattr(avi, 'BitsPerComponent', 8) // 8) * 3 +
+                avi.DisplayWidth * avi.DisplayHeight * 4)
+        memory_max = None
+        if not shared_env:
+            share = max(1, (budget - size) // count // (1024 * 1024))
+            memory_max = avi.SetMemoryMax()
+            limit = avi.SetMemoryMax(share) if memory_max else None
+            if limit is None:
+                # The environment can't be bounded, keep the clip only if the
+                # whole limit fits
+                limit = memory_max or 0
+                memory_max = None
+            size += limit * 1024 * 1024
+        if size > budget:
+            if memory_max:
+                avi.SetMemoryMax(memory_max)
+            return
+        self.clipCache.pop(key, None)
+        self.clipCache[key] = (avi, size, memory_max)
+        total = sum(entry[1] for entry in self.clipCache.itervalues())
+        while len(self.clipCache) > count or total > budget:
+            total -= self.clipCache.popitem(last=False)[1][1]
+
+    def GetTimestamps(self, script=None):
+        '''Timestamp index of the clip of a tab, see timecodes.TimestampIndex
+
+        Without a loaded or built index the frame rate of the clip is assumed.
+        '''
+        if script is None:
+            script = self.currentScript
+        avi = script.AVI
+        if avi is None:
+            return None
+        if getattr(avi, 'timestamps', None) is not None:
+            return avi.timestamps
+        return timecodes.TimestampIndex.FromRate(avi.Framerate, avi.Framecount)
+
+    def TimestampSourceKey(self, script, scripttxt, workdir):
+        '''Identify the script text and the FFMS2 sources of a tab, so the
+        frame time index is shared by the evaluations of the same script
+
+        The index is of the script output, any edit can change the frames.
+        '''
+        basedir = workdir if workdir and os.path.isdir(workdir) else os.path.dirname(script.filename)
+        text = self.getCleanText(scripttxt)
+        sources = []
+        for name in re.findall(r'(?i)\b(?:FFVideoSource|FFmpegSource2|FFMS2)\s*\(\s*'
+                               r'(?:source\s*=\s*)?"([^"\r\n]+)"', text):
+            path = os.path.join(basedir, name)
+            try:
+                sources.append((os.path.abspath(path), os.path.getmtime(path)))
+            except (OSError, ValueError, UnicodeError):
+                sources.append((name, None))
+        return (script.filename, md5(repr(text)).hexdigest(), tuple(sources))
+
+    def UpdateTimestampKey(self, script, scripttxt, workdir):
+        '''Set the source key of a new clip of a tab and give it the index
+        already built for it, see BuildTimestampIndex'''
+        script.timestampKey = key = self.TimestampSourceKey(script, scripttxt, workdir)
+        index = self.timestampIndexes.get(key)
+        avi = script.AVI
+        if index is not None and avi.timestamps is None and index.framecount == avi.Framecount:
+            avi.timestamps = index
+        self.StopTimestampPasses()
+
+    def StopTimestampPasses(self, stop_all=False):
+        '''Stop the index passes of the sources no tab uses anymore'''
+        keys = set()
+        if not stop_all:
+            for index in xrange(self.scriptNotebook.GetPageCount()):
+                keys.add(self.scriptNotebook.GetPage(index).timestampKey)
+        for key in self.timestampPasses.keys():
+            if key not in keys:
+                self.timestampPasses.pop(key).set()
+
+    def BuildTimestampIndex(self, script):
+        '''Read the FFMS2 time of every frame of a tab in a background process
+
+        The index is kept for the script text and its sources (see
+        TimestampSourceKey) and set on every clip of them with the same
+        frame count and no other index.  Only one pass runs per source key,
+        and it's stopped when no tab uses the key anymore.
+        '''
+        import render
+        key = script.timestampKey
+        if key is None or key in self.timestampPasses or key in self.timestampIndexes:
+            return
+        stopped = threading.Event()
+        self.timestampPasses[key] = stopped
+        workdir_exp = self.ExpandVars(self.options['workdir'])
+        if (self.options['useworkdir'] and self.options['alwaysworkdir']
+            and os.path.isdir(workdir_exp)):
+                workdir = workdir_exp
+        else:
+            workdir = script.workdir
+        job = dict(action='timestamps', script=script.filename or 'AVS script',
+                   text=self.getCleanText(script.GetText()), workdir=workdir)
+        options = {'errormessagefont': self.options['errormessagefont']}
+
+        def Install(index):
+            if self.timestampPasses.get(key) is stopped:
+                del self.timestampPasses[key]
+            if index is None or stopped.is_set():
+                return
+            self.timestampIndexes[key] = index
+            while len(self.timestampIndexes) > 16:
+                self.timestampIndexes.popitem(last=False)
+            for i in xrange(self.scriptNotebook.GetPageCount()):
+                tab = self.scriptNotebook.GetPage(i)
+                avi = tab.AVI
+                if (tab.timestampKey == key and avi is not None and avi.timestamps is None
+                        and avi.Framecount == index.framecount):
+                    avi.timestamps = index
+                    avi.ffms_info = None
+                    if tab == self.currentScript:
+                        self.SetVideoStatusText()
+
+        def Run():
+            index = None
+            events = render.RenderEvents([job], 1, global_vars.avisynth_library_dir, options)
+            try:
+                for event in events:
+                    # Closing the generator terminates the process
+                    if stopped.is_set():
+                        break
+                    if event['event'] == 'done':
+                        times = event['result']['times']
+                        if times:
+                            index = timecodes.TimestampIndex.FromTimes(times)
+            except Exception:
+                pass
+            finally:
+                events.close()
+            wx.CallAfter(Install, index)
+
+        thread = threading.Thread(target=Run, name='TimestampIndex')
+        thread.daemon = True
+        thread.start()
+
     def ScriptChanged(self, script=None, return_styledtext=False):
         """Compare scripts including style, but excluding comment/newline/space"""
         if script is None:
@@ -15260,6 +16369,29 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                 script.AVI = None
 
     def PaintAVIFrame(self, inputdc, script, frame, shift=True, isPaintEvent=False):
+        with probes.Probe('paint'):
+            ok = self._PaintAVIFrame(inputdc, script, frame, shift, isPaintEvent)
+        if ok and probes.enabled and self.options['timinghud']:
+            self.PaintTimingsHUD(inputdc)
+        return ok
+
+    def PaintTimingsHUD(self, dc):
+        '''Paint the recorded timings over the top left corner of the video window'''
+        lines = probes.HUDLines() or [_('No timings recorded')]
+        dc.SetDeviceOrigin(0, 0)
+        dc.SetUserScale(1, 1)
+        dc.SetLogicalFunction(wx.COPY)
+        dc.SetFont(wx.SystemSettings.GetFont(wx.SYS_ANSI_FIXED_FONT))
+        extents = [dc.GetTextExtent(line) for line in lines]
+        lineHeight = max(h for w, h in extents)
+        dc.SetPen(wx.TRANSPARENT_PEN)
+        dc.SetBrush(wx.BLACK_BRUSH)
+        dc.DrawRectangle(0, 0, max(w for w, h in extents) + 8, lineHeight * len(lines) + 6)
+        dc.SetTextForeground(wx.WHITE)
+        for i, line in enumerate(lines):
+            dc.DrawText(line, 4, 3 + i * lineHeight)
+
+    def _PaintAVIFrame(self, inputdc, script, frame, shift=True, isPaintEvent=False):
         if script.AVI is None:
             if __debug__:
                 print>>sys.stderr, 'Error in PaintAVIFrame: script is None'
@@ -15304,6 +16436,13 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                 if not script.AVI.DrawFrame(frame, dc):
                     self.ShowErrorMessage(script, frame)  # GPo
                     return
+        elif pyavs_display.numpy is not None and hasattr(script.AVI, 'GetDisplayArray'):
+            if not self.PaintScaledFrame(inputdc, script, frame, isPaintEvent):
+                self.ShowErrorMessage(script, frame)
+                return
+            if isPaintEvent and self.zoomwindowfill and self.firstToggled:
+                wx.CallAfter(self.ShowVideoFrame)
+                self.firstToggled = False
         else:
             dc = wx.MemoryDC()
             w = script.AVI.DisplayWidth
@@ -15340,6 +16479,160 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         self.paintedframe = frame
         return True
 
+    def CacheTabBitmap(self, script):
+        '''Keep the frame currently shown on a tab, to show it again on switching back
+
+        The bitmaps are stored unscaled, or at the size of the frame painted
+        if reduced (see PaintScaledFrame), which is reused as painted.  The
+        least recently used ones are dropped when the 'tabbitmapcache' memory
+        budget is exceeded.
+        '''
+        self.tabBitmaps.pop(script, None)
+        pages = set(self.scriptNotebook.GetPage(i) for i in xrange(self.scriptNotebook.GetPageCount()))
+        for closed in [page for page in self.tabBitmaps if page not in pages]:
+            del self.tabBitmaps[closed]
+        budget = self.options['tabbitmapcache'] * 1024 * 1024
+        frame = self.currentframenum
+        if not budget or script.AVI is None or frame is None or script.AVI.IsErrorClip():
+            return
+        render = self.videoRender
+        if render is not None and render['frame'] == frame and render['avi']() is script.AVI:
+            # Already flipped and converted
+            h, w = render['rgb'].shape[:2]
+            if w * h * 4 > budget:
+                return
+            bmp = wx.BitmapFromBuffer(w, h, pyavs_display.numpy.ascontiguousarray(render['rgb']))
+        else:
+            w = script.AVI.DisplayWidth
+            h = script.AVI.DisplayHeight
+            if w * h * 4 > budget:
+                return
+            bmp = wx.EmptyBitmap(w, h)
+            dc = wx.MemoryDC()
+            dc.SelectObject(bmp)
+            ok = script.AVI.DrawFrame(frame, dc)
+            dc.SelectObject(wx.NullBitmap)
+            if not ok:
+                return
+            if self.flip:
+                img = bmp.ConvertToImage()
+                if 'flipvertical' in self.flip:
+                    img = img.Mirror(False)
+                if 'fliphorizontal' in self.flip:
+                    img = img.Mirror()
+                bmp = wx.BitmapFromImage(img)
+        self.tabBitmaps[script] = (weakref.ref(script.AVI), self.TabBitmapKey(script, frame),
+                                   bmp, w * h * 4)
+        size = sum(entry[3] for entry in self.tabBitmaps.itervalues())
+        while size > budget:
+            size -= self.tabBitmaps.popitem(last=False)[1][3]
+
+    def TabBitmapKey(self, script, frame):
+        '''Everything that determines the look of a cached tab frame but the clip'''
+        avi = script.AVI
+        return (frame, tuple(self.flip), avi.DisplayWidth, avi.DisplayHeight) + tuple(
+                getattr(avi, attr, None) for attr in ('matrix', 'interlaced', 'swapuv', 'bit_depth'))
+
+    def PaintTabBitmap(self, script):
+        '''Paint the cached last frame of a tab, see CacheTabBitmap
+
+        Return True if it was painted, i.e. the script and display settings
+        didn't change and the layout of the preview stays the same.
+        '''
+        entry = self.tabBitmaps.get(script)
+        if entry is None or script.AVI is None or script.display_clip_refresh_needed:
+            return False
+        avi_ref, key, bmp, size = entry
+        frame = script.lastFramenum
+        if frame is None:
+            frame = self.videoSlider.GetValue()
+        if (avi_ref() is not script.AVI or key != self.TabBitmapKey(script, frame) or
+                (script.AVI.Width, script.AVI.Height) != self.oldVideoSize or
+                self.zoomwindow or script.videoXY not in (None, self.videoWindow.GetViewStart()) or
+                script.AVI.DisplayWidth // bmp.GetWidth() > self.GetProxyFactor() or
+                self.ScriptChanged(script)):
+            return False
+        self.tabBitmaps[script] = self.tabBitmaps.pop(script)
+        dc = wx.ClientDC(self.videoWindow)
+        dc.SetDeviceOrigin(self.xo, self.yo)
+        try: # DoPrepareDC causes NameError in wx2.9.1 and fixed in wx2.9.2
+            self.videoWindow.DoPrepareDC(dc)
+        except:
+            self.videoWindow.PrepareDC(dc)
+        # A reduced frame is smaller than the display size
+        scale = float(self.zoomfactor) * script.AVI.DisplayWidth / bmp.GetWidth()
+        dc.SetUserScale(scale, scale)
+        dc.DrawBitmap(bmp, 0, 0)
+        return True
+
+    def PaintScaledFrame(self, dc, script, frame, isPaintEvent=False):
+        '''Paint the visible part of a zoomed and/or flipped frame
+
+        Only the visible part is resized, so the cost is proportional to the
+        viewport, not to the frame, for every new scroll position.  The
+        flipped frame and the last 8 resized viewports are kept until the
+        next ShowVideoFrame call, so repainting an area already shown is a
+        plain bitmap copy.
+        '''
+        render = self.videoRender
+        zoom = float(self.zoomfactor)
+        if not isPaintEvent or render is None or render['frame'] != frame:
+            rgb = script.AVI.GetDisplayArray(frame, self.GetProxyFactor(zoom))
+            if rgb is None:
+                return False
+            if 'flipvertical' in self.flip:
+                rgb = rgb[::-1]
+            if 'fliphorizontal' in self.flip:
+                rgb = rgb[:, ::-1]
+            render = self.videoRender = dict(frame=frame, rgb=rgb, avi=weakref.ref(script.AVI),
+                                             views=collections.OrderedDict())
+        try: # DoPrepareDC causes NameError in wx2.9.1 and fixed in wx2.9.2
+            self.videoWindow.DoPrepareDC(dc)
+        except:
+            self.videoWindow.PrepareDC(dc)
+        h, w = render['rgb'].shape[:2]
+        # A proxy frame is smaller than the display size
+        scale = zoom * script.AVI.DisplayWidth / w
+        ox, oy = dc.GetDeviceOrigin()
+        cw, ch = self.videoWindow.GetClientSize()
+        left, top = max(0, -ox), max(0, -oy)
+        right = min(int(round(w * scale)), cw - ox)
+        bottom = min(int(round(h * scale)), ch - oy)
+        if right > left and bottom > top:
+            bilinear = self.options['zoominterpolation'] == 'bilinear'
+            key = (scale, left, top, right, bottom, bilinear)
+            views = render['views']
+            bmp = views.get(key)
+            if bmp is None:
+                view = pyavs_display.Scale(render['rgb'], scale, left, top,
+                                           right - left, bottom - top, bilinear)
+                bmp = wx.BitmapFromBuffer(right - left, bottom - top, view)
+                views[key] = bmp
+                if len(views) > 8:
+                    views.popitem(last=False)
+            dc.DrawBitmap(bmp, left, top)
+        if self.cropDialog.IsShown() or self.trimDialog.IsShown():
+            dc.SetUserScale(zoom, zoom)
+            self.PaintTrimSelectionMark(dc, script, frame)
+            if self.cropDialog.IsShown():
+                self.PaintCropRectangles(dc, script)
+        return True
+
+    def GetProxyFactor(self, zoom=None):
+        '''Return the reduction of the display frames for a zoom level, see
+        pyavs.AvsClipBase._NativeDisplayFrame
+
+        The largest power of two, up to 8, that keeps at least one converted
+        sample per screen pixel.
+        '''
+        if zoom is None:
+            zoom = float(self.zoomfactor)
+        factor = 1
+        if self.options['proxypreview'] and zoom > 0:
+            while factor < 8 and factor * 2 * zoom <= 1:
+                factor *= 2
+        return factor
+
     def PaintTrimSelectionMark(self, dc, script, frame):
         if self.trimDialog.IsShown() and self.markFrameInOut:
             boolInside = self.ValueInSliderSelection(frame)
@@ -15414,6 +16707,12 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             script = self.currentScript
             if self.currentframenum == script.AVI.Framecount - 1:
                 return
+            # Frames rendered ahead are played at the exact frame rate, up to
+            # the end of the rendered range
+            buffer = getattr(script.AVI, 'frame_buffer', None)
+            last = buffer.GetRangeEnd(self.currentframenum) if buffer is not None else None
+            self.play_buffered = last is not None and last > self.currentframenum
+            self.play_last_frame = last if self.play_buffered else script.AVI.Framecount - 1
             self.playing_video = True
             self.play_button.SetBitmapLabel(self.bmpPause)
             self.play_button.Refresh()
@@ -15435,7 +16734,7 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                         current_time = time.time()
                         debug_stats_str = str((current_time - self.previous_time) * 1000)
                         self.previous_time = current_time
-                    if self.play_drop and self.play_speed_factor != 'max':
+                    if (self.play_drop or self.play_buffered) and self.play_speed_factor != 'max':
                         frame = self.play_initial_frame
                         increment = int(round(1000 * (time.time() - self.play_initial_time) / interval)) * factor
                         if debug_stats:
@@ -15446,10 +16745,12 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                         increment = 1
                     if debug_stats:
                         print(debug_stats_str)
-                    if not AsyncCall(self.ShowVideoFrame, frame + increment,
-                                     check_playing=True, focus=False).Wait():
+                    with probes.Probe('playback'):
+                        shown = AsyncCall(self.ShowVideoFrame, min(frame + increment, self.play_last_frame),
+                                          check_playing=True, focus=False).Wait()
+                    if not shown:
                         return
-                    if self.currentframenum == script.AVI.Framecount - 1:
+                    if self.currentframenum >= self.play_last_frame:
                         self.PlayPauseVideo()
                     else:
                         wx.Yield()
@@ -15566,7 +16867,8 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                             current_time = time.time()
                             debug_stats_str = str((current_time - self.previous_time) * 1000)
                             self.previous_time = current_time
-                        if self.parent.play_drop and self.parent.play_speed_factor != 'max':
+                        if ((self.parent.play_drop or self.parent.play_buffered) and
+                                self.parent.play_speed_factor != 'max'):
                             frame = self.play_initial_frame
                             increment = int(round(1000 * (time.time() - self.play_initial_time) / self.GetInterval())) * self.factor
                             if debug_stats:
@@ -15577,10 +16879,12 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                             increment = 1
                         if debug_stats:
                             print(debug_stats_str)
-                        if not self.parent.ShowVideoFrame(frame + increment,
-                                                          check_playing=True, focus=False):
+                        with probes.Probe('playback'):
+                            shown = self.parent.ShowVideoFrame(min(frame + increment, self.parent.play_last_frame),
+                                                               check_playing=True, focus=False)
+                        if not shown:
                             return
-                        if self.parent.currentframenum == script.AVI.Framecount - 1:
+                        if self.parent.currentframenum >= self.parent.play_last_frame:
                             self.parent.PlayPauseVideo()
                         elif not self.Yield(True):
                             self.parent.PlayPauseVideo()
@@ -15600,7 +16904,14 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             script = self.currentScript
         index = self.scriptNotebook.GetSelection()
         tabTitle = self.scriptNotebook.GetPageText(index)
-        if not script.GetModify() and os.path.isfile(script.filename):
+        server = None
+        if self.options['externalplayerserve']:
+            # Falls back to the script for clips without a y4m colorspace
+            server = self.StartFrameServer(script)
+        if server is not None:
+            previewname = server.address
+            boolTemp = False
+        elif not script.GetModify() and os.path.isfile(script.filename):
             # Always use original script if there are no unsaved changes
             previewname = script.filename
             boolTemp = False
@@ -15637,6 +16948,8 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                 path = ''
             dlg.Destroy()
         if not os.path.isfile(path):
+            if server is not None:
+                server.Stop()
             if path != '':
                 wx.MessageBox(_('A program must be specified to use this feature!'), _('Error'), style=wx.OK|wx.ICON_ERROR)
             return
@@ -15644,15 +16957,359 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         # Run the process
         process = wx.Process(self)
         def OnEndProcess(event):
-            try:
-                os.remove(previewname)
-            except OSError:
-                pass
-        if boolTemp:
+            if server is not None:
+                server.Stop()
+            if boolTemp:
+                try:
+                    os.remove(previewname)
+                except OSError:
+                    pass
+        if boolTemp or server is not None:
             process.Bind(wx.EVT_END_PROCESS, OnEndProcess)
         self.pid = wx.Execute('%s "%s" %s' % (path, previewname, args), wx.EXEC_ASYNC, process)
         return True
 
+    def StartFrameServer(self, script=None, frames=None, output=None):
+        '''Serve the frames of the clip of a tab, see frameserver.FrameServer
+
+        The frames are requested in the main thread, reusing the filter caches of
+        the preview.  Return the server or None if the clip can't be served.
+        '''
+        if script is None:
+            script = self.currentScript
+        if self.UpdateScriptAVI(script) is None or script.AVI.IsErrorClip():
+            return
+        clip = script.AVI
+        def Fetch(frame):
+            return AsyncCall(clip.RawFrame, frame, y4m_header=True).Wait()
+        try:
+            server = frameserver.FrameServer(clip, frames, output, Fetch)
+        except frameserver.FrameServerError:
+            return
+        self.frameServers = [item for item in self.frameServers if item.IsRunning()]
+        self.frameServers.append(server)
+        server.start()
+        return server
+
+    def GetRenderAheadFrames(self, script=None):
+        '''Return the frames to render ahead: the trim selections, or else the
+        frames between the bookmarks around the current frame'''
+        if script is None:
+            script = self.currentScript
+        last = script.AVI.Framecount - 1
+        selections = self.GetSliderSelections(self.invertSelection)
+        if selections:
+            frames = set()
+            for start, stop in selections:
+                frames.update(xrange(max(0, start), min(stop, last) + 1))
+            return sorted(frames)
+        current = self.currentframenum if script == self.currentScript else script.lastFramenum or 0
+        bookmarks = sorted(self.GetBookmarkFrameList())
+        start = max([value for value in bookmarks if value <= current] or [current])
+        stop = min([value for value in bookmarks if value > current] or [last + 1]) - 1
+        return range(start, min(stop, last) + 1)
+
+    def StartRenderAhead(self, script=None, frames=None):
+        '''Render the display frames of a tab into a buffer in the background
+
+        With the NumPy display conversion the frames are rendered by a
+        render.py process, and only converted in the main thread one at a
+        time, between the GUI events.  Otherwise they're requested in the
+        main thread, the AviSynth environment not being thread safe.
+        Rendering pauses during playback and stops if the script changes.
+        'frames' defaults to GetRenderAheadFrames.  Return False on errors.
+        '''
+        if script is None:
+            script = self.currentScript
+        self.StopRenderAhead()
+        if (self.UpdateScriptAVI(script) is None or script.AVI.IsErrorClip() or
+                not hasattr(script.AVI, 'BufferFrames')):
+            return False
+        clip = script.AVI
+        if frames is None:
+            frames = self.GetRenderAheadFrames(script)
+        size = len(frames) * clip.DisplayWidth * clip.DisplayHeight * 4
+        if not frames or not clip.BufferFrames(frames, size > self.options['renderaheadmemory'] * 1024 * 1024):
+            return False
+        stopped = threading.Event()
+        workdir_exp = self.ExpandVars(self.options['workdir'])
+        if (self.options['useworkdir'] and self.options['alwaysworkdir']
+            and os.path.isdir(workdir_exp)):
+                workdir = workdir_exp
+        else:
+            workdir = script.workdir
+        job = dict(action='raw', script=script.filename or 'AVS script',
+                   text=self.getCleanText(script.GetText()), workdir=workdir,
+                   frame_list=frames, times=True)
+        options = {'errormessagefont': self.options['errormessagefont']}
+
+        def Store(frame, data=None):
+            # Leave the main thread to the playback
+            while self.playing_video and not stopped.is_set():
+                time.sleep(0.1)
+            return not stopped.is_set() and AsyncCall(self._RenderAheadFrame, script, clip,
+                                                      frame, frame == frames[-1], data).Wait()
+
+        def RenderFrames():
+            for frame in frames:
+                if not Store(frame):
+                    break
+
+        def RenderProcess():
+            import render
+            size = clip.RawFrameSize()
+            fd, path = tempfile.mkstemp(prefix='avsp_')
+            events = render.RenderEvents([dict(job, output=render.EscapeOutput(path))], 1,
+                                         global_vars.avisynth_library_dir, options)
+            data = ''
+            i = 0
+            try:
+                for event in events:
+                    # Closing the generator terminates the process
+                    if stopped.is_set() or event['event'] == 'error':
+                        break
+                    # Read the frames written so far, the last one may be partial
+                    while i < len(frames):
+                        chunk = os.read(fd, size - len(data))
+                        if not chunk:
+                            break
+                        data += chunk
+                        if len(data) == size:
+                            if not Store(frames[i], data):
+                                return
+                            data = ''
+                            i += 1
+                    if event['event'] == 'done':
+                        costs = zip(frames, event['result'].get('times', ()))
+                        AsyncCall(self._RecordRenderAheadCosts, script, clip, costs).Wait()
+            except Exception:
+                pass
+            finally:
+                events.close()
+                os.close(fd)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+        target = RenderProcess if clip.native_display else RenderFrames
+        thread = threading.Thread(target=target, name='RenderAhead')
+        thread.daemon = True
+        thread.stopped = stopped
+        self.renderAheadThread = thread
+        self.renderAheadPainted = 0
+        thread.start()
+        return True
+
+    def StopRenderAhead(self):
+        '''Stop rendering ahead.  The frames already rendered are kept'''
+        if self.renderAheadThread is not None:
+            self.renderAheadThread.stopped.set()
+            self.renderAheadThread = None
+
+    def _RenderAheadFrame(self, script, clip, frame, last=False, data=None):
+        if script.AVI is not clip or clip.frame_buffer is None:
+            return False
+        if data is None:
+            ok = clip.BufferFrame(frame)
+        else:
+            ok = clip.BufferRawFrame(frame, data)
+        # Limit the refreshes of the fill indicator for fast scripts
+        if last or time.time() - self.renderAheadPainted > 0.25:
+            self.renderAheadPainted = time.time()
+            self.UpdateRenderAheadIndicator(script)
+            self.UpdateRenderTimeHeatmap(script, refresh=True)
+        return ok
+
+    def _RecordRenderAheadCosts(self, script, clip, costs):
+        '''Record the render times (frame, ms) of the frames rendered ahead by
+        a render.py process'''
+        if script.AVI is not clip:
+            return
+        for frame, ms in costs:
+            clip.RecordFrameCost(frame, ms / 1000.0)
+        self.UpdateRenderTimeHeatmap(script, refresh=True)
+
+    def UpdateRenderAheadIndicator(self, script=None):
+        '''Show the frames of a tab rendered ahead on the video slider'''
+        if script is None:
+            script = self.currentScript
+        if script != self.currentScript:
+            return
+        buffer = getattr(script.AVI, 'frame_buffer', None)
+        ranges = buffer.GetRanges() if buffer is not None else None
+        self.videoSlider.SetFilled(ranges)
+        if self.separatevideowindow:
+            self.videoSlider2.SetFilled(ranges)
+
+    def UpdateRenderTimeHeatmap(self, script=None, frame=None, refresh=False):
+        '''Show the render time of the frames of a tab on the video slider
+
+        With 'frame' only that frame is updated.  The whole heatmap is
+        computed again only if the clip changed or with 'refresh'.
+        '''
+        if script is None:
+            script = self.currentScript
+        if script != self.currentScript:
+            return
+        costs = getattr(script.AVI, 'frame_costs', None) if self.options['renderheatmap'] else None
+        sliders = [self.videoSlider]
+        if self.separatevideowindow:
+            sliders.append(self.videoSlider2)
+        for slider in sliders:
+            if slider.heatmap is costs and not refresh:
+                if frame is not None:
+                    slider.UpdateHeatmap(frame)
+            else:
+                slider.SetHeatmap(costs)
+
+    def FindSlowFrame(self, start=0, slowest=False):
+        '''Return the next frame from 'start' that took at least half the
+        time of the slowest one to render, or the slowest frame.  None if no
+        render times were measured'''
+        costs = getattr(self.currentScript.AVI, 'frame_costs', None)
+        if not costs:
+            return
+        maxcost = max(costs)
+        if not maxcost:
+            return
+        if slowest:
+            return costs.index(maxcost)
+        start = start % len(costs)
+        for frame in range(start, len(costs)) + range(start):
+            if costs[frame] * 2 >= maxcost:
+                return frame
+
+    def SetPrefetchThreads(self, threads, script=None):
+        '''Append Prefetch(threads) to the clip of a tab (AviSynth+), 0 to
+        evaluate the script as written.  The script text is not changed'''
+        if script is None:
+            script = self.currentScript
+        threads = max(0, int(threads))
+        if threads == script.prefetchThreads:
+            return
+        script.prefetchThreads = threads
+        # Evaluate the script again on the next update
+        script.previewtxt = []
+        if script == self.currentScript:
+            self.refreshAVI = True
+            if self.previewWindowVisible:
+                self.ShowVideoFrame()
+
+    def ReportPrefetchError(self, script, error):
+        '''Tell that the Prefetch of a tab could not be appended, once per error'''
+        if error == script.prefetchError:
+            return
+        script.prefetchError = error
+        wx.MessageBox(u'\n\n'.join((_('Prefetch({threads}) could not be appended, the script '
+                                       'is evaluated as written').format(threads=script.prefetchThreads),
+                                     error)), _('Warning'), style=wx.OK|wx.ICON_WARNING)
+
+    def BenchmarkPrefetch(self, script=None, frames=None, max_threads=None):
+        '''Measure the frame rate of a tab with Prefetch from 1 to 'max_threads'
+
+        Each thread count is evaluated in a new environment.  'frames'
+        defaults to GetRenderAheadFrames.  Return a list of (threads, fps),
+        None on errors or if cancelled.
+        '''
+        if script is None:
+            script = self.currentScript
+        if self.playing_video:
+            self.PlayPauseVideo()
+        self.StopRenderAhead()
+        if self.UpdateScriptAVI(script) is None or script.AVI.IsErrorClip():
+            wx.MessageBox(_('Error loading the script'), _('Error'), style=wx.OK|wx.ICON_ERROR)
+            return
+        if frames is None:
+            frames = self.GetRenderAheadFrames(script)
+        if not frames:
+            return
+        if max_threads is None:
+            max_threads = self.options['prefetchmaxthreads']
+        if not max_threads:
+            try:
+                max_threads = multiprocessing.cpu_count()
+            except NotImplementedError:
+                max_threads = 4
+        workdir_exp = self.ExpandVars(self.options['workdir'])
+        if (self.options['useworkdir'] and self.options['alwaysworkdir']
+            and os.path.isdir(workdir_exp)):
+                workdir = workdir_exp
+        else:
+            workdir = script.workdir
+        for index in xrange(self.scriptNotebook.GetPageCount()):
+            if script == self.scriptNotebook.GetPage(index):
+                break
+        filename = os.path.join(os.path.dirname(script.filename), self.scriptNotebook.GetPageText(index))
+        text = self.getCleanText(script.GetText())
+        progress = wx.ProgressDialog(message=_('Starting benchmark...'), title=_('Benchmark threads'),
+                                     maximum=max_threads * len(frames),
+                                     style=wx.PD_CAN_ABORT|wx.PD_ELAPSED_TIME|wx.PD_REMAINING_TIME)
+        results = []
+        try:
+            for threads in range(1, max_threads + 1):
+                clip = pyavs.AvsClip(text, filename, workdir=workdir, display_clip=False,
+                                     prefetch=threads)
+                if not clip.initialized or clip.IsErrorClip():
+                    wx.MessageBox(u'\n\n'.join((_('Error loading the script'), clip.error_message or '')),
+                                  _('Error'), style=wx.OK|wx.ICON_ERROR)
+                    return
+                if clip.prefetch != threads:
+                    wx.MessageBox(u'\n\n'.join((_('Prefetch({threads}) could not be appended').format(
+                                  threads=threads), clip.prefetch_error or '')),
+                                  _('Error'), style=wx.OK|wx.ICON_ERROR)
+                    return
+                # Leave out the start of the sources and of the threads
+                clip.clip.get_frame(frames[0])
+                start = time.time()
+                previous_time = start
+                for i, frame in enumerate(frames[1:] or frames):
+                    error = clip.RequestFrame(frame)
+                    if error:
+                        wx.MessageBox(u'\n\n'.join((_('Error requesting frame {number}').format(number=frame),
+                                      error)), _('Error'), style=wx.OK|wx.ICON_ERROR)
+                        return
+                    now = time.time()
+                    if now - previous_time > 0.1:
+                        previous_time = now
+                        if not progress.Update((threads - 1) * len(frames) + i,
+                                _('{threads} threads: frame {number}').format(threads=threads,
+                                                                               number=frame))[0]:
+                            return
+                elapsed = time.time() - start
+                results.append((threads, len(frames[1:] or frames) / elapsed if elapsed else 0))
+                clip = None
+        finally:
+            progress.Destroy()
+        return results
+
+    def FrameCostsKey(self, scripttxt, avi):
+        '''Identify the evaluated script the render times of a tab belong to'''
+        return (md5(self.getCleanText(scripttxt).encode('utf8')).hexdigest(), avi.Framecount)
+
+    def RestoreFrameCosts(self, script, scripttxt):
+        '''Restore the render times of a tab saved with the session, if they
+        were measured on the same script'''
+        script.frameCostsKey = self.FrameCostsKey(scripttxt, script.AVI)
+        if script.frameCosts is None or script.AVI.frame_costs is not None:
+            return False
+        key, data = script.frameCosts
+        if key != script.frameCostsKey:
+            return False
+        costs = array.array('H')
+        try:
+            costs.fromstring(zlib.decompress(data))
+        except (zlib.error, ValueError):
+            return False
+        return script.AVI.SetFrameCosts(costs)
+
+    def GetFrameCostsInfo(self, script):
+        '''Return the render times of a tab to save with the session'''
+        costs = getattr(script.AVI, 'frame_costs', None)
+        if costs is not None and script.frameCostsKey is not None:
+            return (script.frameCostsKey, zlib.compress(costs.tostring()))
+        return script.frameCosts
+
     def re_replace(self, mo):
         items = mo.group().lstrip(self.sliderOpenString).rstrip(self.sliderCloseString).split(',')
         if len(items) == 4:
@@ -15877,6 +17534,52 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
         script.sliderWindow.Thaw()
 
     def ParseCalltipArgInfo(self, info, strValue=None):
+        '''Return (argtype, argname, guitype, defaultValue, other) from the calltip
+        text of an argument
+
+        The results are kept in self.calltipArgSchema.  'strValue', the value in
+        the script, is only used by numerical arguments without a numerical
+        default, which are parsed again every time.
+        '''
+        entry = self.calltipArgSchema.get(info)
+        if entry is None:
+            schema = self._ParseCalltipArgInfo(info)
+            entry = self.calltipArgSchema[info] = (
+                schema, schema != self._ParseCalltipArgInfo(info, strValue='0'))
+        schema, uses_value = entry
+        if uses_value and strValue is not None:
+            return self._ParseCalltipArgInfo(info, strValue)
+        return schema
+
+    def BenchmarkCalltips(self, repeat=5):
+        '''Time the parsing of the calltips of every filter in the database
+
+        Returns the number of filters and arguments and the milliseconds taken
+        by a pass without and with the parsed calltips, the best of 'repeat'.
+        '''
+        script = self.currentScript
+        calltips = [args.split('\n\n')[0] for args, styletype, name, is_short
+                    in self.avsfilterdict.itervalues() if not is_short]
+        def ParsePass(cached):
+            count = 0
+            start = time.time()
+            for calltip in calltips:
+                if cached:
+                    argInfo = script.GetFilterCalltipArgInfo(calltip=calltip)
+                else:
+                    argInfo = script._ParseFilterCalltip(calltip)
+                for item in argInfo:
+                    if cached:
+                        self.ParseCalltipArgInfo(item[0])
+                    else:
+                        self._ParseCalltipArgInfo(item[0])
+                    count += 1
+            return (time.time() - start) * 1000, count
+        uncached, count = min(ParsePass(False) for i in xrange(repeat))
+        cached = min(ParsePass(True)[0] for i in xrange(repeat))
+        return dict(filters=len(calltips), arguments=count, uncached=uncached, cached=cached)
+
+    def _ParseCalltipArgInfo(self, info, strValue=None):
         # TODO: handle repeating args [, ...]
         info = re.sub(r'\[.*\]', '', info)
         argtypename = info.split('=', 1)[0].strip()
@@ -16180,6 +17883,8 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             valTxtCtrl.SetLabel(strTemplate % value)
             if isRescaled:
                 valTxtCtrl2.SetLabel(strTemplate2 % Rescale(value))
+            if event.GetEventType() == wx.wxEVT_SCROLL_THUMBTRACK:
+                self.ScheduleUserSliderUpdate(slider)
         # Create the slider
         slider = wxp.Slider(parent, wx.ID_ANY,
             value, minValue, maxValue,
@@ -16242,6 +17947,8 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                 self.UserSliderVideoUpdate(slider)
                 if leftCtrl.HasCapture():
                     leftCtrl.ReleaseMouse()
+            else:
+                self.ScheduleUserSliderUpdate(slider)
             event.Skip()
         leftTimer = wx.Timer(leftCtrl)
         leftCtrl.Bind(wx.EVT_TIMER, OnLeftTimer)
@@ -16273,6 +17980,8 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                 self.UserSliderVideoUpdate(slider)
                 if rightCtrl.HasCapture():
                     rightCtrl.ReleaseMouse()
+            else:
+                self.ScheduleUserSliderUpdate(slider)
             event.Skip()
         rightTimer = wx.Timer(rightCtrl)
         rightCtrl.Bind(wx.EVT_TIMER, OnRightTimer)
@@ -17002,6 +18711,7 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             old_style_triple_quotes = self.options['syntaxhighlight_styleinsidetriplequotes']
             old_use_custom_video_background = self.options['use_customvideobackground']
             old_custom_video_background = self.options['customvideobackground']
+            old_numpy_display = self.options['numpydisplay']
             self.options.update(dlg.GetDict())
             if self.options['pluginsdir'] != old_plugins_directory:
                 self.SetPluginsDirectory(old_plugins_directory)
@@ -17021,6 +18731,8 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                     self.options['syntaxhighlight_styleinsidetriplequotes'] != old_style_triple_quotes):
                         script.styling_refresh_needed = True
                 script.SetUserOptions()
+                if self.options['numpydisplay'] != old_numpy_display and script.AVI:
+                    script.display_clip_refresh_needed = True
                 if not self.options['usetabimages']:
                     self.scriptNotebook.SetPageImage(i, -1)
             self.UpdateProgramTitle()
@@ -17935,6 +19647,68 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             return False
         return script.AVI.Framecount
 
+    @AsyncCallWrapper
+    def MacroLoadTimecodes(self, filename, index=None):
+        r'''LoadTimecodes(filename, index=None)
+
+        Loads a timecode format v1, v2 or v4 file as the frame times of the video of
+        the script at the tab integer 'index', used by FrameToTime, TimeToFrame, the
+        status bar and the bookmark times.  The timecodes are kept while the number
+        of frames doesn't change.  If 'index' is None, then the currently selected
+        tab is used.  If 'filename' is None, removes the loaded timecodes.  Returns
+        False if the file could not be read.
+
+        '''
+        script, index = self.getScriptAtIndex(index)
+        if script is None:
+            return False
+        self.refreshAVI = True
+        if self.UpdateScriptAVI(script) is None:
+            wx.MessageBox(_('Error loading the script'), _('Error'), style=wx.OK|wx.ICON_ERROR)
+            return False
+        if filename is None:
+            script.AVI.timestamps = None
+        else:
+            try:
+                script.AVI.timestamps = timecodes.TimestampIndex.FromFile(filename, script.AVI.Framecount)
+            except (IOError, timecodes.TimecodeError) as err:
+                wx.MessageBox(u'%s\n\n%s' % (_('Error loading the timecodes'), err),
+                              _('Error'), style=wx.OK|wx.ICON_ERROR)
+                return False
+        script.AVI.ffms_info = None
+        if script == self.currentScript:
+            self.SetVideoStatusText()
+        return True
+
+    @AsyncCallWrapper
+    def MacroFrameToTime(self, frame, index=None):
+        r'''FrameToTime(frame, index=None)
+
+        Returns the time in seconds of the 'frame' of the video of the script at the
+        tab integer 'index'.  The timecodes loaded with LoadTimecodes or read from
+        FFMS2 sources are used if available, the frame rate otherwise.  If 'index'
+        is None, then the currently selected tab is used.
+
+        '''
+        script, index = self.getScriptAtIndex(index)
+        if script is None or self.UpdateScriptAVI(script) is None:
+            return None
+        return self.GetTimestamps(script).FrameTime(frame) / 1000.0
+
+    @AsyncCallWrapper
+    def MacroTimeToFrame(self, seconds, index=None):
+        r'''TimeToFrame(seconds, index=None)
+
+        Returns the frame of the video of the script at the tab integer 'index'
+        shown at 'seconds', see FrameToTime.  If 'index' is None, then the currently
+        selected tab is used.
+
+        '''
+        script, index = self.getScriptAtIndex(index)
+        if script is None or self.UpdateScriptAVI(script) is None:
+            return None
+        return self.GetTimestamps(script).TimeFrame(seconds * 1000.0)
+
     @AsyncCallWrapper
     def MacroGetPixelInfo(self, color='hex', wait=False, lines=False):
         '''GetPixelInfo(color='hex', wait=False, lines=False)
@@ -18105,6 +19879,28 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
                 raise
             return
 
+    @AsyncCallWrapper
+    def MacroServeFrames(self, output=None, frames=None, index=None):
+        r'''ServeFrames(output=None, frames=None, index=None)
+
+        Serves the video of the script at the tab integer 'index' as a yuv4mpeg2
+        stream to another program, without evaluating the script again.  'output' is
+        the path of a FIFO to create, 'tcp' or 'tcp:PORT', or None for a temporary
+        FIFO (a TCP port on Windows).  'frames' is a list of frame numbers, all the
+        frames by default.  The stream ends when all the frames are sent or the
+        reading program closes it.
+
+        Returns the path of the FIFO or the 'tcp://127.0.0.1:PORT' URL to read, or None
+        if the script can't be loaded or its colorspace can't be used with y4m.
+
+        '''
+        script, index = self.getScriptAtIndex(index)
+        if script is None:
+            return
+        server = self.StartFrameServer(script, frames, output)
+        if server is not None:
+            return server.address
+
     @AsyncCallWrapper
     def MacroRunExternalPlayer(self, executable=None, args='', index=None):
         r'''RunExternalPlayer(executable=None, args='', index=None)
@@ -18263,6 +20059,73 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             except: pass
             raise err
 
+    def MacroBatch(self, scripts, action='info', processes=None, callback=None, **kwargs):
+        r"""Batch(scripts, action='info', processes=None, callback=None, **kwargs)
+
+        Evaluate several scripts in parallel, without opening them in tabs
+
+        Every script is loaded off-screen by a pool of worker processes, each one
+        with its own AviSynth environment, and processed according to 'action'.
+        Returns a list with the result of each script, None if it failed.  Run
+        the macro in its own thread to keep the program responsive meanwhile.
+
+        scripts: list of script texts or paths to AviSynth scripts.
+        action: one of the following strings:
+                - 'info': dict with the clip properties.
+                - 'vars': dict with the value of the variables named in the
+                  additional 'vars' argument (a list), None if not defined.
+                - 'images': save frames to the file name pattern 'output',
+                  PNG if it ends with '.png', PPM otherwise.
+                - 'y4m', 'raw': write the frames to the file 'output', or pipe
+                  them to a command if 'output' starts with '|'.
+                - 'stats': min, max and average of every plane.
+                - 'autocrop': crop values valid for sampled frames.
+                - 'timestamps': dict with the FFMS2 time of every frame in
+                  ms, also saved as a timecode v2 file to 'output' if given.
+        processes: maximum number of worker processes.  Defaults to the number
+                   of CPUs.
+        callback: user function called as soon as each script is processed, with
+                  the script index, the result and the error message or None.
+                  Return False to cancel the remaining scripts.
+        kwargs: additional job parameters: 'frames' ([first, last]), 'frame_list',
+                'output' (accepts {index}, {name} and, for images, {frame}),
+                'vars', 'matrix', 'interlaced', 'samples', 'tolerance'.
+
+        """
+        import render
+        workdir_exp = self.ExpandVars(self.options['workdir'])
+        if (self.options['useworkdir'] and self.options['alwaysworkdir']
+            and os.path.isdir(workdir_exp)):
+                workdir = workdir_exp
+        else:
+            workdir = None
+        jobs = []
+        for text in scripts:
+            job = dict(kwargs, action=action)
+            if os.path.isfile(text):
+                job['script'] = os.path.abspath(text)
+                job['text'] = self.GetTextFromFile(text)[0]
+            else:
+                job['script'] = 'AVS script'
+                job['text'] = self.getCleanText(text)
+            if workdir:
+                job['workdir'] = workdir
+            jobs.append(job)
+        results = [None] * len(jobs)
+        options = {'errormessagefont': self.options['errormessagefont']}
+        events = render.RenderEvents(jobs, processes, global_vars.avisynth_library_dir, options)
+        try:
+            for event in events:
+                if event['event'] not in ('done', 'error'):
+                    continue
+                index = event['job']
+                results[index] = event.get('result')
+                if callback and callback(index, results[index], event.get('message')) is False:
+                    break
+        finally:
+            events.close()
+        return results
+
     @AsyncCallWrapper
     def MacroGetBookmarkFrameList(self, title=False):
         r'''GetBookmarkList(title=False)
@@ -18417,6 +20280,90 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             info.append((text, label, numlist, nDecimal))
         return info
 
+    def MacroSweepSliders(self, metric, mode='grid', minimize=False, metric_script='',
+                          frames=None, index=None, processes=None, callback=None,
+                          cache=None, **kwargs):
+        r"""SweepSliders(metric, mode='grid', minimize=False, metric_script='', frames=None, index=None, processes=None, callback=None, cache=None, **kwargs)
+
+        Search the values of the user sliders of the script in the tab located at
+        the integer 'index' (None for the current tab) that give the best score.
+        Every candidate script is evaluated off-screen by a pool of worker processes.
+        Scores are saved as soon as they are known, so a sweep that is interrupted
+        resumes where it stopped when run again.  Run the macro in its own thread
+        to keep the program responsive meanwhile.
+
+        Returns a list of (score, values, text) for every candidate evaluated, best
+        first, where 'values' is a dict {slider label: value} and 'text' the script
+        with the sliders replaced by the values.
+
+        metric: AviSynth runtime expression giving the score of a frame, e.g.
+                'LumaDifference(last, ref)'.  The score of a candidate is the
+                average over 'frames'.
+        mode: 'grid' (every combination), 'random' or 'genetic'.
+        minimize: if True lower scores are better.
+        metric_script: AviSynth code evaluated before every candidate, e.g. to
+                       load the reference clip.
+        frames: list of frame numbers to evaluate, None for every frame.
+        processes: maximum number of worker processes.  Defaults to the number
+                   of CPUs.
+        callback: user function called after each candidate with the number of
+                  candidates done, the total, the values, the score and the error
+                  message or None.  Return False to stop the sweep.
+        cache: file name of the score cache.  Defaults to 'sweep_cache.jsonl' in
+               the program directory, '' keeps the scores only in memory.
+        kwargs: 'steps' (grid mode, maximum number of values per slider), 'count'
+                (number of random candidates or genetic population, default 100),
+                'generations' (default 10) and the genetic algorithm settings
+                'crossover', 'mutation' and 'selection'.
+
+        """
+        import sweep
+        script, index = AsyncCallWrapper(self.getScriptAtIndex)(index)
+        if script is None:
+            return []
+        params = [info for info in self.MacroGetSliderInfo(index)
+                  if len(info) == 4 and info[2] is not None]
+        # Keep the sliders to sweep through cleaning the other ones and the tags
+        template = self.MacroGetText(index)
+        placeholders = []
+        for i, (text, label, values, decimals) in enumerate(params):
+            placeholder = '__avsp_sweep_{0}__'.format(i)
+            template = template.replace(text, placeholder)
+            placeholders.append((placeholder, label, values, decimals))
+        template = self.getCleanText(template)
+        workdir_exp = self.ExpandVars(self.options['workdir'])
+        if (self.options['useworkdir'] and self.options['alwaysworkdir']
+            and os.path.isdir(workdir_exp)):
+                workdir = workdir_exp
+        else:
+            workdir = script.workdir
+        if cache is None:
+            cache = os.path.join(self.programdir, 'sweep_cache.jsonl')
+        options = {'errormessagefont': self.options['errormessagefont']}
+        results = sweep.Sweep(template, placeholders, metric, mode, minimize, metric_script,
+                              frames, processes=processes, cache=cache, callback=callback,
+                              filename=script.filename, workdir=workdir,
+                              library_dir=global_vars.avisynth_library_dir,
+                              options=options, **kwargs)
+        return [(score, sweep.Values(placeholders, candidate),
+                 sweep.Substitute(template, placeholders, candidate))
+                for score, candidate in results]
+
+    @AsyncCallWrapper
+    def MacroBenchmarkCalltips(self, repeat=5):
+        r'''BenchmarkCalltips(repeat=5)
+
+        Measures the time taken to parse the calltips of all the filters in the
+        database into the argument information used by the calltips and the
+        automatic sliders, without and with the parsed calltips kept by AvsPmod.
+        Each pass is run 'repeat' times and the fastest is taken.
+
+        Returns a dictionary with the number of 'filters' and 'arguments' and the
+        times of a pass in milliseconds, 'uncached' and 'cached'.
+
+        '''
+        return self.BenchmarkCalltips(repeat)
+
     @staticmethod
     def FormatDocstring(method=None, docstring=None):
         '''Format docstrings, adapted from PEP 257'''
@@ -18552,16 +20499,26 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             self.__doc__ += parent.FormatDocstring(self.GetVideoFramerate)
             self.GetVideoFramecount = parent.MacroGetVideoFramecount
             self.__doc__ += parent.FormatDocstring(self.GetVideoFramecount)
+            self.LoadTimecodes = parent.MacroLoadTimecodes
+            self.__doc__ += parent.FormatDocstring(self.LoadTimecodes)
+            self.FrameToTime = parent.MacroFrameToTime
+            self.__doc__ += parent.FormatDocstring(self.FrameToTime)
+            self.TimeToFrame = parent.MacroTimeToFrame
+            self.__doc__ += parent.FormatDocstring(self.TimeToFrame)
             self.GetPixelInfo = parent.MacroGetPixelInfo
             self.__doc__ += parent.FormatDocstring(self.GetPixelInfo)
             self.GetVar = parent.MacroGetVar
             self.__doc__ += parent.FormatDocstring(self.GetVar)
             self.RunExternalPlayer = parent.MacroRunExternalPlayer
             self.__doc__ += parent.FormatDocstring(self.RunExternalPlayer)
+            self.ServeFrames = parent.MacroServeFrames
+            self.__doc__ += parent.FormatDocstring(self.ServeFrames)
             self.Pipe = parent.MacroPipe
             self.__doc__ += parent.FormatDocstring(self.Pipe)
             self.SaveImage = parent.MacroSaveImage
             self.__doc__ += parent.FormatDocstring(self.SaveImage)
+            self.Batch = parent.MacroBatch
+            self.__doc__ += parent.FormatDocstring(self.Batch)
             # Bookmarks
             self.GetBookmarkList = parent.MacroGetBookmarkFrameList
             self.__doc__ += parent.FormatDocstring(self.GetBookmarkList)
@@ -18580,6 +20537,10 @@ class MainFrame(wxp.Frame, WndProcHookMixin):
             #~ SetAvs2aviDir = parent.MacroSetAvs2aviDir
             self.GetSliderInfo = parent.MacroGetSliderInfo
             self.__doc__ += parent.FormatDocstring(self.GetSliderInfo)
+            self.SweepSliders = parent.MacroSweepSliders
+            self.__doc__ += parent.FormatDocstring(self.SweepSliders)
+            self.BenchmarkCalltips = parent.MacroBenchmarkCalltips
+            self.__doc__ += parent.FormatDocstring(self.BenchmarkCalltips)
             #~ UpdateFunctionDefinitions = parent.UpdateFunctionDefinitions
             self.ExecuteMenuCommand = parent.MacroExecuteMenuCommand
             self.__doc__ += parent.FormatDocstring(self.ExecuteMenuCommand)
@@ -0,0 +1,479 @@
+# AvsP - an AviSynth editor
+#
+# Copyright 2007 Peter Jang <http://www.avisynth.org/qwerpoi>
+#           2010-2017 the AvsPmod authors <https://github.com/avspmod/avspmod>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA, or visit
+#  http://www.gnu.org/copyleft/gpl.html .
+
+# farm - render workers on other machines
+#
+# A worker daemon runs render.py jobs (see the manifest format there) sent
+# over a TCP or Unix socket and streams back the progress events.  The
+# dispatcher distributes a list of jobs among several workers, each one
+# taking a new job as soon as one of its processes is free, and yields the
+# same events as render.RenderEvents.  Scripts are sent as text; the files
+# they read and the outputs must be on storage shared by all the machines,
+# unless the job output is streamed back to the dispatcher.
+#
+# Usage:
+#     python farm.py worker [--listen HOST:PORT|PATH] [-j PROCESSES] [--allow-commands]
+#     python farm.py dispatch --workers HOST:PORT,... manifest.json
+#
+# Security:
+#     The workers and the dispatcher share a secret, given with --secret or
+#     preferably the AVSP_FARM_SECRET environment variable.  Connections that
+#     don't prove they know it are refused.  A worker listening on an address
+#     other than the loopback requires a secret.  Job outputs starting with
+#     '|' run a shell command on the worker, they're refused unless it was
+#     started with --allow-commands.  Unix sockets are only accessible to
+#     their owner.
+#
+# Protocol:
+#     Every message is a type byte, 'J' (UTF-8 JSON) or 'D' (raw data),
+#     followed by the payload length (4 bytes, big-endian) and the payload.
+#     The worker starts every connection with a challenge:
+#         {"event": "challenge", "protocol": 2, "nonce": "..."}
+#     The dispatcher then sends one request, with "auth" the hex HMAC-SHA256
+#     of the nonce keyed with the secret:
+#         {"request": "hello", "auth": "..."}
+#             -> {"event": "hello", "protocol": 2, "processes": 4, "name": "box1"}
+#         {"request": "job", "auth": "...", "job": {...}, "stream": false}
+#             -> render.py events for job 0, the last one 'done' or 'error'.
+#     With "stream": true the output is written by the worker to a temporary
+#     file and sent as data messages before the 'done' event.  A request
+#     failing the authentication gets an 'error' event.
+#
+# Dependencies:
+#     Python (tested on v2.7)
+# Scripts:
+#     render.py
+
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import hmac
+import hashlib
+import binascii
+import tempfile
+import threading
+import optparse
+import multiprocessing
+import Queue
+import SocketServer
+
+import global_vars
+
+PROTOCOL = 2
+DEFAULT_PORT = 50100
+SECRET_VARIABLE = 'AVSP_FARM_SECRET'
+MAX_MESSAGE = 64 * 1024 * 1024
+DATA_BLOCK = 1024 * 1024
+CONNECT_TIMEOUT = 5
+
+class FarmError(Exception):
+    pass
+
+# Messages
+
+def SendMessage(sock, message=None, data=None):
+    '''Send a JSON message or, if 'data' is given, a data message'''
+    if data is None:
+        kind, data = 'J', json.dumps(message)
+    else:
+        kind = 'D'
+    sock.sendall(kind + struct.pack('>I', len(data)) + data)
+
+def _RecvExactly(sock, size):
+    chunks = []
+    while size:
+        data = sock.recv(min(size, DATA_BLOCK))
+        if not data:
+            raise FarmError('Connection closed')
+        chunks.append(data)
+        size -= len(data)
+    return ''.join(chunks)
+
+def RecvMessage(sock):
+    '''Return ('J', message) or ('D', data)'''
+    header = _RecvExactly(sock, 5)
+    kind, size = header[0], struct.unpack('>I', header[1:])[0]
+    if kind not in 'JD' or size > MAX_MESSAGE:
+        raise FarmError('Invalid message')
+    data = _RecvExactly(sock, size)
+    if kind == 'J':
+        return kind, json.loads(data)
+    return kind, data
+
+def _Secret(secret=None):
+    '''The shared secret as bytes, by default from the environment'''
+    if secret is None:
+        secret = os.environ.get(SECRET_VARIABLE, '')
+    return secret.encode('utf-8') if isinstance(secret, unicode) else secret
+
+def _Signature(secret, nonce):
+    return hmac.new(secret, nonce.encode('ascii'), hashlib.sha256).hexdigest()
+
+def ParseAddress(address):
+    ''''host:port', 'port' or the path of a Unix socket'''
+    address = address.strip()
+    if os.sep in address or address.startswith('unix:'):
+        return address[5:] if address.startswith('unix:') else address
+    host, sep, port = address.rpartition(':')
+    try:
+        return host or '127.0.0.1', int(port)
+    except ValueError:
+        raise FarmError('Invalid worker address: {0}'.format(address))
+
+def Connect(address, timeout=CONNECT_TIMEOUT):
+    address = ParseAddress(address) if isinstance(address, basestring) else address
+    family = socket.AF_UNIX if isinstance(address, basestring) else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(address)
+    except socket.error as err:
+        sock.close()
+        raise FarmError('Cannot connect to {0}: {1}'.format(address, err))
+    sock.settimeout(None)
+    return sock
+
+def Request(address, request, secret=None):
+    '''Connect to a worker and send an authenticated request, return the socket'''
+    sock = Connect(address)
+    try:
+        kind, challenge = RecvMessage(sock)
+        if (kind != 'J' or challenge.get('event') != 'challenge' or
+                challenge.get('protocol') != PROTOCOL):
+            raise FarmError('Incompatible worker: {0}'.format(address))
+        auth = _Signature(_Secret(secret), challenge['nonce'])
+        SendMessage(sock, dict(request, auth=auth))
+    except (FarmError, socket.error, ValueError, KeyError, UnicodeError) as err:
+        sock.close()
+        if isinstance(err, FarmError):
+            raise
+        raise FarmError('Invalid answer from {0}: {1}'.format(address, err))
+    return sock
+
+# Worker
+
+class _Handler(SocketServer.BaseRequestHandler):
+
+    def handle(self):
+        server = self.server
+        try:
+            nonce = binascii.hexlify(os.urandom(16))
+            SendMessage(self.request, {'event': 'challenge', 'protocol': PROTOCOL,
+                                       'nonce': nonce})
+            kind, request = RecvMessage(self.request)
+            if kind != 'J' or not isinstance(request, dict):
+                raise FarmError('Invalid request')
+            auth = request.get('auth')
+            if not (isinstance(auth, basestring) and hmac.compare_digest(
+                    _Signature(server.secret, nonce), auth.encode('ascii', 'replace'))):
+                SendMessage(self.request, {'event': 'error', 'job': 0,
+                                           'message': 'Authentication failed'})
+                raise FarmError('Authentication failed')
+            if request.get('request') == 'hello':
+                SendMessage(self.request, {'event': 'hello', 'protocol': PROTOCOL,
+                                           'processes': server.processes,
+                                           'name': socket.gethostname()})
+            elif request.get('request') == 'job':
+                with server.slots:
+                    self.RunJob(request['job'], request.get('stream', False))
+            else:
+                raise FarmError('Unknown request: {0}'.format(request.get('request')))
+        except (FarmError, socket.error, ValueError, KeyError):
+            pass
+
+    def RunJob(self, job, stream):
+        import render
+        server = self.server
+        streamname = None
+        output = job.get('output')
+        if (not stream and isinstance(output, basestring) and output.startswith('|')
+                and not server.allow_commands):
+            SendMessage(self.request, {'event': 'error', 'job': 0, 'message':
+                        'The worker doesn\'t run output commands (see --allow-commands)'})
+            return
+        if stream:
+            handle, streamname = tempfile.mkstemp(prefix='avsp_farm_')
+            os.close(handle)
+            job = dict(job, output=render.EscapeOutput(streamname))
+        events = render.RenderEvents([job], 1, server.library_dir, server.options)
+        try:
+            for event in events:
+                if event['event'] == 'finished':
+                    break
+                if event['event'] == 'done' and streamname:
+                    with open(streamname, 'rb') as f:
+                        while True:
+                            data = f.read(DATA_BLOCK)
+                            if not data:
+                                break
+                            SendMessage(self.request, data=data)
+                SendMessage(self.request, event)
+        finally:
+            # Terminates the render process if the dispatcher is gone
+            events.close()
+            if streamname:
+                os.remove(streamname)
+
+class _TCPServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+if hasattr(socket, 'AF_UNIX'):
+    class _UnixServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+        daemon_threads = True
+
+def Worker(address='127.0.0.1:%i' % DEFAULT_PORT, processes=None, library_dir='', options=None,
+           secret=None, allow_commands=False):
+    '''Create a worker daemon, call serve_forever on the returned server
+
+    'processes' jobs run at the same time (default: number of CPUs), each
+    in its own process.  'secret' defaults to the AVSP_FARM_SECRET
+    environment variable, it's required unless the worker only listens on
+    the loopback or a Unix socket.  With 'allow_commands' job outputs can
+    be shell commands.
+    '''
+    address = ParseAddress(address)
+    secret = _Secret(secret)
+    if isinstance(address, basestring):
+        if os.path.exists(address):
+            os.remove(address)
+        # Only the owner can connect
+        umask = os.umask(0o177)
+        try:
+            server = _UnixServer(address, _Handler)
+        finally:
+            os.umask(umask)
+    else:
+        if not secret and not (address[0] == 'localhost' or address[0].startswith('127.')
+                               or address[0] == '::1'):
+            raise FarmError('A secret is required to listen on {0} (see {1})'.format(
+                            address[0], SECRET_VARIABLE))
+        server = _TCPServer(address, _Handler)
+    server.secret = secret
+    server.allow_commands = allow_commands
+    server.processes = processes or multiprocessing.cpu_count()
+    server.slots = threading.BoundedSemaphore(server.processes)
+    server.library_dir = library_dir
+    server.options = options or {}
+    return server
+
+# Dispatcher
+
+def Hello(address, secret=None):
+    '''Return the hello message of a worker'''
+    sock = Request(address, {'request': 'hello'}, secret)
+    try:
+        kind, message = RecvMessage(sock)
+    finally:
+        sock.close()
+    if kind == 'J' and message.get('event') == 'error':
+        raise FarmError('{0}: {1}'.format(address, message.get('message')))
+    if kind != 'J' or message.get('protocol') != PROTOCOL:
+        raise FarmError('Incompatible worker: {0}'.format(address))
+    return message
+
+def _PrepareJob(job):
+    '''Send the script text, scripts paths may not exist on the workers'''
+    job = dict(job)
+    if 'text' not in job:
+        filename = os.path.abspath(job['script'])
+        with open(filename, 'rb') as f:
+            job['text'] = f.read()
+        job['script'] = filename
+        job.setdefault('workdir', os.path.dirname(filename))
+    return job
+
+def DispatchEvents(jobs, workers, stream=False, retries=1, secret=None):
+    '''Run a list of render.py jobs on remote workers
+
+    'workers' is a list of addresses, 'secret' the one shared with them
+    (default: the AVSP_FARM_SECRET environment variable).  Every worker runs as many jobs at
+    the same time as its processes.  A job whose worker fails or is
+    unreachable is sent again, to any worker, up to 'retries' times.  With
+    'stream' the output of the jobs is sent back and written to their
+    'output' file locally.
+
+    Generator yielding the render.py events as they arrive, with an
+    additional 'worker' key, the last one being 'finished'.  Closing the
+    generator drops the connections, which stops the jobs.
+    '''
+    start = time.time()
+    jobs = [_PrepareJob(job) for job in jobs]
+    slots = []
+    for address in workers:
+        try:
+            slots.extend([address] * Hello(address, secret)['processes'])
+        except (FarmError, socket.error, ValueError, KeyError):
+            continue
+    if jobs and not slots:
+        raise FarmError('No worker available')
+    pending = Queue.Queue()
+    for index in range(len(jobs)):
+        pending.put(index)
+    events = Queue.Queue()
+    attempts = [0] * len(jobs)
+    sockets = set()
+    stop = threading.Event()
+
+    def run(address, index):
+        '''Run a job on a worker, return the final event'''
+        sock = Request(address, {'request': 'job', 'job': jobs[index], 'stream': stream},
+                       secret)
+        sockets.add(sock)
+        output = None
+        try:
+            while True:
+                kind, message = RecvMessage(sock)
+                if kind == 'D':
+                    if output is None:
+                        output = open(jobs[index]['output'], 'wb')
+                    output.write(message)
+                    continue
+                message.update(job=index, worker=address)
+                if message['event'] in ('done', 'error'):
+                    return message
+                events.put(message)
+        finally:
+            sockets.discard(sock)
+            sock.close()
+            if output is not None:
+                output.close()
+
+    def slot(address):
+        while not stop.is_set():
+            try:
+                index = pending.get_nowait()
+            except Queue.Empty:
+                return
+            attempts[index] += 1
+            try:
+                event = run(address, index)
+            except (FarmError, socket.error, IOError, ValueError) as err:
+                event = {'event': 'error', 'job': index, 'worker': address,
+                         'message': unicode(err)}
+            if stop.is_set():
+                return
+            if event['event'] == 'error' and attempts[index] <= retries:
+                pending.put(index)
+                continue
+            events.put(event)
+
+    threads = []
+    for address in slots[:max(1, len(jobs))]:
+        thread = threading.Thread(target=slot, args=(address,), name='FarmDispatch')
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    finished = errors = 0
+    try:
+        while finished < len(jobs):
+            try:
+                event = events.get(timeout=0.1)
+            except Queue.Empty:
+                if not [thread for thread in threads if thread.is_alive()] and events.empty():
+                    break
+                continue
+            if event['event'] in ('done', 'error'):
+                finished += 1
+                errors += event['event'] == 'error'
+            yield event
+    finally:
+        stop.set()
+        for sock in list(sockets):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+    yield {'event': 'finished', 'jobs': len(jobs), 'errors': errors + len(jobs) - finished,
+           'elapsed': round(time.time() - start, 3)}
+
+def Dispatch(jobs, workers, stream=False, retries=1, emit=None, secret=None):
+    '''Run a list of jobs on remote workers, see DispatchEvents
+
+    Return the list of job results, None for the jobs that failed.
+    '''
+    results = [None] * len(jobs)
+    for event in DispatchEvents(jobs, workers, stream, retries, secret):
+        if event['event'] == 'done':
+            results[event['job']] = event['result']
+        if emit is not None:
+            emit(event)
+    return results
+
+def main(argv=None):
+    parser = optparse.OptionParser(
+        usage='%prog worker [options]\n       %prog dispatch --workers ADDRESSES manifest.json',
+        description='Run render.py jobs on worker daemons')
+    parser.add_option('--listen', default='127.0.0.1:%i' % DEFAULT_PORT,
+                      help='worker address, HOST:PORT or the path of a Unix socket '
+                           '(default: %default)')
+    parser.add_option('-j', '--processes', type='int',
+                      help='jobs run at the same time by the worker (default: CPUs)')
+    parser.add_option('--avisynth-dir', dest='avisynth_dir', default='',
+                      help='directory of the AviSynth library')
+    parser.add_option('--workers', default='',
+                      help='comma-separated worker addresses for dispatch')
+    parser.add_option('--stream', action='store_true',
+                      help='send the job outputs back to the dispatcher')
+    parser.add_option('--secret',
+                      help='secret shared by the workers and the dispatcher (default: the '
+                           '%s environment variable, preferable since command lines can be '
+                           'read by other users)' % SECRET_VARIABLE)
+    parser.add_option('--allow-commands', dest='allow_commands', action='store_true',
+                      help="let the worker run job outputs starting with '|' as shell commands")
+    options, args = parser.parse_args(argv)
+    if not args or args[0] not in ('worker', 'dispatch'):
+        parser.error('a command is required: worker or dispatch')
+    if args[0] == 'worker':
+        global_vars.avisynth_library_dir = options.avisynth_dir
+        try:
+            server = Worker(options.listen, options.processes, options.avisynth_dir,
+                            secret=options.secret, allow_commands=options.allow_commands)
+        except FarmError as err:
+            parser.error(unicode(err))
+        sys.stderr.write('Listening on {0} with {1} processes\n'.format(
+                         options.listen, server.processes))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+    if len(args) != 2 or not options.workers:
+        parser.error('dispatch requires --workers and a manifest')
+    if args[1] == '-':
+        manifest = json.load(sys.stdin)
+    else:
+        with open(args[1], 'rb') as f:
+            manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {'jobs': manifest}
+    def emit(event):
+        sys.stdout.write(json.dumps(event) + '\n')
+        sys.stdout.flush()
+    results = Dispatch(manifest.get('jobs', []), options.workers.split(','), options.stream,
+                       emit=emit, secret=options.secret)
+    return 1 if None in results else 0
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
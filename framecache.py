@@ -0,0 +1,324 @@
+# AvsP - an AviSynth editor
+#
+# Copyright 2007 Peter Jang <http://www.avisynth.org/qwerpoi>
+#           2010-2017 the AvsPmod authors <https://github.com/avspmod/avspmod>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA, or visit
+#  http://www.gnu.org/copyleft/gpl.html .
+
+# framecache - frame caches of the preview
+#
+# DiskFrameCache keeps the raw planes of the frames shown in the preview in
+# a directory, compressed with zlib, one file per frame in a subdirectory per
+# clip key.  The key identifies the evaluated script (see ScriptKey), so the
+# frames of a script opened again in a later session are read back instead
+# of rendered.  The total size is capped, the least recently used frames
+# are deleted first.  The file modification time is the last use, so the
+# order is kept across sessions.
+#
+# Frames are compressed and written by a background thread; a frame that
+# arrives while the queue is full is not cached.
+#
+# FrameBuffer holds the display frames of a range rendered ahead for
+# playback, in memory or in a temporary file mapped in memory.
+#
+# Dependencies:
+#     Python (tested on v2.7)
+#     NumPy
+
+import os
+import re
+import zlib
+import time
+import struct
+import tempfile
+import hashlib
+import threading
+import collections
+import Queue
+
+import numpy
+
+MAGIC = 'AVSPF1'
+EXTENSION = '.frame'
+COMPRESSION_LEVEL = 1
+WRITE_QUEUE_SIZE = 16
+
+def ScriptKey(text, filename, workdir, properties=()):
+    '''Return the cache key of an evaluated script
+
+    'text' is the script as evaluated.  Trailing spaces and empty lines are
+    ignored.  The size and modification time of every existing file named
+    in a string of the script are part of the key, so the frames are not
+    reused if a source or an imported script changes.  'properties' are
+    other values that identify the clip, e.g. its size and colorspace.
+    '''
+    lines = [line.rstrip() for line in text.splitlines()]
+    text = u'\n'.join(line for line in lines if line)
+    key = hashlib.sha1(text.encode('utf-8'))
+    key.update(repr((filename, workdir, tuple(properties))))
+    for name in sorted(set(re.findall(r'"([^"\r\n]+)"', text))):
+        path = os.path.join(workdir or os.path.dirname(filename), name)
+        try:
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                key.update(repr((os.path.abspath(path), stat.st_size, stat.st_mtime)))
+        except (OSError, ValueError, UnicodeError):
+            pass
+    return key.hexdigest()
+
+class DiskFrameCache(object):
+    '''Size-capped directory of compressed frames, see the module description
+
+    A frame is a list of 2D uint8 arrays, the raw planes without padding.
+    '''
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        # path -> size, least recently used first
+        self.files = collections.OrderedDict()
+        self.size = 0
+        self.queue = Queue.Queue(WRITE_QUEUE_SIZE)
+        self.pending = set()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        entries = []
+        for dirpath, dirnames, filenames in os.walk(directory):
+            for name in filenames:
+                if name.endswith(EXTENSION):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, path, stat.st_size))
+        for mtime, path, size in sorted(entries):
+            self.files[path] = size
+            self.size += size
+        self.Evict()
+        thread = threading.Thread(target=self._Writer, name='DiskFrameCache')
+        thread.daemon = True
+        thread.start()
+
+    def _Path(self, key, frame):
+        return os.path.join(self.directory, key, '%07i%s' % (frame, EXTENSION))
+
+    def Get(self, key, frame):
+        '''Return the planes of a frame, None if not cached'''
+        path = self._Path(key, frame)
+        with self.lock:
+            if path not in self.files:
+                return None
+            self.files[path] = self.files.pop(path)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path, None)
+            return self._Decode(data)
+        except (IOError, OSError, ValueError, struct.error, zlib.error):
+            self._Remove(path)
+            return None
+
+    def Contains(self, key, frame):
+        '''Return True if a frame is cached'''
+        path = self._Path(key, frame)
+        with self.lock:
+            return path in self.files
+
+    def Put(self, key, frame, planes):
+        '''Queue a frame to be written.  The planes must not be modified afterwards'''
+        path = self._Path(key, frame)
+        with self.lock:
+            if path in self.files or path in self.pending:
+                return
+            self.pending.add(path)
+        try:
+            self.queue.put_nowait((path, list(planes)))
+        except Queue.Full:
+            with self.lock:
+                self.pending.discard(path)
+
+    def Flush(self, timeout=None):
+        '''Wait for the queued frames to be written'''
+        deadline = None if timeout is None else time.time() + timeout
+        while self.pending and (deadline is None or time.time() < deadline):
+            time.sleep(0.01)
+
+    def Discard(self, key):
+        '''Delete the frames of a key'''
+        prefix = os.path.join(self.directory, key) + os.sep
+        with self.lock:
+            paths = [path for path in self.files if path.startswith(prefix)]
+        for path in paths:
+            self._Remove(path)
+
+    def Clear(self):
+        with self.lock:
+            paths = list(self.files)
+        for path in paths:
+            self._Remove(path)
+        for name in os.listdir(self.directory):
+            try:
+                os.rmdir(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def Evict(self):
+        '''Delete the least recently used frames beyond the maximum size'''
+        while True:
+            with self.lock:
+                if self.size <= self.max_size or not self.files:
+                    return
+                path = next(iter(self.files))
+            self._Remove(path)
+
+    def _Remove(self, path):
+        with self.lock:
+            self.size -= self.files.pop(path, 0)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _Writer(self):
+        while True:
+            path, planes = self.queue.get()
+            try:
+                data = self._Encode(planes)
+                dirname = os.path.dirname(path)
+                if not os.path.isdir(dirname):
+                    os.makedirs(dirname)
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(data)
+                if os.path.exists(path):
+                    os.remove(path)
+                os.rename(path + '.tmp', path)
+                with self.lock:
+                    self.files[path] = len(data)
+                    self.size += len(data)
+            except (IOError, OSError):
+                pass
+            finally:
+                with self.lock:
+                    self.pending.discard(path)
+            self.Evict()
+
+    @staticmethod
+    def _Encode(planes):
+        header = MAGIC + struct.pack('<B', len(planes))
+        for plane in planes:
+            header += struct.pack('<II', *plane.shape)
+        compressor = zlib.compressobj(COMPRESSION_LEVEL)
+        data = [compressor.compress(numpy.ascontiguousarray(plane).data) for plane in planes]
+        return header + ''.join(data) + compressor.flush()
+
+    @staticmethod
+    def _Decode(data):
+        if not data.startswith(MAGIC):
+            raise ValueError('Not a cached frame')
+        count = struct.unpack_from('<B', data, len(MAGIC))[0]
+        offset = len(MAGIC) + 1
+        shapes = []
+        for i in range(count):
+            shapes.append(struct.unpack_from('<II', data, offset))
+            offset += 8
+        raw = zlib.decompress(data[offset:])
+        planes = []
+        offset = 0
+        for height, width in shapes:
+            size = height * width
+            if offset + size > len(raw):
+                raise ValueError('Truncated frame')
+            planes.append(numpy.frombuffer(raw, numpy.uint8, size, offset).reshape(height, width))
+            offset += size
+        return planes
+
+class FrameBuffer(object):
+    '''Display frames of a fixed list of frame numbers, for the render-ahead preview
+
+    All the frames must have the same shape, set by the first one stored.
+    With 'disk' the frames are stored in a temporary file instead of memory.
+    '''
+
+    def __init__(self, frames, disk=False):
+        self.slots = dict((frame, i) for i, frame in enumerate(sorted(set(frames))))
+        self.disk = disk
+        self.data = self.file = None
+        self.filled = set()
+        self.ranges = []
+
+    def __contains__(self, frame):
+        return frame in self.filled
+
+    def __len__(self):
+        return len(self.filled)
+
+    def GetFrames(self):
+        return sorted(self.slots)
+
+    def IsComplete(self):
+        return len(self.filled) == len(self.slots)
+
+    def Put(self, frame, array):
+        '''Copy a frame into the buffer.  Return False if it doesn't fit'''
+        if frame not in self.slots:
+            return False
+        if self.data is None:
+            shape = (len(self.slots),) + array.shape
+            if self.disk:
+                self.file = tempfile.TemporaryFile(prefix='avsp_')
+                self.data = numpy.memmap(self.file, numpy.uint8, 'w+', shape=shape)
+            else:
+                self.data = numpy.empty(shape, numpy.uint8)
+        elif array.shape != self.data.shape[1:]:
+            return False
+        self.data[self.slots[frame]] = array
+        if frame not in self.filled:
+            self.filled.add(frame)
+            self.ranges = None
+        return True
+
+    def Get(self, frame):
+        '''Return a frame as stored, None if it's not in the buffer yet'''
+        if frame in self.filled:
+            return self.data[self.slots[frame]]
+
+    def GetRanges(self):
+        '''Return the filled frames as a list of (first, last) ranges'''
+        if self.ranges is None:
+            self.ranges = []
+            for frame in sorted(self.filled):
+                if self.ranges and self.ranges[-1][1] == frame - 1:
+                    self.ranges[-1][1] = frame
+                else:
+                    self.ranges.append([frame, frame])
+            self.ranges = [tuple(item) for item in self.ranges]
+        return self.ranges
+
+    def GetRangeEnd(self, frame):
+        '''Return the last frame of the filled range that contains a frame, or None'''
+        for first, last in self.GetRanges():
+            if first <= frame <= last:
+                return last
+
+    def Close(self):
+        self.data = None
+        self.filled.clear()
+        self.ranges = []
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,161 @@
+# AvsP - an AviSynth editor
+#
+# Copyright 2007 Peter Jang <http://www.avisynth.org/qwerpoi>
+#           2010-2017 the AvsPmod authors <https://github.com/avspmod/avspmod>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA, or visit
+#  http://www.gnu.org/copyleft/gpl.html .
+
+# frameserver - serve the frames of a loaded clip to other programs
+#
+# A FrameServer thread writes a yuv4mpeg2 stream of a clip that is already
+# evaluated, so a player or an analysis tool gets the frames without loading
+# the script again.  The stream goes to a FIFO (POSIX) or to the first
+# client connecting to a TCP port on localhost (any platform, e.g.
+# 'ffplay tcp://127.0.0.1:PORT').  Frames are requested through a 'fetch'
+# function, which lets the caller run them in the thread that owns the
+# AviSynth environment.
+#
+# Dependencies:
+#     Python (tested on v2.7)
+# Scripts:
+#     render.py (yuv4mpeg2 colorspace of high bit depth clips)
+
+import os
+import errno
+import socket
+import tempfile
+import threading
+
+import render
+
+# Seconds between checks for a stop request while waiting for a consumer
+ACCEPT_INTERVAL = 0.5
+
+class FrameServerError(Exception):
+    pass
+
+class FrameServer(threading.Thread):
+    '''Write a yuv4mpeg2 stream of a pyavs clip to a FIFO or a TCP client
+
+    'output' is the path of the FIFO to create, 'tcp' or 'tcp:PORT' (port 0
+    or missing for any free port), or None for a FIFO in the temporary
+    directory on POSIX and TCP on Windows.  The address to give to the
+    consumer is in self.address.  'frames' defaults to the whole clip.
+    fetch(frame) returns the y4m frame data, by default clip.RawFrame.
+
+    The server serves a single consumer and ends when all the frames are
+    sent, the consumer goes away or Stop is called.
+    '''
+
+    def __init__(self, clip, frames=None, output=None, fetch=None):
+        threading.Thread.__init__(self, name='FrameServer')
+        self.daemon = True
+        colorspace, depth = render._Y4MColorspace(clip)
+        try:
+            self.header = clip.Y4MHeader(colorspace=colorspace, depth=depth)
+        except Exception as err:
+            raise FrameServerError(unicode(err))
+        self.frames = range(clip.Framecount) if frames is None else frames
+        self.fetch = fetch or (lambda frame: clip.RawFrame(frame, y4m_header=True))
+        self.stopped = threading.Event()
+        self.sent = 0
+        self.error = None
+        self.fifo = self.listener = self.tempdir = None
+        if output is None:
+            output = 'tcp' if os.name == 'nt' or not hasattr(os, 'mkfifo') else ''
+        if output == 'tcp' or output.startswith('tcp:'):
+            self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.listener.bind(('127.0.0.1', int(output[4:] or 0)))
+            self.listener.listen(1)
+            self.listener.settimeout(ACCEPT_INTERVAL)
+            self.address = 'tcp://127.0.0.1:{0}'.format(self.listener.getsockname()[1])
+        else:
+            if not hasattr(os, 'mkfifo'):
+                raise FrameServerError('FIFOs are not supported on this platform')
+            if not output:
+                self.tempdir = tempfile.mkdtemp(prefix='avsp_')
+                output = os.path.join(self.tempdir, 'frames.y4m')
+            try:
+                os.mkfifo(output)
+            except OSError as err:
+                raise FrameServerError(unicode(err))
+            self.fifo = self.address = output
+
+    def Stop(self):
+        self.stopped.set()
+        if self.fifo is not None:
+            # Unblock the writer waiting for a reader
+            try:
+                os.close(os.open(self.fifo, os.O_RDONLY | os.O_NONBLOCK))
+            except OSError:
+                pass
+
+    def IsRunning(self):
+        return self.is_alive()
+
+    def _Open(self):
+        '''Wait for the consumer, return a file object or None if stopped'''
+        if self.fifo is not None:
+            f = open(self.fifo, 'wb')
+            if self.stopped.is_set():
+                f.close()
+                return
+            return f
+        while not self.stopped.is_set():
+            try:
+                conn, address = self.listener.accept()
+            except socket.timeout:
+                continue
+            conn.settimeout(None)
+            return conn.makefile('wb')
+
+    def run(self):
+        try:
+            output = self._Open()
+            if output is None:
+                return
+            try:
+                output.write(self.header)
+                for frame in self.frames:
+                    if self.stopped.is_set():
+                        break
+                    buf = self.fetch(frame)
+                    if buf is None:
+                        raise FrameServerError('Error requesting frame {0}'.format(frame))
+                    output.write(buf.raw)
+                    self.sent += 1
+                output.flush()
+            finally:
+                try:
+                    output.close()
+                except (IOError, socket.error):
+                    pass
+        except (IOError, socket.error) as err:
+            # The consumer closed the stream
+            if err.errno not in (errno.EPIPE, errno.ECONNRESET, errno.ECONNABORTED):
+                self.error = unicode(err)
+        except FrameServerError as err:
+            self.error = unicode(err)
+        finally:
+            if self.listener is not None:
+                self.listener.close()
+            if self.fifo is not None:
+                try:
+                    os.remove(self.fifo)
+                    if self.tempdir is not None:
+                        os.rmdir(self.tempdir)
+                except OSError:
+                    pass
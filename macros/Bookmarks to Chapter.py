@@ -15,7 +15,6 @@ filename = avsp.GetSaveFilename(
                                        _('All files') + ' (*.*)|*.*')))
 if not filename:
     return
-fps = avsp.GetVideoFramerate()
 text = []
 chapter = 1
 for item in bookmarks:
@@ -24,7 +23,8 @@ for item in bookmarks:
         title = ''
     else:
         bookmark, title = item
-    m, s = divmod(bookmark/fps, 60)
+    # Frame times from loaded timecodes or FFMS2 sources, else the frame rate
+    m, s = divmod(avsp.FrameToTime(bookmark), 60)
     h, m = divmod(m, 60)
     timecode = 'CHAPTER%02d=%02d:%02d:%06.3f\n' % (chapter, h ,m, s)
     if not title:
@@ -0,0 +1,57 @@
+# This example does the same as the image processing one, but instead of
+# loading every image in the current tab one after another, all the scripts
+# are generated first and then evaluated in parallel by avsp.Batch, using
+# off-screen clips in several processes.  The tabs are not touched at all.
+# The progress box is updated from the callback, which receives each result
+# as soon as it's available.
+
+# run macro in new thread
+
+import os
+
+# Get the directory containing  files
+dirname = avsp.GetDirectory()
+
+if dirname:
+    # Create the list of file names in the directory which are bitmaps or jpegs
+    namelist = [name for name in os.listdir(dirname)
+                if os.path.splitext(name)[1] in ('.bmp', '.jpg')]
+    # Generate a script for each image.  The borders make the width and
+    # height mod 32 for ConvertToYV12() and the crop gets rid of them.
+    scripts = []
+    for filename in namelist:
+        fullname = os.path.join(dirname, filename)
+        scripts.append(
+            '%s\n'
+            'wpad = 32 - Width() %% 32\n'
+            'hpad = 32 - Height() %% 32\n'
+            'AddBorders(0, 0, wpad, hpad)\n'
+            'ConvertToYV12()\n'
+            'SwapUV()\n'
+            'Sharpen(1.0)\n'
+            'ConvertToRGB32()\n'
+            'Crop(0, 0, -wpad, -hpad)\n' % avsp.GetSourceString(fullname))
+    # Create a progress box
+    pbox = avsp.ProgressBox(len(namelist), _('Processing images...'))
+    done = [0]
+    def callback(index, result, error):
+        done[0] += 1
+        if error:
+            avsp.WriteToScrap(u'%s: %s\n' % (namelist[index], error))
+        # Exit if user canceled
+        return avsp.SafeCall(pbox.Update, done[0])[0]
+    # Save the first frame of each script as png.  {index} is replaced by the
+    # index of the script, the files are renamed after the source images
+    # once all of them are saved.  Braces of the directory are doubled.
+    output = os.path.join(dirname.replace('{', '{{').replace('}', '}}'), 'batch_{index:04d}.png')
+    results = avsp.Batch(scripts, 'images', callback=callback, frame_list=[0], output=output)
+    for i, result in enumerate(results):
+        if result:
+            newname = os.path.join(dirname, namelist[i] + '.png')
+            if os.path.isfile(newname):
+                os.remove(newname)
+            os.rename(result['files'][0], newname)
+    # Destroy the progress box
+    avsp.SafeCall(pbox.Destroy)
+else:
+    avsp.MsgBox(_('Macro aborted'))
@@ -40,6 +40,8 @@ if not bookmarkDict:
                 start, end, fps = line.split(',')
                 bookmarkDict[int(start)] = fps + ' fps'
                 bookmarkDict[int(end)+1] = base_fps
+        # Use the frame times for the status bar, the bookmarks and the chapters
+        avsp.LoadTimecodes(filename)
 
 # parsing SCXviD log
 if not bookmarkDict:
@@ -105,19 +107,18 @@ if not bookmarkDict:
 if not bookmarkDict:
     timeList = re.findall(r'(\d+)=(\d+):(\d+):(\d+\.\d+)', lines)
     if timeList:
-        fps = avsp.GetVideoFramerate()
         titleDict = {}
         for index, title in re.findall(r'(\d+)NAME=(.*)', lines, re.I):
             titleDict[index] = title
         for index, hr, min, sec in timeList:
             sec = int(hr)*3600 + int(min)*60 + float(sec)
-            bookmark = int(round(sec*fps))
+            # The times are rounded to milliseconds
+            bookmark = avsp.TimeToFrame(sec + 0.0005)
             bookmarkDict[bookmark] = titleDict.get(index, '')
 
 # parsing matroska xml files
 if not bookmarkDict:
     sections = re.findall(r'<ChapterAtom>(.*?)</ChapterAtom>', lines, re.I|re.S)
-    fps = avsp.GetVideoFramerate()
     for text in sections:
         timecode = re.search(r'<ChapterTimeStart>(\d+):(\d+):(\d+\.\d+)</ChapterTimeStart>', text)
         if not timecode:
@@ -125,7 +126,7 @@ if not bookmarkDict:
         title = re.search(r'<ChapterString>(.*?)</ChapterString>', text)
         hr, min, sec = timecode.groups()
         sec = int(hr)*3600 + int(min)*60 + float(sec)
-        bookmark = int(round(sec*fps))
+        bookmark = avsp.TimeToFrame(sec + 0.0005)
         bookmarkDict[bookmark] = title.group(1) if title else ''
 
 # parsing celltime format - frame count content
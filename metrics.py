@@ -0,0 +1,156 @@
+# AvsP - an AviSynth editor
+#
+# Copyright 2007 Peter Jang <http://www.avisynth.org/qwerpoi>
+#           2010-2017 the AvsPmod authors <https://github.com/avspmod/avspmod>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA, or visit
+#  http://www.gnu.org/copyleft/gpl.html .
+
+# metrics - objective comparison metrics between AviSynth clips
+#
+# PSNR, SSIM and maximum absolute difference are computed per frame at the
+# native bit depth, from the planes returned by pyavs.AvsClipBase.GetPlanes.
+# Whole clips are compared in a process pool: every worker process evaluates
+# the scripts once and then receives chunks of frame numbers.
+#
+# Dependencies:
+#     NumPy (optional, the metrics are not available without it)
+# Scripts:
+#     pyavs.py (only imported by the worker processes)
+
+import math
+import multiprocessing
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import global_vars
+
+METRICS = ('psnr', 'ssim', 'maxdiff')
+
+def MSE(a, b):
+    '''Mean squared error between two planes'''
+    return numpy.mean((a.astype(numpy.float64) - b) ** 2)
+
+def PSNR(mse, peak):
+    '''Peak signal-to-noise ratio in dB from a MSE, inf for identical planes'''
+    if mse == 0:
+        return float('inf')
+    return 10 * math.log10(peak * peak / mse)
+
+def _BoxMean(x, size):
+    '''Mean over every size x size window (valid positions only)'''
+    s = numpy.zeros((x.shape[0] + 1, x.shape[1] + 1))
+    s[1:, 1:] = x.cumsum(0).cumsum(1)
+    return (s[size:, size:] - s[:-size, size:] - s[size:, :-size] +
+            s[:-size, :-size]) / float(size * size)
+
+def SSIM(a, b, peak, window=8):
+    '''Mean structural similarity, using a sliding square window'''
+    window = min(window, a.shape[0], a.shape[1])
+    a = a.astype(numpy.float64)
+    b = b.astype(numpy.float64)
+    c1 = (0.01 * peak) ** 2
+    c2 = (0.03 * peak) ** 2
+    mu_a = _BoxMean(a, window)
+    mu_b = _BoxMean(b, window)
+    var_a = _BoxMean(a * a, window) - mu_a * mu_a
+    var_b = _BoxMean(b * b, window) - mu_b * mu_b
+    cov = _BoxMean(a * b, window) - mu_a * mu_b
+    ssim = ((2 * mu_a * mu_b + c1) * (2 * cov + c2) /
+            ((mu_a * mu_a + mu_b * mu_b + c1) * (var_a + var_b + c2)))
+    return float(ssim.mean())
+
+def MaxAbsDiff(a, b):
+    '''Maximum absolute difference between two planes'''
+    diff = numpy.abs(a.astype(numpy.float64) - b).max()
+    return float(diff) if a.dtype.kind == 'f' else int(diff)
+
+def CompareFrames(planes_a, planes_b, bits, is_rgb=False):
+    '''Return (psnr, ssim, maxdiff) between two lists of planes
+
+    PSNR and SSIM use the luma plane for YUV clips and the mean over the
+    three planes for RGB ones.  Return None if the formats don't match.
+    '''
+    if planes_b is None or len(planes_a) != len(planes_b) or any(a.shape != b.shape for a, b
+                                             in zip(planes_a, planes_b)):
+        return
+    peak = 1.0 if bits == 32 else float((1 << bits) - 1)
+    planes = list(zip(planes_a, planes_b)) if is_rgb else [(planes_a[0], planes_b[0])]
+    psnr = PSNR(sum(MSE(a, b) for a, b in planes) / len(planes), peak)
+    ssim = sum(SSIM(a, b, peak) for a, b in planes) / len(planes)
+    maxdiff = max(MaxAbsDiff(a, b) for a, b in zip(planes_a, planes_b))
+    return psnr, ssim, maxdiff
+
+# Process pool workers
+_worker = {}
+
+def _InitWorker(library_dir, options, scripts, offsets):
+    '''Evaluate every script once in the worker process'''
+    global_vars.avisynth_library_dir = library_dir
+    global_vars.options.update(options)
+    import pyavs
+    clips = []
+    for text, filename, workdir in scripts:
+        clip = pyavs.AvsClip(text, filename, workdir=workdir, display_clip=False)
+        clips.append(clip)
+    _worker['clips'] = clips
+    _worker['offsets'] = offsets
+
+def _CompareChunk(frames):
+    '''Compare a chunk of reference frames against the other clips'''
+    clips = _worker['clips']
+    offsets = _worker['offsets']
+    for clip in clips:
+        if not clip.initialized or clip.IsErrorClip():
+            raise Exception(clip.error_message or 'Error loading {0}'.format(clip.name))
+    reference = clips[0]
+    rows = []
+    for frame in frames:
+        planes = reference.GetPlanes(frame + offsets[0])
+        results = []
+        for clip, offset in zip(clips[1:], offsets[1:]):
+            n = frame + offset
+            if planes is None or not 0 <= n < clip.Framecount:
+                results.append(None)
+            else:
+                results.append(CompareFrames(planes, clip.GetPlanes(n),
+                               reference.BitsPerComponent, reference.IsRGB))
+        rows.append((frame, results))
+    return rows
+
+def CompareClips(scripts, offsets, frames, processes=None, chunksize=8,
+                 library_dir='', options=None):
+    '''Compare the first script against the others, frame by frame
+
+    'scripts' is a list of (text, filename, workdir) tuples and 'offsets'
+    the frame offset of each script relative to the frame numbers in
+    'frames'.  Yield (frame, [(psnr, ssim, maxdiff) or None, ...]) for
+    every frame, in completion order.  Closing the generator terminates
+    the process pool.
+    '''
+    pool = multiprocessing.Pool(processes, _InitWorker,
+                                (library_dir, options or {}, scripts, offsets))
+    try:
+        chunks = [frames[i:i+chunksize] for i in range(0, len(frames), chunksize)]
+        for rows in pool.imap_unordered(_CompareChunk, chunks):
+            for row in rows:
+                yield row
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,141 @@
+# AvsP - an AviSynth editor
+#
+# Copyright 2007 Peter Jang <http://www.avisynth.org/qwerpoi>
+#           2010-2017 the AvsPmod authors <https://github.com/avspmod/avspmod>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA, or visit
+#  http://www.gnu.org/copyleft/gpl.html .
+
+# probes - timing of the stages of the preview
+#
+# The code between editing a script and painting its frame is wrapped in
+#     with probes.Probe('stage'):
+#         ...
+# While recording is enabled each block adds (stage, start, seconds) to a
+# ring buffer holding the last RING_SIZE samples.  While it's disabled Probe
+# returns a shared object that does nothing, so the probes cost a function
+# call and can stay in the hot paths.
+#
+# Stages:
+#     update      ShowVideoFrame: evaluation of the script if it changed
+#     eval        pyavs: Eval of the script text
+#     autoload    pyavs: AutoloadPlugins (AviSynth+)
+#     displayclip pyavs: creation of the display clip
+#     source      pyavs: get_frame of the script clip
+#     display     pyavs: display frame, converted or from the display clip
+#     paint       PaintAVIFrame: drawing the frame, scaled if zoomed
+#     status      formatting of the video status bar text
+#     playback    a playback timer tick, from the request to the frame shown
+#
+# Dependencies:
+#     Python (tested on v2.7)
+
+import time
+import collections
+from timeit import default_timer as _clock
+
+RING_SIZE = 4096
+STAGES = ('update', 'eval', 'autoload', 'displayclip', 'source', 'display', 'paint',
+          'status', 'playback')
+
+enabled = False
+samples = collections.deque(maxlen=RING_SIZE)
+
+class _Probe(object):
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = _clock()
+        return self
+
+    def __exit__(self, *exc_info):
+        samples.append((self.stage, self.start, _clock() - self.start))
+        return False
+
+class _NullProbe(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_null_probe = _NullProbe()
+
+def Probe(stage):
+    '''Return a context manager timing its block as 'stage' if enabled'''
+    if enabled:
+        return _Probe(stage)
+    return _null_probe
+
+def Enable(enable=True):
+    global enabled
+    enabled = bool(enable)
+
+def Clear():
+    samples.clear()
+
+def Summary():
+    '''Return {stage: dict(count, last, mean, max)}, times in milliseconds'''
+    stats = {}
+    for stage, start, seconds in list(samples):
+        ms = seconds * 1000
+        item = stats.get(stage)
+        if item is None:
+            stats[stage] = dict(count=1, last=ms, total=ms, max=ms)
+        else:
+            item['count'] += 1
+            item['last'] = ms
+            item['total'] += ms
+            item['max'] = max(item['max'], ms)
+    for item in stats.itervalues():
+        item['mean'] = item.pop('total') / item['count']
+    return stats
+
+def _Ordered(stats):
+    return ([stage for stage in STAGES if stage in stats] +
+            sorted(stage for stage in stats if stage not in STAGES))
+
+def Report():
+    '''Return the per-stage summary as a text table'''
+    stats = Summary()
+    lines = ['{0:<12} {1:>6} {2:>10} {3:>10} {4:>10}'.format(
+             'stage', 'count', 'last ms', 'mean ms', 'max ms')]
+    for stage in _Ordered(stats):
+        lines.append('{0:<12} {count:>6} {last:>10.2f} {mean:>10.2f} {max:>10.2f}'.format(
+                     stage, **stats[stage]))
+    return '\n'.join(lines)
+
+def HUDLines():
+    '''Return short 'stage last (mean) ms' lines for an overlay'''
+    stats = Summary()
+    return ['{0} {last:.1f} ({mean:.1f}) ms'.format(stage, **stats[stage])
+            for stage in _Ordered(stats)]
+
+def Dump(filename):
+    '''Write the summary and every sample in the ring buffer to a text file'''
+    records = list(samples)
+    origin = records[0][1] if records else 0
+    with open(filename, 'w') as f:
+        f.write('# {0}\n'.format(time.strftime('%Y-%m-%d %H:%M:%S')))
+        f.write(Report() + '\n\n')
+        f.write('stage\tstart_ms\tduration_ms\n')
+        for stage, start, seconds in records:
+            f.write('{0}\t{1:.3f}\t{2:.3f}\n'.format(stage, (start - origin) * 1000,
+                                                     seconds * 1000))
@@ -21,6 +21,7 @@
 
 # pyavs - AVI functions via AviSynth in Python
 # Drawing uses VFW on Windows and generical wxPython support on other platforms
+# (wx is only imported when drawing, see render.py for headless use)
 #
 # Dependencies:
 #     Python (tested on v2.6 and v2.7)
@@ -33,11 +34,22 @@
 # Scripts:
 #     avisynth.py (Python AviSynth/AvxSynth wrapper, only for x86-32)
 #     avisynth_cffi.py (Python AviSynth wrapper, only for x86-64)
+#     pyavs_display.py (RGB conversion for display with NumPy)
+#     probes.py (timing of the evaluation and the frame requests)
+# Optional:
+#     NumPy (frame planes as arrays, see GetPlanes, and faster display
+#            conversion of every colorspace and bit depth)
 
 import sys
 import os
 import ctypes
 import re
+import array
+from timeit import default_timer as _clock
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 x86_64 = sys.maxsize > 2**32
 if x86_64:
@@ -45,6 +57,8 @@ if x86_64:
 else:
     import avisynth
 import global_vars
+import pyavs_display
+import probes
 
 try: _
 except NameError:
@@ -306,7 +320,8 @@ class AvsClipBase:
 
     def __init__(self, script, filename='', workdir='', env=None, fitHeight=None,
                  fitWidth=None, oldFramecount=240, display_clip=True, reorder_rgb=False,
-                 matrix=['auto', 'tv'], interlaced=False, swapuv=False, bit_depth=None):
+                 matrix=['auto', 'tv'], interlaced=False, swapuv=False, bit_depth=None,
+                 prefetch=0):
         # Internal variables
         self.initialized = False
         self.name = filename
@@ -314,7 +329,19 @@ class AvsClipBase:
         self.current_frame = -1
         self.pBits = None
         self.display_clip = None
+        self.display_buffer = None
+        self.native_display = False
+        self.draft = False
+        self.current_proxy = 1
         self.ptrY = self.ptrU = self.ptrV = None
+        self.pixel_frame = -1 # frame of the pixel readers, see _UpdatePixelReaders
+        self.disk_cache = None # framecache.DiskFrameCache, set by AvsP
+        self.cache_key = None
+        self.cached_planes = None
+        self.frame_buffer = None # framecache.FrameBuffer of the render-ahead preview
+        self.frame_costs = None # render time of every frame in ms, 0 if not measured
+        self.prefetch = 0 # threads of the Prefetch appended to the script (AviSynth+)
+        self.prefetch_error = None # why the Prefetch was not appended
         # Avisynth script properties
         self.Width = -1
         self.Height = -1
@@ -341,6 +368,8 @@ class AvsClipBase:
         self.IsYV12 = None
         self.IsYV411 = None
         self.IsY8 = None
+        self.BitsPerComponent = 8
+        self.ComponentSize = 1
         self.avsplus_colorspace = False
         self.IsPlanar = None
         self.IsInterleaved = None
@@ -350,7 +379,8 @@ class AvsClipBase:
         self.HasAudio = None
         self.HasVideo = None
         self.Colorspace = None
-        self.ffms_info_cache = {}
+        self.ffms_info = None # (frame, FFPICT_TYPE, FFVFR_TIME) of the last frame shown
+        self.timestamps = None # timecodes.TimestampIndex, set by AvsP
 
         # Create the Avisynth script clip
         if env is not None:
@@ -393,7 +423,8 @@ class AvsClipBase:
             self.env.set_global_var("$ScriptName$", filename)
             self.env.set_global_var("$ScriptDir$", scriptdirname + os.path.sep)
             try:
-                self.clip = self.env.invoke('Eval', [script, filename])
+                with probes.Probe('eval'):
+                    self.clip = self.env.invoke('Eval', [script, filename])
                 if not isinstance(self.clip, avisynth.AVS_Clip):
                     raise avisynth.AvisynthError("Not a clip")
             except avisynth.AvisynthError as err:
@@ -402,6 +433,17 @@ class AvsClipBase:
                     return
             finally:
                 os.chdir(curdir)
+            # Multithreading of AviSynth+, without changing the script text.
+            # On errors the clip is kept as evaluated
+            if prefetch > 0 and self.error_message is None and self.env.function_exists('Prefetch'):
+                if re.search(r'(?i)\bPrefetch\s*\(', script):
+                    self.prefetch_error = 'The script already calls Prefetch'
+                else:
+                    try:
+                        self.clip = self.env.invoke('Prefetch', [self.clip, prefetch])
+                        self.prefetch = prefetch
+                    except avisynth.AvisynthError as err:
+                        self.prefetch_error = str(err)
             try:
                 if not isinstance(self.env.get_var("last"), avisynth.AVS_Clip):
                     self.env.set_var("last", self.clip)
@@ -412,7 +454,8 @@ class AvsClipBase:
             self.env.set_var("avsp_raw_clip", self.clip)
             if self.env.function_exists('AutoloadPlugins'): # AviSynth+
                 try:
-                    self.env.invoke('AutoloadPlugins')
+                    with probes.Probe('autoload'):
+                        self.env.invoke('AutoloadPlugins')
                 except avisynth.AvisynthError as err:
                     self.Framecount = oldFramecount
                     if not self.CreateErrorClip(err):
@@ -529,6 +572,9 @@ class AvsClipBase:
                            )
         """
 
+        if self.avsplus_colorspace:
+            self.BitsPerComponent = self.vi.bits_per_component()
+            self.ComponentSize = self.vi.component_size()
         self.IsPlanar = self.vi.is_planar()
 #        self.IsInterleaved = self.vi.is_interleaved()
         self.IsFieldBased = self.vi.is_field_based()
@@ -537,8 +583,11 @@ class AvsClipBase:
         self.HasAudio = self.vi.has_audio()
 
         self.interlaced = interlaced
-        if display_clip and not self.CreateDisplayClip(matrix, interlaced, swapuv, bit_depth):
-            return
+        if display_clip:
+            with probes.Probe('displayclip'):
+                ok = self.CreateDisplayClip(matrix, interlaced, swapuv, bit_depth)
+            if not ok:
+                return
         if self.IsRGB and reorder_rgb:
             self.clip = self.BGR2RGB(self.clip)
         self.initialized = True
@@ -556,7 +605,8 @@ class AvsClipBase:
                 print(u"Deleting allocated video memory for '{0}'".format(self.name))
 
     def CreateErrorClip(self, err='', display_clip_error=False):
-        fontFace, fontSize, fontColor = global_vars.options['errormessagefont'][:3]   # GPo fontColor
+        fontFace, fontSize, fontColor = global_vars.options.get('errormessagefont',
+                                            ('Arial', 24, '$FF0000'))[:3]   # GPo fontColor
         if fontColor == '':
             fontColor = '$FF0000'
 
@@ -598,10 +648,20 @@ class AvsClipBase:
 
     def CreateDisplayClip(self, matrix=['auto', 'tv'], interlaced=None, swapuv=False, bit_depth=None):
         self.current_frame = -1
+        self.ClearFrameBuffer()
         self.display_clip = self.clip
         self.RGB48 = False
         self.bit_depth = bit_depth
-        if bit_depth:
+        self.native_display = self._UseNativeDisplay(bit_depth)
+        if self.native_display:
+            # Frames are converted in _GetFrame, only the size is needed here
+            self.DisplayWidth, self.DisplayHeight = self.Width, self.Height
+            if self.IsYV12 or self.IsYV24 or self.IsY8:
+                if bit_depth in ('s10', 's16'):
+                    self.DisplayHeight /= 2
+                elif bit_depth in ('i10', 'i16'):
+                    self.DisplayWidth /= 2
+        elif bit_depth:
             try:
                 if bit_depth == 'rgb48': # TODO
                     if self.IsYV12:
@@ -651,7 +711,10 @@ class AvsClipBase:
             self.matrix = matrix[1] + matrix[0]
         if interlaced is not None:
             self.interlaced = interlaced
-        if swapuv and self.IsYUV and not self.IsY8:
+        self.swapuv = swapuv and self.IsYUV and not self.IsY8
+        if self.native_display:
+            return True
+        if self.swapuv:
             try:
                 self.display_clip = self.env.invoke('SwapUV', self.display_clip)
             except avisynth.AvisynthError as err:
@@ -663,36 +726,126 @@ class AvsClipBase:
             return self.CreateErrorClip(display_clip_error=True)
         return True
 
+    def _UseNativeDisplay(self, bit_depth=None):
+        '''Return True if the frames can be converted for display with NumPy'''
+        if numpy is None or not global_vars.options.get('numpydisplay', True):
+            return False
+        if bit_depth == 'rgb48' or self.ComponentSize not in (1, 2, 4):
+            return False
+        return self.IsRGB or self.IsYUV or (self.avsplus_colorspace and self.vi.is_y())
+
     def _ConvertToRGB(self):
         '''Convert to RGB for display. Return True if successful'''
         pass
 
-    def _GetFrame(self, frame):
+    def _NativeDisplayFrame(self, planes, proxy=1, sampled=1):
+        '''Return the source planes (see GetPlanes) converted to a HxWx3 uint8 RGB array
+
+        With a 'proxy' factor the frame is converted and returned at that
+        fraction of the display size, taking one sample out of proxy x proxy.
+        The factor is halved until it divides the size of every plane.
+
+        'sampled' > 1 means the planes were already reduced by that factor
+        (see _SampledPlanes), as the proxy or for a draft.  A draft is
+        enlarged back to the display size.
+        '''
+        if sampled > 1:
+            rgb = pyavs_display.ToRGB(planes, self.BitsPerComponent, self.IsRGB, self.matrix,
+                                      False, self.swapuv)
+            if proxy > 1:
+                self.current_proxy = sampled
+                return rgb
+            self.current_proxy = 1
+            return rgb.repeat(sampled, axis=0).repeat(sampled, axis=1)
+        bits = self.BitsPerComponent
+        if self.bit_depth and (self.IsYV12 or self.IsYV24 or self.IsY8):
+            if self.bit_depth in ('s10', 's16'):
+                planes = [pyavs_display.Unstack(plane) for plane in planes]
+                bits = int(self.bit_depth[1:])
+            elif self.bit_depth in ('i10', 'i16'):
+                planes = [pyavs_display.Deinterleave(plane) for plane in planes]
+                bits = int(self.bit_depth[1:])
+        while proxy > 1 and any(plane.shape[0] % proxy or plane.shape[1] % proxy
+                                for plane in planes):
+            proxy //= 2
+        self.current_proxy = proxy
+        if proxy > 1:
+            planes = [plane[::proxy, ::proxy] for plane in planes]
+            return pyavs_display.ToRGB(planes, bits, self.IsRGB, self.matrix, False, self.swapuv)
+        # Draft: convert one sample out of four and repeat the result
+        draft = self.draft and not any(plane.shape[0] % 2 or plane.shape[1] % 2
+                                       for plane in planes)
+        if draft:
+            planes = [plane[::2, ::2] for plane in planes]
+        rgb = pyavs_display.ToRGB(planes, bits, self.IsRGB, self.matrix,
+                                  self.interlaced and not draft, self.swapuv)
+        if draft:
+            rgb = rgb.repeat(2, axis=0).repeat(2, axis=1)
+        return rgb
+
+    def SetDraft(self, draft=True):
+        '''Convert the display frames at half resolution, for a faster preview
+
+        Only applies to the NumPy display conversion: one sample out of four
+        of planar frames is copied and converted.  The script is still
+        rendered at full resolution.  The current frame is converted again
+        when the mode changes.
+        '''
+        if draft != self.draft:
+            self.draft = draft
+            if self.native_display:
+                self.current_frame = -1
+                self.ClearFrameBuffer()
+
+    def _SetDisplayBuffer(self, rgb):
+        '''Store a display frame in the format expected by DrawFrame'''
+        self.display_buffer = numpy.ascontiguousarray(rgb)
+        self.display_pitch = self.display_buffer.strides[0]
+        self.pBits = self.display_buffer.ctypes.data_as(ctypes.POINTER(ctypes.c_ubyte))
+
+    def _GetFrame(self, frame, proxy=1):
+        '''Retrieve a frame for display and the pixel readers
+
+        'proxy' allows a display frame reduced by that factor, see
+        _NativeDisplayFrame.  A frame already retrieved at a higher
+        resolution is kept.
+        '''
         if self.initialized:
-            if self.current_frame == frame:
+            if self.current_frame == frame and self.current_proxy <= proxy:
                 return True
             if frame < 0:
                 frame = 0
             if frame >= self.Framecount:
                 frame = self.Framecount - 1
-            # Original clip
-            self.src_frame = self.clip.get_frame(frame)
-            if self.clip.get_error():
+            # Frame rendered ahead.  The source frame is only requested if a
+            # pixel is read, see _UpdatePixelReaders
+            if self.frame_buffer is not None and frame in self.frame_buffer:
+                self.display_frame = None
+                AvsClipBase._SetDisplayBuffer(self, self.frame_buffer.Get(frame))
+                self.current_frame = frame
+                self.current_proxy = 1
+                return True
+            ok, raw = self._LoadSourceFrame(frame)
+            if not ok:
                 return False
-            self.pitch = self.src_frame.get_pitch()
-            self.pitchUV = self.src_frame.get_pitch(avisynth.avs.AVS_PLANAR_U)
-            self.ptrY = self.src_frame.get_read_ptr()
-            if x86_64:
-                self.ptrY = self._cffi2ctypes_ptr(self.ptrY)
-            if not self.IsY8:
-                self.ptrU = self.src_frame.get_read_ptr(avisynth.avs.AVS_PLANAR_U)
-                self.ptrV = self.src_frame.get_read_ptr(avisynth.avs.AVS_PLANAR_V)
-                if x86_64:
-                    self.ptrU = self._cffi2ctypes_ptr(self.ptrU)
-                    self.ptrV = self._cffi2ctypes_ptr(self.ptrV)
             # Display clip
-            if self.display_clip:
-                self.display_frame = self.display_clip.get_frame(frame)
+            if self.native_display:
+                self.display_frame = None
+                with probes.Probe('display'):
+                    # Copy only the samples converted if possible
+                    planes, sampled = None, 1
+                    step = proxy if proxy > 1 else 2 if self.draft else 1
+                    if raw is None and step > 1:
+                        planes, sampled = self._SampledPlanes(self.src_frame, step)
+                    if planes is None:
+                        if raw is None:
+                            raw = self._RawPlanes(self.src_frame)
+                        planes = self._SplitPlanes(raw)
+                    self._SetDisplayBuffer(self._NativeDisplayFrame(planes, proxy, sampled))
+            elif self.display_clip:
+                self.current_proxy = 1
+                with probes.Probe('display'):
+                    self.display_frame = self.display_clip.get_frame(frame)
                 if self.display_clip.get_error():
                     return False
                 self.display_pitch = self.display_frame.get_pitch()
@@ -705,12 +858,229 @@ class AvsClipBase:
             return True
         return False
 
+    def _LoadSourceFrame(self, frame):
+        '''Retrieve a source frame and point the pixel readers to it
+
+        Return (ok, raw), 'raw' being the planes read from the disk cache or
+        stored into it, None if not used.
+        '''
+        # Read from the disk cache if possible.  Only the NumPy display can
+        # use it, a display clip renders the frame anyway
+        use_cache = self.disk_cache is not None and self.native_display
+        raw = self.disk_cache.Get(self.cache_key, frame) if use_cache else None
+        if raw is not None:
+            self.src_frame = None
+            self._SetPlanePointers(raw)
+        else:
+            start = _clock()
+            with probes.Probe('source'):
+                self.src_frame = self.clip.get_frame(frame)
+            if self.clip.get_error():
+                return False, None
+            self.RecordFrameCost(frame, _clock() - start)
+            self.cached_planes = None
+            self.pitch = self.src_frame.get_pitch()
+            self.pitchUV = self.src_frame.get_pitch(avisynth.avs.AVS_PLANAR_U)
+            self.ptrY = self.src_frame.get_read_ptr()
+            if x86_64:
+                self.ptrY = self._cffi2ctypes_ptr(self.ptrY)
+            if not self.IsY8:
+                self.ptrU = self.src_frame.get_read_ptr(avisynth.avs.AVS_PLANAR_U)
+                self.ptrV = self.src_frame.get_read_ptr(avisynth.avs.AVS_PLANAR_V)
+                if x86_64:
+                    self.ptrU = self._cffi2ctypes_ptr(self.ptrU)
+                    self.ptrV = self._cffi2ctypes_ptr(self.ptrV)
+            if use_cache:
+                raw = self._RawPlanes(self.src_frame)
+                self.disk_cache.Put(self.cache_key, frame, raw)
+        self.pixel_frame = frame
+        return True, raw
+
+    def _UpdatePixelReaders(self):
+        '''Point the pixel readers to the frame shown if it was shown from
+        the render-ahead buffer.  Return False on errors'''
+        if self.current_frame < 0 or self.pixel_frame == self.current_frame:
+            return self.pixel_frame >= 0
+        return self._LoadSourceFrame(self.current_frame)[0]
+
+    def BufferFrames(self, frames, disk=False):
+        '''Prepare a buffer for the display frames of a list of frames
+
+        The frames are stored with BufferFrame and shown from the buffer until
+        the display clip changes.  With 'disk' the buffer is a temporary file.
+        Return False if NumPy is not available.
+        '''
+        self.ClearFrameBuffer()
+        if numpy is None or not self.initialized:
+            return False
+        import framecache
+        self.frame_buffer = framecache.FrameBuffer(frames, disk)
+        return True
+
+    def BufferFrame(self, frame):
+        '''Render the display frame of a frame into the buffer, see BufferFrames
+
+        The frame shown and the pixel readers are left as they were.
+        '''
+        buffer = self.frame_buffer
+        if buffer is None:
+            return False
+        state = self._SaveFrameState()
+        try:
+            if not self._GetFrame(frame):
+                return False
+            if frame in buffer:
+                return True
+            if self.native_display:
+                data = self.display_buffer
+            else:
+                data = self._DisplayArray(self.display_frame.get_row_size() // self.DisplayWidth)
+            return buffer.Put(frame, data)
+        finally:
+            self._RestoreFrameState(state)
+
+    def BufferRawFrame(self, frame, data):
+        '''Convert a frame rendered elsewhere with RawFrame (e.g. by a render.py
+        process) and store its display frame into the buffer, see BufferFrames
+
+        Only for the NumPy display conversion.  The frame shown and the pixel
+        readers are left as they were.
+        '''
+        buffer = self.frame_buffer
+        if buffer is None or not self.native_display or len(data) != self.RawFrameSize():
+            return False
+        if frame in buffer:
+            return True
+        state = self._SaveFrameState()
+        try:
+            planes = self._SplitPlanes(self._RawFramePlanes(data))
+            self._SetDisplayBuffer(self._NativeDisplayFrame(planes))
+            return buffer.Put(frame, self.display_buffer)
+        finally:
+            self._RestoreFrameState(state)
+
+    _FRAME_STATE = ('current_frame', 'current_proxy', 'src_frame', 'display_frame',
+                    'cached_planes', 'pitch', 'pitchUV', 'ptrY', 'ptrU', 'ptrV', 'pixel_frame',
+                    'display_buffer', 'display_pitch', 'pBits')
+
+    def _SaveFrameState(self):
+        '''Return the current frame, display buffer and pixel readers'''
+        return [getattr(self, name, None) for name in self._FRAME_STATE]
+
+    def _RestoreFrameState(self, state):
+        for name, value in zip(self._FRAME_STATE, state):
+            setattr(self, name, value)
+
+    def ClearFrameBuffer(self):
+        if self.frame_buffer is not None:
+            self.frame_buffer.Close()
+            self.frame_buffer = None
+
+    def SetMemoryMax(self, mb=0):
+        '''Set the frame cache limit of the environment in MB, 0 to only read it
+
+        Return the limit in effect, None if unknown.
+        '''
+        try:
+            return int(self.env.invoke('SetMemoryMax', mb))
+        except (avisynth.AvisynthError, TypeError, ValueError):
+            return None
+
+    def IsFrameStored(self, frame):
+        '''Return True if the frame can be shown without rendering, from the
+        render-ahead buffer or the disk cache'''
+        if self.frame_buffer is not None and frame in self.frame_buffer:
+            return True
+        return (self.disk_cache is not None and self.native_display and
+                self.disk_cache.Contains(self.cache_key, frame))
+
+    def RequestFrame(self, frame, clip=None):
+        '''Request a frame of the script clip, or of 'clip', and record its
+        render time.  Return the error message, None on success'''
+        if clip is None:
+            clip = self.clip
+        start = _clock()
+        clip.get_frame(frame)
+        error = clip.get_error()
+        if error is None:
+            self.RecordFrameCost(frame, _clock() - start)
+        return error
+
+    def RecordFrameCost(self, frame, seconds):
+        '''Record the render time of a frame
+
+        The highest time measured is kept, a frame requested again is usually
+        served by the AviSynth cache.
+        '''
+        if not 0 <= frame < self.Framecount:
+            return
+        if self.frame_costs is None:
+            self.frame_costs = array.array('H', [0]) * self.Framecount
+        ms = min(65535, max(1, int(seconds * 1000 + 0.5)))
+        if ms > self.frame_costs[frame]:
+            self.frame_costs[frame] = ms
+
+    def SetFrameCosts(self, costs):
+        '''Restore the render times returned by frame_costs, e.g. from a session'''
+        if costs is None or len(costs) != self.Framecount:
+            return False
+        self.frame_costs = array.array('H', costs)
+        return True
+
+    def SetDiskCache(self, cache, key):
+        '''Read and store the source frames in a framecache.DiskFrameCache'''
+        self.disk_cache = cache
+        self.cache_key = key
+
+    def _SetPlanePointers(self, raw):
+        '''Point the pixel readers to planes from the disk cache'''
+        self.cached_planes = raw
+        P_UBYTE = ctypes.POINTER(ctypes.c_ubyte)
+        self.pitch = raw[0].shape[1]
+        self.ptrY = raw[0].ctypes.data_as(P_UBYTE)
+        if len(raw) > 1:
+            self.pitchUV = raw[1].shape[1]
+            self.ptrU = raw[1].ctypes.data_as(P_UBYTE)
+            self.ptrV = raw[2].ctypes.data_as(P_UBYTE)
+        else:
+            # Interleaved formats read all the components from the same buffer
+            self.pitchUV = self.pitch
+            self.ptrU = self.ptrV = self.ptrY
+
+    def GetDisplayArray(self, frame, proxy=1):
+        '''Return the display frame as a top-down HxWx3 uint8 RGB array
+
+        The array may be a view on the current display buffer.  With a
+        'proxy' factor it may be smaller than the display size, see
+        _NativeDisplayFrame.  Return None if numpy is not available or the
+        frame can't be retrieved.
+        '''
+        if numpy is None or not self._GetFrame(frame, proxy) or self.RGB48:
+            return
+        return self._DisplayToRGB()
+
+    def _DisplayToRGB(self):
+        '''Return the current display buffer as an RGB array, see GetDisplayArray'''
+        pass
+
+    def _DisplayArray(self, bytes_per_pixel):
+        '''Return the current display buffer as a HxWxN uint8 array, as stored'''
+        if self.native_display:
+            return self.display_buffer
+        buf = ctypes.string_at(ctypes.addressof(self.pBits.contents),
+                               self.display_pitch * (self.DisplayHeight - 1) +
+                               self.DisplayWidth * bytes_per_pixel)
+        return numpy.ndarray((self.DisplayHeight, self.DisplayWidth, bytes_per_pixel),
+                             numpy.uint8, buf, 0, (self.display_pitch, bytes_per_pixel, 1))
+
     def _cffi2ctypes_ptr(self, ptr):
         return ctypes.cast(
                     int(avisynth.ffi.cast('unsigned long long', ptr)),
                     ctypes.POINTER(ctypes.c_ubyte))
 
     def GetPixelYUV(self, x, y):
+        if not self._UpdatePixelReaders():
+            return (-1,-1,-1)
         if self.IsPlanar:
             indexY = x + y * self.pitch
             if self.IsY8:
@@ -727,6 +1097,8 @@ class AvsClipBase:
         return (self.ptrY[indexY], self.ptrU[indexU], self.ptrV[indexV])
 
     def GetPixelRGB(self, x, y, BGR=True):
+        if not self._UpdatePixelReaders():
+            return (-1,-1,-1)
         if self.IsRGB:
             bytes = self.vi.bytes_from_pixels(1)
             if BGR:
@@ -742,6 +1114,8 @@ class AvsClipBase:
             return (-1,-1,-1)
 
     def GetPixelRGBA(self, x, y, BGR=True):
+        if not self._UpdatePixelReaders():
+            return (-1,-1,-1,-1)
         if self.IsRGB32:
             bytes = self.vi.bytes_from_pixels(1)
             if BGR:
@@ -758,6 +1132,132 @@ class AvsClipBase:
         else:
             return (-1,-1,-1,-1)
 
+    def GetPlanes(self, frame):
+        '''Return the planes of a source frame as a list of numpy arrays
+
+        Samples are kept at the native bit depth of the clip (uint8, uint16
+        or float32).  The list is [Y, U, V] for YUV clips, [Y] for greyscale
+        ones and [R, G, B] for RGB.  Return None if numpy is not available
+        or the frame can't be retrieved.
+        '''
+        if numpy is None or not self.initialized:
+            return
+        dtype = {1: numpy.uint8, 2: numpy.uint16, 4: numpy.float32}.get(self.ComponentSize)
+        if dtype is None:
+            return
+        if frame < 0:
+            frame = 0
+        if frame >= self.Framecount:
+            frame = self.Framecount - 1
+        src_frame = self.clip.get_frame(frame)
+        if self.clip.get_error():
+            return
+        return self._FramePlanes(src_frame, dtype)
+
+    def _FramePlanes(self, src_frame, dtype=None):
+        '''Return the planes of an already retrieved frame, see GetPlanes'''
+        return self._SplitPlanes(self._RawPlanes(src_frame), dtype)
+
+    def _RawPlanes(self, src_frame):
+        '''Return the stored planes of a frame as 2D uint8 arrays, without padding'''
+        avs = avisynth.avs
+        if not self.IsPlanar or self.IsYUY2:
+            planes = (avs.AVS_PLANAR_Y,)
+        elif self.IsRGB:
+            planes = (avs.AVS_PLANAR_R, avs.AVS_PLANAR_G, avs.AVS_PLANAR_B)
+        elif self.IsY8 or (self.avsplus_colorspace and self.vi.is_y()):
+            planes = (avs.AVS_PLANAR_Y,)
+        else:
+            planes = (avs.AVS_PLANAR_Y, avs.AVS_PLANAR_U, avs.AVS_PLANAR_V)
+        return [self._PlaneToArray(src_frame, plane, numpy.uint8) for plane in planes]
+
+    def _SplitPlanes(self, raw, dtype=None):
+        '''Return the planes of GetPlanes from the arrays of _RawPlanes'''
+        if dtype is None:
+            dtype = {1: numpy.uint8, 2: numpy.uint16, 4: numpy.float32}[self.ComponentSize]
+        raw = [data.view(dtype) for data in raw]
+        if self.IsRGB and not self.IsPlanar:
+            # Interleaved BGR(A), bottom-up
+            data = raw[0].reshape(raw[0].shape[0], self.Width, -1)[::-1]
+            return [data[..., 2], data[..., 1], data[..., 0]]
+        if self.IsYUY2:
+            data = raw[0]
+            return [data[:, 0::2], data[:, 1::4], data[:, 3::4]]
+        return raw
+
+    def _RawFramePlanes(self, data):
+        '''Return the planes of a RawFrame buffer as _RawPlanes does'''
+        data = numpy.frombuffer(data, numpy.uint8)
+        if not self.IsPlanar or self.IsYUY2:
+            return [data.reshape(self.Height, -1)]
+        row_size = self.Width * self.ComponentSize
+        if self.IsY8 or (self.avsplus_colorspace and self.vi.is_y()):
+            return [data[:row_size * self.Height].reshape(self.Height, row_size)]
+        avs = avisynth.avs
+        planes = []
+        offset = 0
+        for plane in (avs.AVS_PLANAR_Y, avs.AVS_PLANAR_U, avs.AVS_PLANAR_V):
+            width = row_size >> self.vi.get_plane_width_subsampling(plane)
+            height = self.Height >> self.vi.get_plane_height_subsampling(plane)
+            planes.append(data[offset:offset + width * height].reshape(height, width))
+            offset += width * height
+        if self.IsRGB:
+            # Planar RGB is stored as G, B, R
+            planes = [planes[2], planes[0], planes[1]]
+        return planes
+
+    def _SampledPlanes(self, src_frame, step):
+        '''Copy one sample out of step x step of every plane of a frame
+
+        Return (planes, step) as returned by _SplitPlanes, the step being
+        halved until it divides the size of every plane, or (None, 1) if the
+        format has to be copied whole (interleaved, bit depth hacks).
+        '''
+        if step < 2 or self.bit_depth or not self.IsPlanar or self.IsYUY2:
+            return None, 1
+        avs = avisynth.avs
+        if self.IsRGB:
+            ids = (avs.AVS_PLANAR_R, avs.AVS_PLANAR_G, avs.AVS_PLANAR_B)
+        elif self.IsY8 or (self.avsplus_colorspace and self.vi.is_y()):
+            ids = (avs.AVS_PLANAR_Y,)
+        else:
+            ids = (avs.AVS_PLANAR_Y, avs.AVS_PLANAR_U, avs.AVS_PLANAR_V)
+        size = self.ComponentSize
+        dtype = {1: numpy.uint8, 2: numpy.uint16, 4: numpy.float32}[size]
+        shapes = [(src_frame.get_height(plane), src_frame.get_row_size(plane) // size)
+                  for plane in ids]
+        while step > 1 and any(height % step or width % step for height, width in shapes):
+            step //= 2
+        if step < 2:
+            return None, 1
+        planes = []
+        for plane, (height, width) in zip(ids, shapes):
+            pitch = src_frame.get_pitch(plane)
+            ptr = src_frame.get_read_ptr(plane)
+            if x86_64:
+                address = int(avisynth.ffi.cast('unsigned long long', ptr))
+            else:
+                address = ctypes.addressof(ptr.contents)
+            # A view on the frame, only the samples taken are copied
+            buf = (ctypes.c_ubyte * (pitch * (height - 1) + width * size)).from_address(address)
+            data = numpy.ndarray((height, width), dtype, buf, 0, (pitch, size))
+            planes.append(data[::step, ::step].copy())
+        return planes, step
+
+    def _PlaneToArray(self, src_frame, plane, dtype):
+        '''Copy a plane of a video frame to a 2D numpy array, without padding'''
+        pitch = src_frame.get_pitch(plane)
+        row_size = src_frame.get_row_size(plane)
+        height = src_frame.get_height(plane)
+        ptr = src_frame.get_read_ptr(plane)
+        if x86_64:
+            address = int(avisynth.ffi.cast('unsigned long long', ptr))
+        else:
+            address = ctypes.addressof(ptr.contents)
+        buf = ctypes.string_at(address, pitch * (height - 1) + row_size)
+        data = numpy.ndarray((height, row_size), numpy.uint8, buf, 0, (pitch, 1))
+        return data.copy().view(dtype)
+
     def GetVarType(self, str_var):
         try:
             return self.env.get_var(str_var, type=True)[1]
@@ -829,6 +1329,10 @@ class AvsClipBase:
             height, interlaced, self.FramerateNumerator, self.FramerateDenominator,
             sar, colorspace, X)
 
+    def RawFrameSize(self):
+        '''Size in bytes of the video data of a RawFrame buffer'''
+        return self.Width * self.Height * self.vi.bits_per_pixel() >> 3
+
     def RawFrame(self, frame, y4m_header=False):
         '''Get a buffer of raw video data'''
         if self.initialized:
@@ -839,7 +1343,7 @@ class AvsClipBase:
             frame = self.clip.get_frame(frame)
             if self.clip.get_error():
                 return
-            total_bytes = self.Width * self.Height * self.vi.bits_per_pixel() >> 3
+            total_bytes = self.RawFrameSize()
             if y4m_header is not False:
                 X = ' X' + y4m_header if isinstance(y4m_header, basestring) else ''
                 y4m_header = 'FRAME{0}\n'.format(X)
@@ -978,17 +1482,21 @@ if os.name == 'nt':
 
     def CreateBitmapInfoHeader(clip, bmih=None):
         vi = clip.get_video_info()
+        if vi.is_rgb32():
+            bit_count = 32
+        elif vi.is_rgb24():
+            bit_count = 24
+        else: raise AvisynthError("Input colorspace is not RGB24 or RGB32")
+        return FillBitmapInfoHeader(bmih, vi.width, vi.height, bit_count)
+
+    def FillBitmapInfoHeader(bmih, width, height, bit_count):
         if bmih is None:
             bmih = BITMAPINFOHEADER()
         bmih.biSize = ctypes.sizeof(BITMAPINFOHEADER)
-        bmih.biWidth = vi.width
-        bmih.biHeight = vi.height
+        bmih.biWidth = width
+        bmih.biHeight = height
         bmih.biPlanes = 1
-        if vi.is_rgb32():
-            bmih.biBitCount = 32
-        elif vi.is_rgb24():
-            bmih.biBitCount = 24
-        else: raise AvisynthError("Input colorspace is not RGB24 or RGB32")
+        bmih.biBitCount = bit_count
         bmih.biCompression = BI_RGB
         bmih.biSizeImage = 0 # ignored with biCompression == BI_RGB
         bmih.biXPelsPerMeter = 0
@@ -1023,7 +1531,10 @@ if os.name == 'nt':
                 return
             # Prepare info header for displaying
             self.bmih = BITMAPINFOHEADER()
-            CreateBitmapInfoHeader(self.display_clip, self.bmih)
+            if self.native_display:
+                FillBitmapInfoHeader(self.bmih, self.DisplayWidth, self.DisplayHeight, 32)
+            else:
+                CreateBitmapInfoHeader(self.display_clip, self.bmih)
             self.pInfo = ctypes.pointer(self.bmih)
             return True
 
@@ -1036,8 +1547,19 @@ if os.name == 'nt':
                     return False
             return True
 
-        def _GetFrame(self, frame):
-            if AvsClipBase._GetFrame(self, frame):
+        def _SetDisplayBuffer(self, rgb):
+            # Bottom-up BGRA, as returned by ConvertToRGB32
+            bgra = numpy.empty(rgb.shape[:2] + (4,), numpy.uint8)
+            bgra[..., 2::-1] = rgb[::-1]
+            bgra[..., 3] = 255
+            AvsClipBase._SetDisplayBuffer(self, bgra)
+
+        def _DisplayToRGB(self):
+            # Bottom-up BGRA
+            return self._DisplayArray(4)[::-1, :, 2::-1]
+
+        def _GetFrame(self, frame, proxy=1):
+            if AvsClipBase._GetFrame(self, frame, proxy):
                 self.bmih.biWidth = self.display_pitch * 8 / self.bmih.biBitCount
                 return True
             return False
@@ -1052,7 +1574,10 @@ if os.name == 'nt':
                     h = self.DisplayHeight
                 else:
                     w, h = size
-                row_size = self.display_frame.get_row_size()
+                if self.native_display or self.display_frame is None:
+                    row_size = self.display_pitch
+                else:
+                    row_size = self.display_frame.get_row_size()
                 if self.display_pitch == row_size: # the size of the vfb is not guaranteed to be pitch * height unless pitch == row_size
                     pBits = self.pBits
                 else:
@@ -1067,7 +1592,7 @@ if os.name == 'nt':
 # Use generical wxPython drawing support on other platforms
 else:
 
-    import wx
+    # wx is only imported when drawing, so pyavs can be used without a display
 
     def InitRoutines():
         pass
@@ -1094,15 +1619,27 @@ else:
             except avisynth.AvisynthError as err:
                 return False
 
+        def _DisplayToRGB(self):
+            # RGB24 with swapped channels (bottom-up) or native top-down RGB
+            data = self._DisplayArray(3)
+            return data if self.native_display else data[::-1]
+
         def DrawFrame(self, frame, dc=None, offset=(0,0), size=None):
             if not self._GetFrame(frame):
                 return
             if dc:
+                import wx
                 if size is None:
                     w = self.DisplayWidth
                     h = self.DisplayHeight
                 else:
                     w, h = size
+                if self.native_display:
+                    # Already top-down RGB
+                    bmp = wx.BitmapFromBuffer(w, h, numpy.ascontiguousarray(
+                                              self.display_buffer[:h, :w]))
+                    dc.DrawBitmap(bmp, 0, 0)
+                    return True
                 buf = ctypes.create_string_buffer(h * w * 3)
                 # Use ctypes.memmove to blit the Avisynth VFB line-by-line
                 read_addr = ctypes.addressof(self.pBits.contents) + (h - 1) * self.display_pitch
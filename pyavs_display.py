@@ -0,0 +1,176 @@
+# AvsP - an AviSynth editor
+#
+# Copyright 2007 Peter Jang <http://www.avisynth.org/qwerpoi>
+#           2010-2017 the AvsPmod authors <https://github.com/avspmod/avspmod>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA, or visit
+#  http://www.gnu.org/copyleft/gpl.html .
+
+# pyavs_display - RGB conversion of video frames for the preview
+#
+# Converts the source planes returned by pyavs.AvsClipBase.GetPlanes to
+# 8-bit RGB without going through AviSynth: matrix and range conversion,
+# chroma upsampling and dithered bit depth reduction are done with NumPy.
+# Stacked and interleaved 16-bit formats (MSB/LSB hacks) are also decoded
+# here, so no plugin is needed to preview them.  Scale resizes only the
+# visible part of a zoomed frame.
+#
+# Dependencies:
+#     NumPy (optional, pyavs falls back to AviSynth's ConvertToRGB without it)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Kr, Kb coefficients
+MATRICES = {'601': (0.299, 0.114), '709': (0.2126, 0.0722),
+            '2020': (0.2627, 0.0593)}
+
+# 4x4 ordered dither, in [-0.5, 0.5)
+BAYER = ((0, 8, 2, 10), (12, 4, 14, 6), (3, 11, 1, 9), (15, 7, 13, 5))
+
+def Unstack(plane):
+    '''Join the MSB (top half) and LSB (bottom half) of a stacked 8-bit plane'''
+    height = plane.shape[0] // 2
+    return (plane[:height].astype(numpy.uint16) << 8) | plane[height:2 * height]
+
+def Deinterleave(plane):
+    '''Join the LSB (even columns) and MSB (odd columns) of an interleaved plane'''
+    return (plane[:, 1::2].astype(numpy.uint16) << 8) | plane[:, 0::2]
+
+def _Upsample2(plane, left_sited=False):
+    '''Double the number of rows of a float plane by linear interpolation'''
+    prev = numpy.concatenate((plane[:1], plane[:-1]))
+    following = numpy.concatenate((plane[1:], plane[-1:]))
+    out = numpy.empty((plane.shape[0] * 2,) + plane.shape[1:], numpy.float32)
+    if left_sited:
+        out[0::2] = plane
+        out[1::2] = (plane + following) * 0.5
+    else:
+        out[0::2] = plane * 0.75 + prev * 0.25
+        out[1::2] = plane * 0.75 + following * 0.25
+    return out
+
+def _Upsample(plane, factor, left_sited=False):
+    if factor == 2:
+        return _Upsample2(plane, left_sited)
+    return plane.repeat(factor, axis=0)
+
+def UpsampleChroma(plane, factor_y, factor_x, interlaced=False):
+    '''Upsample a float chroma plane to the luma size
+
+    Horizontal chroma is left-sited (MPEG-2) and vertical chroma centered.
+    Interlaced 4:2:0 chroma is upsampled separately for each field.
+    '''
+    if factor_x > 1:
+        plane = _Upsample(plane.T, factor_x, True).T
+    if factor_y > 1:
+        if interlaced and plane.shape[0] % 2 == 0:
+            out = numpy.empty((plane.shape[0] * factor_y, plane.shape[1]), numpy.float32)
+            out[0::2] = _Upsample(plane[0::2], factor_y)
+            out[1::2] = _Upsample(plane[1::2], factor_y)
+            plane = out
+        else:
+            plane = _Upsample(plane, factor_y)
+    return plane
+
+def Normalize(plane, bits, chroma=False, limited=True):
+    '''Return a float32 plane in [0, 1], or [-0.5, 0.5] for chroma'''
+    if bits == 32:
+        scale = 1 / 255.0
+        peak = 1.0
+    else:
+        scale = float(1 << (bits - 8))
+        peak = float((1 << bits) - 1)
+    if chroma:
+        offset = 0 if bits == 32 else 128 * scale
+        span = 224 * scale if limited else peak
+    else:
+        offset = 16 * scale if limited else 0
+        span = 219 * scale if limited else peak
+    return (plane.astype(numpy.float32) - offset) * numpy.float32(1 / span)
+
+def Dither(plane, dither=True):
+    '''Quantize a float plane in [0, 1] to uint8, with ordered dithering'''
+    plane = plane * numpy.float32(255)
+    if dither:
+        height, width = plane.shape
+        pattern = (numpy.array(BAYER, numpy.float32) + 0.5) / 16 - 0.5
+        pattern = numpy.tile(pattern, ((height + 3) // 4, (width + 3) // 4))
+        plane += pattern[:height, :width]
+    plane += 0.5
+    return numpy.clip(plane, 0, 255).astype(numpy.uint8)
+
+def ToRGB(planes, bits, is_rgb=False, matrix='Rec601', interlaced=False,
+          swapuv=False):
+    '''Return a HxWx3 uint8 RGB array from a list of planes
+
+    'planes' is the list returned by pyavs.AvsClipBase.GetPlanes: [Y, U, V],
+    [Y] or [R, G, B].  'matrix' is 'Rec601', 'PC.709', 'Rec2020', etc.
+    Samples with more than 8 bits are dithered.
+    '''
+    dither = bits != 8
+    if is_rgb:
+        if bits == 8:
+            return numpy.dstack(planes[:3])
+        return numpy.dstack([Dither(Normalize(plane, bits, limited=False))
+                             for plane in planes[:3]])
+    limited = not matrix.startswith('PC')
+    y = Normalize(planes[0], bits, limited=limited)
+    if len(planes) < 3:
+        y = Dither(y, dither)
+        return numpy.dstack((y, y, y))
+    u, v = planes[1:3]
+    if swapuv:
+        u, v = v, u
+    factor_y = planes[0].shape[0] // u.shape[0]
+    factor_x = planes[0].shape[1] // u.shape[1]
+    u = UpsampleChroma(Normalize(u, bits, True, limited), factor_y, factor_x, interlaced)
+    v = UpsampleChroma(Normalize(v, bits, True, limited), factor_y, factor_x, interlaced)
+    kr, kb = MATRICES.get(matrix.replace('PC.', '').replace('Rec', ''), MATRICES['601'])
+    r = y + v * numpy.float32(2 * (1 - kr))
+    b = y + u * numpy.float32(2 * (1 - kb))
+    g = (y - kr * r - kb * b) * numpy.float32(1 / (1 - kr - kb))
+    return numpy.dstack((Dither(r, dither), Dither(g, dither), Dither(b, dither)))
+
+def Scale(rgb, zoom, left, top, width, height, bilinear=False):
+    '''Return a region of a HxWx3 uint8 image scaled by 'zoom'
+
+    (left, top, width, height) is given in scaled coordinates, so the cost
+    only depends on the size of the region.
+    '''
+    src_height, src_width = rgb.shape[:2]
+    xs = (numpy.arange(left, left + width) + 0.5) / zoom - 0.5
+    ys = (numpy.arange(top, top + height) + 0.5) / zoom - 0.5
+    if not bilinear:
+        cols = numpy.clip(numpy.floor(xs + 0.5).astype(numpy.intp), 0, src_width - 1)
+        rows = numpy.clip(numpy.floor(ys + 0.5).astype(numpy.intp), 0, src_height - 1)
+        return numpy.ascontiguousarray(rgb[rows[:, numpy.newaxis], cols])
+    x0 = numpy.clip(numpy.floor(xs).astype(numpy.intp), 0, src_width - 1)
+    y0 = numpy.clip(numpy.floor(ys).astype(numpy.intp), 0, src_height - 1)
+    x1 = numpy.minimum(x0 + 1, src_width - 1)
+    y1 = numpy.minimum(y0 + 1, src_height - 1)
+    fx = numpy.clip(xs - x0, 0, 1).astype(numpy.float32)[numpy.newaxis, :, numpy.newaxis]
+    fy = numpy.clip(ys - y0, 0, 1).astype(numpy.float32)[:, numpy.newaxis, numpy.newaxis]
+    y0 = y0[:, numpy.newaxis]
+    y1 = y1[:, numpy.newaxis]
+    p00 = rgb[y0, x0].astype(numpy.float32)
+    p01 = rgb[y0, x1].astype(numpy.float32)
+    p10 = rgb[y1, x0].astype(numpy.float32)
+    p11 = rgb[y1, x1].astype(numpy.float32)
+    upper = p00 + (p01 - p00) * fx
+    lower = p10 + (p11 - p10) * fx
+    return (upper + (lower - upper) * fy + 0.5).astype(numpy.uint8)
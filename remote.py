@@ -0,0 +1,231 @@
+# AvsP - an AviSynth editor
+#
+# Copyright 2007 Peter Jang <http://www.avisynth.org/qwerpoi>
+#           2010-2017 the AvsPmod authors <https://github.com/avspmod/avspmod>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA, or visit
+#  http://www.gnu.org/copyleft/gpl.html .
+
+# remote - remote control of a running AvsPmod
+#
+# The single instance server (wxp.ArgsPosterThread) accepts connections on
+# localhost or a Unix socket.  Messages are framed as in farm.py: a type
+# byte, the payload length and a UTF-8 JSON payload.  A request is
+#     {"id": 1, "command": "seek", "args": [100]}
+# and its response
+#     {"id": 1, "result": true}   or   {"id": 1, "error": "..."}
+# Requests on a connection are run in order, so a client can send several
+# of them before reading the responses (pipelining).
+#
+# Commands:
+#     ping                              answered without the GUI
+#     args [argument, ...]              command line of another instance
+#     open filename                     open a script, return its tab index
+#     seek frame [index]                show a frame, False on errors
+#     frame                             current frame number
+#     info [frame] [index]              frame number, time and clip properties
+#     bookmarks                         list of [frame, title]
+#     setbookmarks frames [replace]     add bookmarks, frame or [frame, title]
+#
+# Usage:
+#     python remote.py [--address ADDRESS] COMMAND [ARG ...]
+#     python remote.py [--address ADDRESS] --benchmark 1000 [--command frame]
+#
+# Dependencies:
+#     Python (tested on v2.7)
+# Scripts:
+#     farm.py (message framing)
+
+import os
+import sys
+import time
+import json
+import socket
+import optparse
+import collections
+
+from farm import SendMessage, RecvMessage, Connect, ParseAddress, FarmError
+
+DEFAULT_ADDRESS = ('localhost', 50009)
+# Maximum time a command waits for the GUI, in seconds
+COMMAND_TIMEOUT = 30
+
+class RemoteError(Exception):
+    pass
+
+def Listen(address):
+    '''Return a listening socket for a (host, port) tuple or a Unix socket path'''
+    address = ParseAddress(address) if isinstance(address, basestring) else address
+    family = socket.AF_UNIX if isinstance(address, basestring) else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    if family == socket.AF_UNIX and os.path.exists(address):
+        os.remove(address)
+    sock.bind(address)
+    sock.listen(5)
+    return sock
+
+def _NoDelay(sock):
+    # Small messages must not wait for the previous ones to be acknowledged
+    if sock.family == socket.AF_INET:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+def ServeConnection(sock, handler):
+    '''Answer the requests of a connection until it's closed
+
+    handler(command, args) returns the result of a command or raises an
+    exception, whose message is sent back as the error.
+    '''
+    _NoDelay(sock)
+    try:
+        while True:
+            try:
+                kind, request = RecvMessage(sock)
+            except FarmError:
+                return
+            response = {'id': request.get('id') if isinstance(request, dict) else None}
+            try:
+                if kind != 'J' or not isinstance(request, dict):
+                    raise RemoteError('Invalid request')
+                command = request.get('command')
+                if command == 'ping':
+                    response['result'] = True
+                else:
+                    response['result'] = handler(command, request.get('args', []))
+            except Exception as err:
+                response['error'] = unicode(err) or err.__class__.__name__
+            try:
+                SendMessage(sock, response)
+            except TypeError:
+                SendMessage(sock, {'id': response['id'], 'error': 'Result not serializable'})
+    except socket.error:
+        pass
+    finally:
+        sock.close()
+
+class RemoteClient(object):
+    '''Connection to a running AvsPmod
+
+    Call() sends a request and waits for its result.  For pipelining, Send()
+    several requests and Receive() their results in the same order.
+    '''
+
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=None):
+        self.sock = Connect(address)
+        self.sock.settimeout(timeout)
+        _NoDelay(self.sock)
+        self.pending = collections.deque()
+        self.id = 0
+
+    def Send(self, command, *args):
+        self.id += 1
+        SendMessage(self.sock, {'id': self.id, 'command': command, 'args': args})
+        self.pending.append(self.id)
+        return self.id
+
+    def Receive(self):
+        '''Return the result of the oldest request not received yet'''
+        if not self.pending:
+            raise RemoteError('No request pending')
+        kind, response = RecvMessage(self.sock)
+        if kind != 'J' or response.get('id') != self.pending.popleft():
+            raise RemoteError('Unexpected response')
+        if 'error' in response:
+            raise RemoteError(response['error'])
+        return response.get('result')
+
+    def Call(self, command, *args):
+        self.Send(command, *args)
+        return self.Receive()
+
+    def Pipeline(self, requests):
+        '''Send a list of (command, args) and return the list of results'''
+        for command, args in requests:
+            self.Send(command, *args)
+        return [self.Receive() for request in requests]
+
+    def Close(self):
+        self.sock.close()
+
+def Benchmark(address=DEFAULT_ADDRESS, count=1000, depth=16, command='ping', args=()):
+    '''Measure the round trip of a command
+
+    Returns the latencies of 'count' sequential requests in milliseconds
+    (min, median, p95, p99, max) and the throughput in requests per second
+    with 'depth' requests pipelined.
+    '''
+    client = RemoteClient(address)
+    try:
+        latencies = []
+        for i in xrange(count):
+            start = time.time()
+            client.Call(command, *args)
+            latencies.append((time.time() - start) * 1000)
+        latencies.sort()
+        percentile = lambda p: latencies[min(count - 1, int(count * p))]
+        start = time.time()
+        sent = 0
+        while sent < count or client.pending:
+            while sent < count and len(client.pending) < depth:
+                client.Send(command, *args)
+                sent += 1
+            client.Receive()
+        elapsed = time.time() - start
+    finally:
+        client.Close()
+    return {'count': count, 'min': latencies[0], 'median': percentile(0.5),
+            'p95': percentile(0.95), 'p99': percentile(0.99), 'max': latencies[-1],
+            'depth': depth, 'pipelined': count / max(elapsed, 1e-9)}
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage='%prog [options] COMMAND [ARG ...]',
+                                   description='Send a command to a running AvsPmod.  '
+                                   'Arguments are parsed as JSON, or taken as strings')
+    parser.add_option('--address', default='%s:%i' % DEFAULT_ADDRESS,
+                      help='HOST:PORT or the path of a Unix socket (default: %default)')
+    parser.add_option('--benchmark', type='int', metavar='COUNT',
+                      help='measure the round trip of COUNT requests')
+    parser.add_option('--depth', type='int', default=16,
+                      help='requests in flight for the pipelined benchmark (default: %default)')
+    parser.add_option('--command', default='ping',
+                      help='command of the benchmark (default: %default)')
+    options, args = parser.parse_args(argv)
+    if not options.benchmark and not args:
+        parser.error('a command is required')
+    address = ParseAddress(options.address)
+    try:
+        if options.benchmark:
+            stats = Benchmark(address, options.benchmark, options.depth, options.command)
+            print('{count} x {0}: min {min:.3f} ms, median {median:.3f} ms, p95 {p95:.3f} ms, '
+                  'p99 {p99:.3f} ms, max {max:.3f} ms'.format(options.command, **stats))
+            print('pipelined ({depth} in flight): {pipelined:.0f} requests/s'.format(**stats))
+            return 0
+        values = []
+        for arg in args[1:]:
+            try:
+                values.append(json.loads(arg))
+            except ValueError:
+                values.append(arg.decode(sys.stdin.encoding or 'utf-8'))
+        client = RemoteClient(address)
+        try:
+            print(json.dumps(client.Call(args[0], *values)))
+        finally:
+            client.Close()
+    except (RemoteError, FarmError, socket.error) as err:
+        sys.stderr.write('{0}\n'.format(err))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
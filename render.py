@@ -0,0 +1,537 @@
+# AvsP - an AviSynth editor
+#
+# Copyright 2007 Peter Jang <http://www.avisynth.org/qwerpoi>
+#           2010-2017 the AvsPmod authors <https://github.com/avspmod/avspmod>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA, or visit
+#  http://www.gnu.org/copyleft/gpl.html .
+
+# render - headless batch rendering of AviSynth scripts
+#
+# Runs the jobs of a JSON manifest through a process pool, without wx and
+# without a display.  Every worker process keeps one AviSynth environment
+# for all its jobs.  Progress is written to stdout as JSON lines, one event
+# per line.
+#
+# Usage:
+#     python render.py [options] manifest.json
+#
+# Manifest:
+#     {"processes": 4,                 (optional, default: number of CPUs)
+#      "avisynth_dir": "",             (optional, AviSynth library directory)
+#      "jobs": [
+#         {"script": "a.avs", "action": "y4m", "output": "a.y4m"},
+#         {"script": "b.avs", "action": "raw", "output": "|x264 ... -",
+#          "frames": [0, 99]},
+#         {"text": "Version()", "action": "info"},
+#         {"script": "c.avs", "action": "stats", "output": "c.jsonl"},
+#         {"script": "d.avs", "action": "autocrop", "samples": 10},
+#         {"script": "e.avs", "action": "images", "output": "e_{frame:06d}.png",
+#          "frame_list": [0, 100, 200]},
+#         {"script": "f.avs", "action": "vars", "vars": ["src_width", "crop"]},
+#         {"script": "g.avs", "action": "timestamps", "output": "g_timecodes.txt"},
+#         {"script": "h.avs", "action": "hashes", "frames": [0, 99],
+#          "expect": ["...", ...]}
+#     ]}
+#
+#     'frames' is [first, last] (inclusive, default the whole clip) and
+#     'frame_list' an explicit list of frame numbers.  'output' is a file
+#     name (named pipes work too) or '|' followed by a shell command that
+#     reads the data from its stdin.  Images are saved as PNG if the output
+#     ends with '.png', PPM otherwise.  The output can contain the fields
+#     {index} (job number), {name} (script name without extension) and, for
+#     images, {frame}; literal braces are written doubled, see EscapeOutput.
+#     'timestamps' requests every frame and returns the
+#     FFMS2 presentation times (FFVFR_TIME), also saved as a timecode v2 file
+#     if an output is given.  'hashes' returns a checksum of the raw planes of
+#     every frame; with a list of 'expect'ed checksums it stops at the first
+#     frame that differs and returns it as 'changed'.  "hashes": true in a
+#     'y4m' or 'raw' job returns the checksums of the frames encoded, and
+#     "times": true their render times in milliseconds.
+#
+# Progress events:
+#     {"event": "start", "job": 0, "script": "a.avs", "frames": 240}
+#     {"event": "progress", "job": 0, "frame": 120, "total": 240, "fps": 85.2}
+#     {"event": "done", "job": 0, "elapsed": 2.8, "result": {...}}
+#     {"event": "error", "job": 0, "message": "..."}
+#     {"event": "finished", "jobs": 1, "errors": 0, "elapsed": 2.9}
+#
+# Dependencies:
+#     Python (tested on v2.7)
+#     NumPy (optional, only for the 'stats' and 'images' actions)
+# Scripts:
+#     pyavs.py (only imported by the worker processes)
+#     pyavs_display.py (RGB conversion for the 'images' action)
+
+import os
+import sys
+import re
+import time
+import json
+import struct
+import zlib
+import hashlib
+import optparse
+import subprocess
+import multiprocessing
+import Queue
+
+import global_vars
+
+ACTIONS = ('y4m', 'raw', 'info', 'stats', 'autocrop', 'images', 'vars', 'timestamps',
+           'hashes')
+PROGRESS_INTERVAL = 0.5
+
+class RenderError(Exception):
+    pass
+
+# Output
+
+class Output(object):
+    '''File or command pipe receiving the rendered data'''
+
+    def __init__(self, output):
+        self.process = None
+        if not output:
+            raise RenderError('No output specified')
+        if output.startswith('|'):
+            self.process = subprocess.Popen(output[1:], shell=True,
+                                            stdin=subprocess.PIPE)
+            self.file = self.process.stdin
+        else:
+            self.file = open(output, 'wb')
+
+    def write(self, data):
+        try:
+            self.file.write(data)
+        except IOError as err:
+            raise RenderError('Error writing the output: {0}'.format(err))
+
+    def close(self):
+        try:
+            self.file.close()
+        except IOError:
+            pass
+        if self.process is not None:
+            returncode = self.process.wait()
+            if returncode:
+                raise RenderError('The output command returned {0}'.format(returncode))
+
+# Process pool workers
+_worker = {}
+
+def _InitWorker(library_dir, options, queue):
+    '''Create the AviSynth environment shared by the jobs of this worker'''
+    # Keep stdout for the progress of the main process
+    sys.stdout = sys.stderr
+    global_vars.avisynth_library_dir = library_dir
+    global_vars.options.update(options)
+    _worker['queue'] = queue
+    # Errors are reported by every job, an exception here would hang the pool
+    try:
+        import pyavs
+        _worker['pyavs'] = pyavs
+        _worker['env'] = pyavs.avisynth.AVS_ScriptEnvironment(3)
+    except Exception as err:
+        _worker['error'] = u'Error loading AviSynth: {0}'.format(err)
+
+def _Report(event, job, **kwargs):
+    kwargs['event'] = event
+    kwargs['job'] = job
+    _worker['queue'].put(kwargs)
+
+def _LoadClip(job):
+    '''Evaluate the script of a job, return a pyavs.AvsClip'''
+    if 'text' in job:
+        text = job['text']
+        filename = job.get('script', 'script.avs')
+    else:
+        filename = os.path.abspath(job['script'])
+        with open(filename, 'rb') as f:
+            text = f.read()
+    workdir = job.get('workdir', os.path.dirname(os.path.abspath(filename)))
+    clip = _worker['pyavs'].AvsClip(text, filename, workdir=workdir, env=_worker['env'],
+                                    display_clip=False, interlaced=job.get('interlaced', False))
+    if not clip.initialized or clip.IsErrorClip():
+        raise RenderError(clip.error_message or 'Error loading {0}'.format(filename))
+    return clip
+
+def _FrameRange(job, clip):
+    '''Return the list of frames to process for a job'''
+    if 'frame_list' in job:
+        return [n for n in job['frame_list'] if 0 <= n < clip.Framecount]
+    if job.get('frames') is None:
+        return range(clip.Framecount)
+    first, last = job['frames']
+    return range(max(0, first), min(last, clip.Framecount - 1) + 1)
+
+def EscapeOutput(text):
+    '''Escape a file name or command line for a job output, keeping its braces'''
+    return text.replace('{', '{{').replace('}', '}}')
+
+def _FormatOutput(job, **kwargs):
+    '''Replace the {index}, {name} and additional fields in the job output'''
+    name = os.path.splitext(os.path.basename(job.get('script', 'script')))[0]
+    return job['output'].format(index=job['index'], name=name, **kwargs)
+
+def _Y4MColorspace(clip):
+    '''Return (colorspace, depth) for a yuv4mpeg2 header, see AvsClipBase.Y4MHeader'''
+    match = re.match(r'(?:YUV(4\d\d)|Y)P?(\d+)$', clip.Colorspace or '')
+    if clip.avsplus_colorspace and match and clip.BitsPerComponent > 8:
+        return match.group(1) or 'mono', clip.BitsPerComponent
+    return None, None
+
+class _Progress(object):
+    '''Report progress for a job, at most every PROGRESS_INTERVAL seconds'''
+
+    def __init__(self, job, total):
+        self.job = job
+        self.total = total
+        self.start = self.last = time.time()
+
+    def __call__(self, done):
+        now = time.time()
+        if now - self.last >= PROGRESS_INTERVAL or done == self.total:
+            self.last = now
+            elapsed = now - self.start
+            _Report('progress', self.job, frame=done, total=self.total,
+                    fps=round(done / elapsed, 2) if elapsed else 0)
+
+def _FrameHash(buf, offset=0):
+    '''Checksum of the raw frame data in a RawFrame buffer'''
+    return hashlib.md5(buffer(buf, offset)).hexdigest()
+
+def _RenderFrames(clip, job, frames, progress, y4m=False):
+    if y4m:
+        colorspace, depth = _Y4MColorspace(clip)
+        header = clip.Y4MHeader(colorspace=job.get('colorspace', colorspace),
+                                depth=job.get('depth', depth))
+    # Skip the frame header of y4m frames
+    hashes = [] if job.get('hashes') else None
+    times = [] if job.get('times') else None
+    offset = len('FRAME\n') if y4m else 0
+    output = Output(_FormatOutput(job))
+    try:
+        if y4m:
+            output.write(header)
+        for i, frame in enumerate(frames):
+            start = time.time()
+            buf = clip.RawFrame(frame, y4m_header=y4m)
+            if buf is None:
+                raise RenderError('Error requesting frame {0}'.format(frame))
+            if times is not None:
+                times.append(round((time.time() - start) * 1000, 1))
+            output.write(buf.raw)
+            if hashes is not None:
+                hashes.append(_FrameHash(buf, offset))
+            progress(i + 1)
+    finally:
+        output.close()
+    result = {'frames': len(frames)}
+    if hashes is not None:
+        result['hashes'] = hashes
+    if times is not None:
+        result['times'] = times
+    return result
+
+def _Hashes(clip, job, frames, progress):
+    '''Checksum of every frame, stopping at the first one not 'expect'ed'''
+    expect = job.get('expect')
+    hashes = []
+    for i, frame in enumerate(frames):
+        buf = clip.RawFrame(frame)
+        if buf is None:
+            raise RenderError('Error requesting frame {0}'.format(frame))
+        hashes.append(_FrameHash(buf))
+        progress(i + 1)
+        if expect is not None and (i >= len(expect) or hashes[-1] != expect[i]):
+            return {'hashes': hashes, 'changed': frame}
+    if expect is not None and len(expect) != len(frames):
+        return {'hashes': hashes, 'changed': frames[-1] + 1 if frames else 0}
+    return {'hashes': hashes, 'changed': None}
+
+def _Info(clip, job, frames, progress):
+    return dict((key, getattr(clip, key)) for key in (
+        'Width', 'Height', 'Framecount', 'FramerateNumerator', 'FramerateDenominator',
+        'Colorspace', 'BitsPerComponent', 'IsFieldBased', 'HasAudio', 'Audiorate',
+        'Audiochannels', 'Audiobits'))
+
+def _Stats(clip, job, frames, progress):
+    '''Per frame minimum, maximum and average of every plane'''
+    numpy = _worker['pyavs'].numpy
+    if numpy is None:
+        raise RenderError('NumPy is required for the stats action')
+    output = Output(_FormatOutput(job)) if job.get('output') else None
+    totals = None
+    try:
+        for i, frame in enumerate(frames):
+            planes = clip.GetPlanes(frame)
+            if planes is None:
+                raise RenderError('Error requesting frame {0}'.format(frame))
+            stats = [(float(plane.min()), float(plane.max()), float(plane.mean()))
+                     for plane in planes]
+            if output is not None:
+                output.write(json.dumps({'frame': frame, 'planes': stats}) + '\n')
+            if totals is None:
+                totals = [[s[0], s[1], 0.0] for s in stats]
+            for total, s in zip(totals, stats):
+                total[0] = min(total[0], s[0])
+                total[1] = max(total[1], s[1])
+                total[2] += s[2]
+            progress(i + 1)
+    finally:
+        if output is not None:
+            output.close()
+    if totals is None:
+        return {'planes': []}
+    return {'planes': [[t[0], t[1], t[2] / len(frames)] for t in totals]}
+
+def _Autocrop(clip, job, frames, progress):
+    '''Crop values that are safe for every sampled frame'''
+    if job.get('frames') is None and 'frame_list' not in job:
+        samples = max(1, job.get('samples', 10))
+        step = max(1, len(frames) // samples)
+        frames = frames[step // 2::step][:samples]
+    crop = None
+    for i, frame in enumerate(frames):
+        values = clip.AutocropFrame(frame, job.get('tolerance', 70))
+        if values is None:
+            raise RenderError('Error requesting frame {0}'.format(frame))
+        crop = values if crop is None else [min(a, b) for a, b in zip(crop, values)]
+        progress(i + 1)
+    return dict(zip(('left', 'top', 'right', 'bottom'), crop or (0, 0, 0, 0)))
+
+def WritePNG(filename, rgb):
+    '''Save a HxWx3 uint8 array as a PNG file'''
+    def chunk(tag, data):
+        return (struct.pack('>I', len(data)) + tag + data +
+                struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+    height, width = rgb.shape[:2]
+    # Filter type 0 (none) at the start of every row
+    rows = ''.join('\0' + row.tostring() for row in rgb)
+    with open(filename, 'wb') as f:
+        f.write('\x89PNG\r\n\x1a\n')
+        f.write(chunk('IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk('IDAT', zlib.compress(rows, 6)))
+        f.write(chunk('IEND', ''))
+
+def WritePPM(filename, rgb):
+    '''Save a HxWx3 uint8 array as a binary PPM file'''
+    with open(filename, 'wb') as f:
+        f.write('P6\n{0} {1}\n255\n'.format(rgb.shape[1], rgb.shape[0]))
+        f.write(rgb.tostring())
+
+def _Images(clip, job, frames, progress):
+    '''Save frames as PNG or binary PPM files'''
+    import pyavs_display
+    if pyavs_display.numpy is None:
+        raise RenderError('NumPy is required for the images action')
+    if not job.get('output'):
+        job = dict(job, output='{name}_{frame:06d}.ppm')
+    files = []
+    for i, frame in enumerate(frames):
+        planes = clip.GetPlanes(frame)
+        if planes is None:
+            raise RenderError('Error requesting frame {0}'.format(frame))
+        matrix = job.get('matrix', 'Rec709' if clip.Width > 1024 or clip.Height > 576 else 'Rec601')
+        rgb = pyavs_display.ToRGB(planes, clip.BitsPerComponent, clip.IsRGB, matrix,
+                                  job.get('interlaced', False))
+        filename = _FormatOutput(job, frame=frame)
+        if filename.lower().endswith('.png'):
+            WritePNG(filename, rgb)
+        else:
+            WritePPM(filename, rgb)
+        files.append(filename)
+        progress(i + 1)
+    return {'files': files}
+
+def _GetVar(clip, name):
+    '''Value of a script variable, None if not defined'''
+    try:
+        return clip.env.get_var(name)
+    except _worker['pyavs'].avisynth.AvisynthError as err:
+        if str(err) != 'NotFound':
+            raise
+
+def _Vars(clip, job, frames, progress):
+    '''Values of the script variables listed in 'vars' (None if not defined)'''
+    values = {}
+    for name in job.get('vars', ()):
+        value = _GetVar(clip, name)
+        if not (value is None or isinstance(value, (bool, int, long, float, basestring))):
+            value = unicode(value)
+        values[name] = value
+    return values
+
+def _Timestamps(clip, job, frames, progress):
+    '''Presentation time of every frame in milliseconds, set by FFMS2 source filters'''
+    name = (_GetVar(clip, 'FFSARFFVAR_PREFIX') or '') + 'FFVFR_TIME'
+    output = Output(_FormatOutput(job)) if job.get('output') else None
+    times = []
+    try:
+        if output is not None:
+            output.write('# timecode format v2\n')
+        for i, frame in enumerate(frames):
+            clip.clip.get_frame(frame)
+            if clip.clip.get_error():
+                raise RenderError('Error requesting frame {0}'.format(frame))
+            value = _GetVar(clip, name)
+            if value is None:
+                raise RenderError('The clip has no FFMS2 frame times')
+            times.append(float(value))
+            if output is not None:
+                output.write('%.6f\n' % value)
+            progress(i + 1)
+    finally:
+        if output is not None:
+            output.close()
+    return {'times': times}
+
+def _RunJob(args):
+    '''Run a job in a worker process.  Return (job index, result or None)'''
+    index, job = args
+    job = dict(job, index=index)
+    clip = None
+    start = time.time()
+    # Internal, lets the main process find the jobs of a worker that died
+    _Report('assign', index, pid=os.getpid())
+    try:
+        if 'error' in _worker:
+            raise RenderError(_worker['error'])
+        if job.get('action') not in ACTIONS:
+            raise RenderError('Unknown action: {0}'.format(job.get('action')))
+        clip = _LoadClip(job)
+        frames = _FrameRange(job, clip)
+        _Report('start', index, script=job.get('script'), frames=len(frames))
+        progress = _Progress(index, len(frames))
+        action = job['action']
+        if action in ('y4m', 'raw'):
+            result = _RenderFrames(clip, job, frames, progress, action == 'y4m')
+        else:
+            result = {'info': _Info, 'stats': _Stats, 'autocrop': _Autocrop,
+                      'images': _Images, 'vars': _Vars,
+                      'timestamps': _Timestamps, 'hashes': _Hashes}[action](
+                          clip, job, frames, progress)
+    except Exception as err:
+        _Report('error', index, message=unicode(err))
+        return index, None
+    finally:
+        clip = None
+    _Report('done', index, elapsed=round(time.time() - start, 3), result=result)
+    return index, result
+
+def RenderEvents(jobs, processes=None, library_dir='', options=None):
+    '''Run a list of jobs (dicts, see the manifest format above) in a process pool
+
+    Generator yielding the progress events (dicts) as they arrive, the last
+    one being 'finished'.  Closing the generator terminates the pool.  The
+    jobs of a worker process that dies (e.g. a crashing plugin) are reported
+    as errors, the pool replaces the worker for the remaining jobs.
+    '''
+    start = time.time()
+    finished = errors = 0
+    if jobs:
+        queue = multiprocessing.Queue()
+        pool = multiprocessing.Pool(min(processes or multiprocessing.cpu_count(), len(jobs)),
+                                    _InitWorker, (library_dir, options or {}, queue))
+        try:
+            pending = pool.map_async(_RunJob, list(enumerate(jobs)), chunksize=1)
+            # The events of the last jobs may arrive after 'pending' is ready
+            deadline = None
+            workers = {} # pid -> Process, including the ones already replaced
+            running = {} # job -> pid of its worker
+            while finished < len(jobs):
+                try:
+                    event = queue.get(timeout=0.1)
+                except Queue.Empty:
+                    if deadline is None and pending.ready():
+                        deadline = time.time() + 2
+                    elif deadline is not None and time.time() > deadline:
+                        break
+                    # The queue is empty, so a dead worker has no event left
+                    for process in pool._pool:
+                        workers.setdefault(process.pid, process)
+                    alive = set(process.pid for process in pool._pool if process.exitcode is None)
+                    for job, pid in running.items():
+                        if pid not in alive:
+                            del running[job]
+                            finished += 1
+                            errors += 1
+                            process = workers.get(pid)
+                            yield {'event': 'error', 'job': job, 'message':
+                                   'The worker process ended unexpectedly (exit code {0})'.format(
+                                   process.exitcode if process is not None else None)}
+                    continue
+                if event['event'] == 'assign':
+                    running[event['job']] = event['pid']
+                    for process in pool._pool:
+                        workers.setdefault(process.pid, process)
+                    continue
+                if event['event'] in ('done', 'error'):
+                    running.pop(event['job'], None)
+                    finished += 1
+                    errors += event['event'] == 'error'
+                yield event
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+    yield {'event': 'finished', 'jobs': len(jobs), 'errors': errors + len(jobs) - finished,
+           'elapsed': round(time.time() - start, 3)}
+
+def Render(jobs, processes=None, library_dir='', options=None, emit=None):
+    '''Run a list of jobs in a process pool, see RenderEvents
+
+    'emit' is called with every progress event.  Return the list of job
+    results, None for the jobs that failed.
+    '''
+    results = [None] * len(jobs)
+    for event in RenderEvents(jobs, processes, library_dir, options):
+        if event['event'] == 'done':
+            results[event['job']] = event['result']
+        if emit is not None:
+            emit(event)
+    return results
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage='%prog [options] manifest.json',
+        description='Render AviSynth scripts without the GUI, see the manifest '
+                    'format at the top of render.py')
+    parser.add_option('-j', '--processes', type='int',
+                      help='number of worker processes (default: from the manifest or CPUs)')
+    parser.add_option('--avisynth-dir', dest='avisynth_dir',
+                      help='directory of the AviSynth library')
+    options, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error('a single manifest is required')
+    if args[0] == '-':
+        manifest = json.load(sys.stdin)
+    else:
+        with open(args[0], 'rb') as f:
+            manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {'jobs': manifest}
+    def emit(event):
+        sys.stdout.write(json.dumps(event) + '\n')
+        sys.stdout.flush()
+    results = Render(manifest.get('jobs', []),
+                     options.processes or manifest.get('processes'),
+                     options.avisynth_dir or manifest.get('avisynth_dir', ''),
+                     manifest.get('options'), emit)
+    return 1 if None in results else 0
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -45,5 +45,10 @@ import os, sys
 if hasattr(sys,'frozen'):
     sys.path.insert(0, os.path.dirname(sys.executable))
     
+import multiprocessing
 import avsp
-avsp.main()
+
+if __name__ == '__main__':
+    # Required for the process pools used by AvsP (e.g. comparing tabs)
+    multiprocessing.freeze_support()
+    avsp.main()
@@ -0,0 +1,168 @@
+# AvsP - an AviSynth editor
+#
+# Copyright 2007 Peter Jang <http://www.avisynth.org/qwerpoi>
+#           2010-2017 the AvsPmod authors <https://github.com/avspmod/avspmod>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA, or visit
+#  http://www.gnu.org/copyleft/gpl.html .
+
+# scopes - histogram, waveform monitor and vectorscope of a video frame
+#
+# The scopes are computed from the source planes returned by
+# pyavs.AvsClipBase.GetPlanes, at the native bit depth of the clip, so
+# no Histogram() call or display conversion is needed.  The results are
+# HxWx3 uint8 arrays (RGB) ready to be turned into a bitmap.
+#
+# Dependencies:
+#     NumPy (optional, the scopes are not available without it)
+
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+SCOPES = ('histogram', 'waveform', 'vectorscope')
+
+# Trace colors for each plane
+YUV_COLORS = ((255, 255, 255), (80, 160, 255), (255, 96, 96))
+RGB_COLORS = ((255, 64, 64), (64, 255, 64), (64, 128, 255))
+GRATICULE_COLOR = (96, 96, 96)
+WAVEFORM_COLOR = (96, 255, 128)
+
+def Quantize(plane, bits, n, chroma=False):
+    '''Map the samples of a plane to integer bins [0, n)
+
+    Integer samples are scaled from their native bit depth, float samples
+    (bits == 32) are expected in [0, 1] or [-0.5, 0.5] for chroma.
+    '''
+    if bits == 32:
+        if chroma:
+            plane = plane + 0.5
+        return numpy.clip(plane * n, 0, n - 1).astype(numpy.intp)
+    return (plane.astype(numpy.intp) * n) >> bits
+
+def RGBToYUV(r, g, b, bits, matrix='Rec601'):
+    '''Return float Y, U, V planes ([0, 1] and [-0.5, 0.5]) from RGB planes'''
+    if '709' in matrix:
+        kr, kb = 0.2126, 0.0722
+    elif '2020' in matrix:
+        kr, kb = 0.2627, 0.0593
+    else:
+        kr, kb = 0.299, 0.114
+    scale = 1.0 if bits == 32 else 1.0 / ((1 << bits) - 1)
+    r = r.astype(numpy.float32) * scale
+    g = g.astype(numpy.float32) * scale
+    b = b.astype(numpy.float32) * scale
+    y = kr * r + (1 - kr - kb) * g + kb * b
+    u = (b - y) / (2 * (1 - kb))
+    v = (r - y) / (2 * (1 - kr))
+    return y, u, v
+
+def Intensity(counts):
+    '''Scale a bin count array logarithmically to [0, 1]'''
+    counts = numpy.log1p(counts.astype(numpy.float32))
+    peak = counts.max()
+    if peak > 0:
+        counts /= peak
+    return counts
+
+def Histogram(planes, bits, colors, width=256, height=64, chroma_planes=()):
+    '''Draw one histogram band per plane, stacked vertically'''
+    image = numpy.zeros((height * len(planes), width, 3), numpy.uint8)
+    rows = numpy.arange(height - 1, -1, -1)[:, numpy.newaxis]
+    for i, plane in enumerate(planes):
+        bins = Quantize(plane, bits, width, i in chroma_planes)
+        counts = numpy.bincount(bins.ravel(), minlength=width)[:width]
+        peak = counts.max()
+        if not peak:
+            continue
+        heights = counts * (height - 1.0) / peak
+        band = image[i * height:(i + 1) * height]
+        band[rows < heights[numpy.newaxis, :]] = colors[i]
+        band[-1] = GRATICULE_COLOR
+    return image
+
+def Waveform(luma, bits, width=256, height=256, limited=True):
+    '''Draw a luma waveform monitor: one column per group of source columns'''
+    src_height, src_width = luma.shape
+    width = min(width, src_width)
+    columns = (numpy.arange(src_width) * width // src_width)[numpy.newaxis, :]
+    rows = height - 1 - Quantize(luma, bits, height)
+    counts = numpy.bincount((rows * width + columns).ravel(),
+                            minlength=width * height)[:width * height]
+    level = Intensity(counts.reshape(height, width))[..., numpy.newaxis]
+    image = (level * WAVEFORM_COLOR).astype(numpy.uint8)
+    if limited:
+        # Legal range lines (16 and 235 at 8-bit)
+        for value in (16, 235):
+            row = height - 1 - int(value / 256.0 * height)
+            image[row][image[row].max(axis=1) == 0] = GRATICULE_COLOR
+    return image
+
+def Vectorscope(u, v, bits, size=256):
+    '''Draw a vectorscope: U on the horizontal axis, V on the vertical one'''
+    columns = Quantize(u, bits, size, True)
+    rows = size - 1 - Quantize(v, bits, size, True)
+    counts = numpy.bincount((rows * size + columns).ravel(),
+                            minlength=size * size)[:size * size]
+    level = Intensity(counts.reshape(size, size))[..., numpy.newaxis]
+    image = (level * 255).astype(numpy.uint8).repeat(3, axis=2)
+    # Graticule: axes and the 75% saturation circle
+    center = size // 2
+    mask = image.max(axis=2) == 0
+    graticule = numpy.zeros((size, size), bool)
+    graticule[center, :] = graticule[:, center] = True
+    angles = numpy.linspace(0, 2 * math.pi, 8 * size)
+    radius = 0.75 * 112 / 256.0 * size
+    graticule[(center - radius * numpy.sin(angles)).astype(numpy.intp),
+              (center + radius * numpy.cos(angles)).astype(numpy.intp)] = True
+    image[graticule & mask] = GRATICULE_COLOR
+    return image
+
+def ComputeScopes(planes, bits, is_rgb=False, matrix='Rec601', scopes=SCOPES,
+                  size=256):
+    '''Return a dict {scope name: HxWx3 uint8 array} for the given planes
+
+    'planes' is the list returned by pyavs.AvsClipBase.GetPlanes: [Y, U, V],
+    [Y] or [R, G, B].  Only the scopes listed in 'scopes' are computed.
+    '''
+    images = {}
+    if is_rgb:
+        colors = RGB_COLORS
+        chroma_planes = ()
+    else:
+        colors = YUV_COLORS
+        chroma_planes = (1, 2)
+    if 'histogram' in scopes:
+        images['histogram'] = Histogram(planes, bits, colors, size,
+                                        chroma_planes=chroma_planes)
+    if 'waveform' in scopes or 'vectorscope' in scopes:
+        if is_rgb:
+            y, u, v = RGBToYUV(planes[0], planes[1], planes[2], bits, matrix)
+            yuv_bits = 32
+        else:
+            y, u, v = (planes + [None, None])[:3]
+            yuv_bits = bits
+        if 'waveform' in scopes:
+            images['waveform'] = Waveform(y, yuv_bits, size, size,
+                                          limited=not matrix.startswith('PC'))
+        if 'vectorscope' in scopes:
+            if u is None:
+                images['vectorscope'] = numpy.zeros((size, size, 3), numpy.uint8)
+            else:
+                images['vectorscope'] = Vectorscope(u, v, yuv_bits, size)
+    return images
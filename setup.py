@@ -177,6 +177,18 @@ data_files = [
                 'avisynth_cffi.py',
                 'pyavs.py',
                 'pyavs_avifile.py',
+                'pyavs_display.py',
+                'render.py',
+                'scopes.py',
+                'metrics.py',
+                'splice.py',
+                'sweep.py',
+                'timecodes.py',
+                'farm.py',
+                'remote.py',
+                'frameserver.py',
+                'framecache.py',
+                'probes.py',
                 'build.py',
                 'setup.py',
                 'i18n.py',
@@ -0,0 +1,118 @@
+# AvsP - an AviSynth editor
+#
+# Copyright 2007 Peter Jang <http://www.avisynth.org/qwerpoi>
+#           2010-2017 the AvsPmod authors <https://github.com/avspmod/avspmod>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA, or visit
+#  http://www.gnu.org/copyleft/gpl.html .
+
+# splice - AviSynth splice expressions for lists of frame ranges
+#
+# 'a ++ b ++ c ++ ...' is evaluated left to right, so joining N trims nests
+# the splices N levels deep and every frame request walks the whole chain.
+# Splice groups the clips in a balanced tree instead, e.g.
+#     (Trim(0, 9) ++ Trim(20, 29)) ++ (Trim(40, 49) ++ Trim(60, 69))
+# which is log2(N) levels deep.  Short lists are still joined linearly.
+#
+# Running this file compares the per-frame access time of linear and
+# balanced splices for an increasing number of ranges:
+#     python splice.py [--ranges 10,100,1000] [--avisynth-dir DIR]
+#
+# Scripts:
+#     pyavs.py (only for the benchmark)
+
+import sys
+import time
+import random
+import optparse
+
+import global_vars
+
+# Maximum number of clips joined linearly at the leaves of the tree
+LINEAR_MAX = 4
+
+def Trim(start, end):
+    '''Trim call for an inclusive frame range'''
+    # Trim(0, 0) means the whole clip, 'end' is only available in AviSynth v2.6+
+    if (start, end) == (0, 0):
+        return 'Trim(0, -1)'
+    return 'Trim(%i, %i)' % (start, end)
+
+def Splice(clips, operator=' ++ ', linear_max=LINEAR_MAX):
+    '''Join a list of clip expressions in a balanced tree of splices'''
+    if len(clips) <= linear_max:
+        return operator.join(clips)
+    def join(clips):
+        if len(clips) == 1:
+            return clips[0]
+        if len(clips) <= linear_max:
+            return '(' + operator.join(clips) + ')'
+        middle = len(clips) // 2
+        return '(' + join(clips[:middle]) + operator + join(clips[middle:]) + ')'
+    middle = len(clips) // 2
+    return join(clips[:middle]) + operator + join(clips[middle:])
+
+def SpliceRanges(ranges, operator=' ++ ', linear_max=LINEAR_MAX):
+    '''Splice expression for a list of (start, end) frame ranges'''
+    return Splice([Trim(start, end) for start, end in ranges], operator, linear_max)
+
+def Depth(count, linear_max=LINEAR_MAX):
+    '''Number of nested splices in Splice for 'count' clips'''
+    if count <= linear_max:
+        return max(count - 1, 0)
+    middle = count // 2
+    return 1 + max(Depth(middle, linear_max), Depth(count - middle, linear_max))
+
+def Benchmark(counts, samples=2000, library_dir=''):
+    '''Yield (ranges, linear time, balanced time) per frame, in microseconds'''
+    global_vars.avisynth_library_dir = library_dir
+    import pyavs
+    for count in counts:
+        # Ranges of 10 frames, separated by gaps of 5 frames
+        ranges = [(i * 15, i * 15 + 9) for i in range(count)]
+        source = 'BlankClip(length=%i, width=64, height=64, pixel_type="YV12")\n' % (count * 15)
+        times = []
+        for linear_max in (count, LINEAR_MAX):
+            clip = pyavs.AvsClip(source + SpliceRanges(ranges, linear_max=linear_max),
+                                 display_clip=False)
+            if not clip.initialized or clip.IsErrorClip():
+                raise Exception(clip.error_message or 'Error evaluating the splice')
+            frames = [random.randrange(clip.Framecount) for i in xrange(samples)]
+            start = time.time()
+            for frame in frames:
+                clip.clip.get_frame(frame)
+            times.append((time.time() - start) / samples * 1e6)
+            clip = None
+        yield count, times[0], times[1]
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage='%prog [options]',
+        description='Compare the per-frame access time of linear and balanced '
+                    'Trim splices')
+    parser.add_option('--ranges', default='10,50,100,250,500,1000',
+                      help='comma-separated numbers of ranges (default: %default)')
+    parser.add_option('--samples', type='int', default=2000,
+                      help='random frame requests per splice (default: %default)')
+    parser.add_option('--avisynth-dir', dest='avisynth_dir', default='',
+                      help='directory of the AviSynth library')
+    options, args = parser.parse_args(argv)
+    counts = [int(count) for count in options.ranges.split(',')]
+    print '%8s %8s %12s %14s' % ('ranges', 'depth', 'linear (us)', 'balanced (us)')
+    for count, linear, balanced in Benchmark(counts, options.samples, options.avisynth_dir):
+        print '%8i %8i %12.1f %14.1f' % (count, Depth(count), linear, balanced)
+        sys.stdout.flush()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+# AvsP - an AviSynth editor
+#
+# Copyright 2007 Peter Jang <http://www.avisynth.org/qwerpoi>
+#           2010-2017 the AvsPmod authors <https://github.com/avspmod/avspmod>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA, or visit
+#  http://www.gnu.org/copyleft/gpl.html .
+
+# sweep - parallel parameter sweeps over the user sliders of a script
+#
+# Candidate values for the sliders are generated on a grid, at random or by
+# a genetic algorithm, substituted in the script and scored in a process
+# pool.  The score of a candidate is a runtime expression (e.g. a metric
+# against a reference clip) averaged over some frames.  Scores are saved to
+# a file as soon as they are known, keyed by a hash of the normalized
+# script text, so an interrupted sweep resumes where it stopped and
+# candidates already seen in previous sweeps are not evaluated again.
+#
+# Dependencies:
+#     Python (tested on v2.7)
+# Scripts:
+#     pyavs.py (only imported by the worker processes)
+
+import os
+import json
+import random
+import hashlib
+import itertools
+import multiprocessing
+
+import global_vars
+
+MODES = ('grid', 'random', 'genetic')
+
+class SweepError(Exception):
+    pass
+
+def NormalizeScript(text):
+    '''Return the script text without comment lines, blank lines and trailing spaces'''
+    lines = []
+    for line in text.replace('\r\n', '\n').replace('\r', '\n').split('\n'):
+        line = line.rstrip()
+        if line and not line.lstrip().startswith('#'):
+            lines.append(line)
+    return u'\n'.join(lines)
+
+def ScriptKey(text, metric, metric_script='', frames=None):
+    '''Cache key of a candidate script scored by a given metric'''
+    data = u'\0'.join((NormalizeScript(text), metric.strip(),
+                       NormalizeScript(metric_script), repr(frames)))
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+class ScoreCache(object):
+    '''Scores of evaluated scripts, appended to a file as JSON lines
+
+    Without a file name the scores are only kept in memory.
+    '''
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.scores = {}
+        self.newline = False
+        if filename and os.path.isfile(filename):
+            with open(filename, 'rb') as f:
+                data = f.read()
+            for line in data.splitlines():
+                try:
+                    key, score = json.loads(line)
+                except (ValueError, TypeError): # truncated by an interruption
+                    continue
+                self.scores[key] = score
+            self.newline = bool(data) and not data.endswith('\n')
+
+    def __contains__(self, key):
+        return key in self.scores
+
+    def __getitem__(self, key):
+        return self.scores[key]
+
+    def __len__(self):
+        return len(self.scores)
+
+    def Add(self, key, score):
+        self.scores[key] = score
+        if self.filename:
+            with open(self.filename, 'ab') as f:
+                if self.newline:
+                    f.write('\n')
+                    self.newline = False
+                f.write(json.dumps([key, score]) + '\n')
+
+def Substitute(template, params, candidate):
+    '''Replace the slider text of each parameter by the chosen value
+
+    'params' is a list of (text, label, values, decimals) as returned by
+    AvsP's GetSliderInfo, and 'candidate' a tuple of indices in 'values'.
+    '''
+    for (text, label, values, decimals), index in zip(params, candidate):
+        template = template.replace(text, u'%.*f' % (decimals, values[index]))
+    return template
+
+def Values(params, candidate):
+    '''Return a dict {label: value} for a candidate'''
+    return dict((label, values[index]) for (text, label, values, decimals), index
+                in zip(params, candidate))
+
+def GridCandidates(sizes, steps=None):
+    '''Every combination of value indices, at most 'steps' values per parameter'''
+    axes = []
+    for size in sizes:
+        if steps and size > steps:
+            steps = max(steps, 2)
+            axes.append(sorted(set(int(round(i * (size - 1) / float(steps - 1)))
+                                   for i in range(steps))))
+        else:
+            axes.append(range(size))
+    return itertools.product(*axes)
+
+def RandomCandidates(sizes, count, rng=random):
+    ''''count' different random combinations of value indices'''
+    total = reduce(lambda x, y: x * y, sizes, 1)
+    if count >= total:
+        return list(GridCandidates(sizes))
+    candidates = set()
+    while len(candidates) < count:
+        candidates.add(tuple(rng.randrange(size) for size in sizes))
+    return list(candidates)
+
+class GeneticSearch(object):
+    '''Genetic algorithm over value indices
+
+    Tournament selection, uniform crossover, mutation to a random value of
+    the parameter and elitism (the best candidate always survives).
+    Candidates that failed to evaluate (score None) rank last.
+    '''
+
+    def __init__(self, sizes, population=30, crossover=0.6, mutation=0.05,
+                 selection=4, minimize=False, rng=random):
+        self.sizes = sizes
+        self.population = max(population, 2)
+        self.crossover = crossover
+        self.mutation = mutation
+        self.selection = selection
+        self.minimize = minimize
+        self.rng = rng
+
+    def SortKey(self, score):
+        if score is None:
+            return (True, 0)
+        return (False, score if self.minimize else -score)
+
+    def First(self):
+        return RandomCandidates(self.sizes, self.population, self.rng)
+
+    def Next(self, scored):
+        '''Return the next generation from a list of (candidate, score)'''
+        ranked = [candidate for candidate, score in
+                  sorted(scored, key=lambda item: self.SortKey(item[1]))]
+        children = [ranked[0]]
+        while len(children) < self.population:
+            # Tournament: the best ranked of 'selection' random candidates
+            a = ranked[min(self.rng.randrange(len(ranked)) for i in xrange(self.selection))]
+            b = ranked[min(self.rng.randrange(len(ranked)) for i in xrange(self.selection))]
+            if self.rng.random() < self.crossover:
+                a = tuple(x if self.rng.random() < 0.5 else y for x, y in zip(a, b))
+            children.append(tuple(self.rng.randrange(size) if self.rng.random() < self.mutation
+                                  else gene for gene, size in zip(a, self.sizes)))
+        return children
+
+# Process pool workers
+_worker = {}
+
+def _InitWorker(library_dir, options, job):
+    '''Create the AviSynth environment shared by the evaluations of this worker'''
+    global_vars.avisynth_library_dir = library_dir
+    global_vars.options.update(options)
+    _worker.update(job)
+    # Errors are reported by every evaluation, an exception here would hang the pool
+    try:
+        import pyavs
+        _worker['pyavs'] = pyavs
+        _worker['env'] = pyavs.avisynth.AVS_ScriptEnvironment(3)
+    except Exception as err:
+        _worker['error'] = u'Error loading AviSynth: {0}'.format(err)
+
+def _Evaluate(args):
+    '''Score a candidate script in a worker process.  Return (key, score, error)'''
+    key, text = args
+    clip = None
+    try:
+        if 'error' in _worker:
+            raise SweepError(_worker['error'])
+        env = _worker['env']
+        # The metric script goes first, so the result of the script is the
+        # candidate even if the metric script ends with an assignment
+        if _worker['metric_script']:
+            text = _worker['metric_script'] + u'\n' + text
+        clip = _worker['pyavs'].AvsClip(text, _worker['filename'], workdir=_worker['workdir'],
+                                        env=env, display_clip=False)
+        if not clip.initialized or clip.IsErrorClip():
+            raise SweepError(clip.error_message or 'Error loading the script')
+        # 'last' of the runtime metric is the candidate
+        env.set_var('last', clip.clip)
+        frames = _worker['frames']
+        if frames is None:
+            frames = range(clip.Framecount)
+        else:
+            frames = [n for n in frames if 0 <= n < clip.Framecount]
+        if not frames:
+            raise SweepError('No frames to evaluate')
+        # Runtime functions read the frame number from 'current_frame'
+        total = 0.0
+        for n in frames:
+            env.set_var('current_frame', n)
+            total += float(env.invoke('Eval', [_worker['metric']]))
+        return key, total / len(frames), None
+    except Exception as err:
+        return key, None, unicode(err)
+    finally:
+        clip = None
+
+class _Evaluator(object):
+    '''Process pool scoring candidate scripts, created on first use'''
+
+    def __init__(self, processes, library_dir, options, job):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.args = (library_dir, options or {}, job)
+        self.pool = None
+
+    def Run(self, items):
+        '''Yield (key, score, error) for a list of (key, text), in completion order'''
+        if not items:
+            return
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.processes, _InitWorker, self.args)
+        for result in self.pool.imap_unordered(_Evaluate, items):
+            yield result
+
+    def Close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+def Sweep(template, params, metric, mode='grid', minimize=False, metric_script='',
+          frames=None, count=100, generations=10, steps=None, processes=None,
+          cache=None, callback=None, filename='', workdir='', library_dir='',
+          options=None, **settings):
+    '''Search the parameter values that give the best score
+
+    template: script text containing the slider texts of 'params'.
+    params: list of (text, label, values, decimals), see Substitute.
+    metric: AviSynth runtime expression evaluated after the script for each
+            frame in 'frames' (None: every frame) and averaged.
+    metric_script: AviSynth code evaluated before each candidate, e.g. to load
+                   a reference clip for the metric.
+    mode: 'grid' (every combination, 'steps' values per parameter at most),
+          'random' ('count' random combinations) or 'genetic' ('generations'
+          generations of 'count' candidates).  Additional GeneticSearch
+          settings can be given as keyword arguments.
+    cache: ScoreCache or file name of one.
+    callback: called after each candidate with (done, total, values, score,
+              error).  Return False to stop the sweep.
+
+    Return the list of (score, candidate) evaluated in this sweep, best first.
+    '''
+    if mode not in MODES:
+        raise SweepError('Unknown mode: {0}'.format(mode))
+    if frames is not None:
+        frames = list(frames)
+    if not isinstance(cache, ScoreCache):
+        cache = ScoreCache(cache)
+    sizes = [len(values) for text, label, values, decimals in params]
+    search = GeneticSearch(sizes, count, minimize=minimize, **settings)
+    if mode == 'grid':
+        batch = list(GridCandidates(sizes, steps))
+        total = len(batch)
+    elif mode == 'random':
+        batch = RandomCandidates(sizes, count)
+        total = len(batch)
+    else:
+        batch = search.First()
+        total = len(batch) * generations
+    job = dict(metric=metric, metric_script=metric_script, frames=frames,
+               filename=filename, workdir=workdir)
+    evaluator = _Evaluator(processes, library_dir, options, job)
+    scores = {}
+    done = [0]
+
+    def report(candidate, score, error=None):
+        done[0] += 1
+        if callback is not None:
+            return callback(done[0], total, Values(params, candidate), score, error) is not False
+        return True
+
+    def evaluate(batch):
+        '''Score a list of candidates, return False if stopped'''
+        pending = {}
+        for candidate in batch:
+            if candidate in scores:
+                if not report(candidate, scores[candidate]):
+                    return False
+                continue
+            text = Substitute(template, params, candidate)
+            key = ScriptKey(text, metric, metric_script, frames)
+            if key in cache:
+                scores[candidate] = cache[key]
+                if not report(candidate, scores[candidate]):
+                    return False
+            else:
+                pending.setdefault(key, (text, []))[1].append(candidate)
+        items = [(key, text) for key, (text, candidates) in pending.iteritems()]
+        for key, score, error in evaluator.Run(items):
+            # Failed scripts are not cached, the error may be transient
+            if error is None:
+                cache.Add(key, score)
+            for candidate in pending[key][1]:
+                scores[candidate] = score
+                if not report(candidate, score, error):
+                    return False
+        return True
+
+    try:
+        generation = 1
+        while evaluate(batch) and mode == 'genetic' and generation < generations:
+            batch = search.Next([(candidate, scores[candidate]) for candidate in batch])
+            generation += 1
+    finally:
+        evaluator.Close()
+    return sorted(((score, candidate) for candidate, score in scores.iteritems()
+                   if score is not None), key=lambda item: search.SortKey(item[0]))
@@ -0,0 +1,207 @@
+# AvsP - an AviSynth editor
+#
+# Copyright 2007 Peter Jang <http://www.avisynth.org/qwerpoi>
+#           2010-2017 the AvsPmod authors <https://github.com/avspmod/avspmod>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA, or visit
+#  http://www.gnu.org/copyleft/gpl.html .
+
+# timecodes - frame timestamps of variable frame rate clips
+#
+# TimestampIndex maps frame numbers to presentation times and back with a
+# binary search.  Runs of frames with the same duration are stored as one
+# segment in compact arrays, so a constant frame rate clip or a timecode v1
+# file takes a few segments and a v2 file at most one segment per frame.
+# The index can be read from timecode format v1, v2 and v4 files or built
+# from a list of frame times, e.g. the FFVFR_TIME values of FFMS2.
+#
+# Dependencies:
+#     Python (tested on v2.7)
+
+import re
+import math
+import bisect
+from array import array
+
+# Maximum difference between the real and the interpolated time of a frame
+# in a segment, in milliseconds.  Times rounded to whole milliseconds (e.g.
+# FFVFR_TIME) differ from the ideal ones by up to half a millisecond on each
+# side, so they're allowed a whole millisecond
+TOLERANCE = 0.01
+ROUNDED_TOLERANCE = 1.0
+
+class TimecodeError(Exception):
+    pass
+
+class TimestampIndex(object):
+    '''Presentation time of each frame, in milliseconds
+
+    Frames after the last one known continue the last segment.  TimeFrame
+    requires the times to be increasing.
+    '''
+
+    def __init__(self, framecount=None, filename=''):
+        self.framecount = framecount
+        self.filename = filename
+        self.frames = array('l')
+        self.times = array('d')
+        self.durations = array('d')
+
+    def __len__(self):
+        '''Number of segments'''
+        return len(self.frames)
+
+    def AddSegment(self, frame, time, duration):
+        '''Add the frames from 'frame' on, extending the last segment if possible'''
+        if self.frames:
+            last = len(self.frames) - 1
+            if frame <= self.frames[last]:
+                raise TimecodeError('Segments must be added in frame order')
+            if (abs(self.durations[last] - duration) < 1e-9 and
+                    abs(self.FrameTime(frame) - time) < 1e-6):
+                return
+        self.frames.append(frame)
+        self.times.append(time)
+        self.durations.append(duration)
+
+    @classmethod
+    def FromRate(cls, fps, framecount=None):
+        index = cls(framecount)
+        index.AddSegment(0, 0.0, 1000.0 / fps)
+        return index
+
+    @classmethod
+    def FromTimes(cls, times, framecount=None, filename='', tolerance=None):
+        '''Build an index from the time of every frame
+
+        'tolerance' defaults to ROUNDED_TOLERANCE if all the times are whole
+        milliseconds, TOLERANCE otherwise.
+        '''
+        if not times:
+            raise TimecodeError('No frame times')
+        if tolerance is None:
+            if all(float(time).is_integer() for time in times):
+                tolerance = ROUNDED_TOLERANCE
+            else:
+                tolerance = TOLERANCE
+        index = cls(len(times) if framecount is None else framecount, filename)
+        if len(times) == 1:
+            index.AddSegment(0, float(times[0]), 1000.0 / 25)
+            return index
+        start = 0
+        duration = float(times[1] - times[0])
+        for i in xrange(2, len(times)):
+            # Refit the duration of the segment while all its frames stay close
+            fitted = float(times[i] - times[start]) / (i - start)
+            if abs(times[start] + (i - start) * duration - times[i]) > tolerance:
+                index._AddRun(start, times[start], duration)
+                start = i - 1
+                fitted = float(times[i] - times[start])
+            duration = fitted
+        index._AddRun(start, times[start], duration)
+        return index
+
+    def _AddRun(self, frame, time, duration):
+        if self.frames and self.frames[-1] == frame:
+            return
+        self.AddSegment(frame, float(time), duration)
+
+    @classmethod
+    def FromV1(cls, text, framecount=None, filename=''):
+        '''Parse a timecode format v1 file (assumed rate and frame ranges)'''
+        match = re.search(r'^\s*assume\s+([\d.]+)', text, re.M | re.I)
+        if not match:
+            raise TimecodeError('Missing "Assume" line')
+        default = 1000.0 / float(match.group(1))
+        ranges = []
+        for line in text.splitlines():
+            line = line.strip()
+            if line and line[0].isdigit():
+                try:
+                    start, end, fps = line.split(',')
+                    ranges.append((int(start), int(end), 1000.0 / float(fps)))
+                except ValueError:
+                    raise TimecodeError('Invalid line: ' + line)
+        index = cls(framecount, filename)
+        frame = 0
+        time = 0.0
+        for start, end, duration in sorted(ranges):
+            if start < frame or end < start:
+                raise TimecodeError('Overlapping ranges: {0},{1}'.format(start, end))
+            if start > frame:
+                index.AddSegment(frame, time, default)
+                time += (start - frame) * default
+            index.AddSegment(start, time, duration)
+            time += (end - start + 1) * duration
+            frame = end + 1
+        index.AddSegment(frame, time, default)
+        return index
+
+    @classmethod
+    def FromV2(cls, text, framecount=None, filename=''):
+        '''Parse a timecode format v2 or v4 file (one time per frame)'''
+        times = []
+        for line in text.splitlines():
+            line = line.strip()
+            if line and not line.startswith('#'):
+                try:
+                    times.append(float(line))
+                except ValueError:
+                    raise TimecodeError('Invalid line: ' + line)
+        # The times of a file are taken as exact
+        return cls.FromTimes(times, framecount, filename, TOLERANCE)
+
+    @classmethod
+    def FromFile(cls, filename, framecount=None):
+        with open(filename, 'rU') as f:
+            text = f.read()
+        header = text.lstrip().split('\n', 1)[0].lower()
+        if 'timecode format v1' in header:
+            return cls.FromV1(text, framecount, filename)
+        if 'timecode format v2' in header or 'timecode format v4' in header:
+            return cls.FromV2(text, framecount, filename)
+        raise TimecodeError('Unknown timecode format: ' + header)
+
+    def _Segment(self, frame):
+        return max(0, bisect.bisect_right(self.frames, frame) - 1)
+
+    def FrameTime(self, frame):
+        '''Presentation time of a frame in milliseconds'''
+        frame = max(0, frame)
+        i = self._Segment(frame)
+        return self.times[i] + (frame - self.frames[i]) * self.durations[i]
+
+    def FrameDuration(self, frame):
+        return self.durations[self._Segment(max(0, frame))]
+
+    def TimeFrame(self, time):
+        '''Frame shown at a time in milliseconds'''
+        i = max(0, bisect.bisect_right(self.times, time) - 1)
+        frame = self.frames[i] + max(0, int(math.floor(
+                (time - self.times[i]) / self.durations[i] + 1e-6)))
+        if i + 1 < len(self.frames):
+            frame = min(frame, self.frames[i + 1] - 1)
+        return frame
+
+    def Write(self, filename, framecount=None):
+        '''Save the index as a timecode format v2 file'''
+        if framecount is None:
+            framecount = self.framecount
+        if framecount is None:
+            raise TimecodeError('Unknown number of frames')
+        with open(filename, 'w') as f:
+            f.write('# timecode format v2\n')
+            for frame in xrange(framecount):
+                f.write('%.6f\n' % self.FrameTime(frame))
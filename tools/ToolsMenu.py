@@ -2,5 +2,6 @@ menuInfo = (
     ('resize_calc', _('Resize calculator...'), _('Calculate an appropriate resize for the video')),
     (''),
     ('encoder_gui', _('Script encoder (CLI)'), _('Use an external command line encoder to save the current script')),
+    ('encode_queue', _('Encode queue...'), _('Show the queue of encoding jobs of the script encoder')),
     ('avs2avi_gui', _('Script encoder (VFW)'), _('Use avs2avi to save the current script as an avi')),
 )
\ No newline at end of file
@@ -0,0 +1,307 @@
+import os
+import re
+import json
+import shutil
+import tempfile
+import subprocess
+
+import global_vars
+
+# Elementary stream extensions, whose chunks can be joined byte by byte
+RAW_EXTENSIONS = {'x264': '.264', 'x265': '.265'}
+RAW_OUTPUTS = ('.264', '.h264', '.265', '.hevc')
+# Frames searched for a scene change around each split point
+SCENE_WINDOW = 48
+# Saved next to the output by incremental encodes
+INDEX_SUFFIX = '.chunks.json'
+
+class ChunkError(Exception):
+    pass
+
+def EncoderName(command):
+    '''Return 'x264' or 'x265' if the command line runs one of them, else None'''
+    match = re.match(r'\s*"?([^"]*?)"?(?:\s|$)', command)
+    name = re.split(r'[\\/]', match.group(1))[-1].lower() if match else ''
+    for encoder in RAW_EXTENSIONS:
+        if name.startswith(encoder):
+            return encoder
+    return None
+
+def ChunkCommand(command, inputname, outputname, chunkname):
+    '''Adapt an encoder command line to read y4m from stdin and write a chunk
+
+    Zones are dropped, their frame numbers refer to the whole clip.
+    '''
+    encoder = EncoderName(command)
+    if encoder is None:
+        raise ChunkError(_('Chunked encoding requires a x264 or x265 command line'))
+    for name in (inputname, outputname):
+        if command.count(name) != 1:
+            raise ChunkError(_('The input and output must appear once in the command line'))
+    stdin = '--demuxer y4m -' if encoder == 'x264' else '--y4m -'
+    command = command.replace('"%s"' % inputname, stdin).replace(inputname, stdin)
+    command = command.replace(outputname, chunkname)
+    return re.sub(r'\s--zones\s+\S+', '', command)
+
+def SplitRange(framecount, count, boundaries=(), tolerance=None):
+    '''Split the frames in 'count' ranges of about the same length
+
+    Every split point moves to the nearest frame in 'boundaries' within
+    'tolerance' frames (default: a quarter of the chunk length).
+    Return a list of (first, last).
+    '''
+    count = max(1, min(count, framecount))
+    length = framecount / float(count)
+    if tolerance is None:
+        tolerance = length / 4
+    boundaries = sorted(set(b for b in boundaries if 0 < b < framecount))
+    points = []
+    for i in range(1, count):
+        point = int(round(i * length))
+        if boundaries:
+            nearest = min(boundaries, key=lambda b: abs(b - point))
+            if abs(nearest - point) <= tolerance:
+                point = nearest
+        if point > (points[-1] if points else 0) and point < framecount:
+            points.append(point)
+    starts = [0] + points
+    ends = points + [framecount]
+    return [(first, end - 1) for first, end in zip(starts, ends)]
+
+def DetectSceneChanges(script, framecount, count, window=SCENE_WINDOW, library_dir='',
+                       options=None):
+    '''Return the frame with the largest change of brightness around each
+    even split point, from the per frame plane averages of render.py'''
+    import render
+    length = framecount / float(max(1, count))
+    frames = set()
+    windows = []
+    for i in range(1, count):
+        point = int(round(i * length))
+        frames_window = range(max(1, point - window // 2), min(framecount, point + window // 2))
+        windows.append(frames_window)
+        for frame in frames_window:
+            frames.update((frame - 1, frame))
+    if not windows:
+        return []
+    handle, statsname = tempfile.mkstemp(suffix='.jsonl')
+    os.close(handle)
+    try:
+        job = dict(action='stats', script=script, frame_list=sorted(frames),
+                   output=render.EscapeOutput(statsname))
+        if render.Render([job], 1, library_dir, options)[0] is None:
+            return []
+        brightness = {}
+        with open(statsname, 'rb') as f:
+            for line in f:
+                stats = json.loads(line)
+                planes = stats['planes']
+                brightness[stats['frame']] = sum(plane[2] for plane in planes) / len(planes)
+    finally:
+        os.remove(statsname)
+    boundaries = []
+    for frames_window in windows:
+        changes = [(abs(brightness[frame] - brightness[frame - 1]), frame)
+                   for frame in frames_window if frame in brightness and frame - 1 in brightness]
+        if changes:
+            boundaries.append(max(changes)[1])
+    return boundaries
+
+def Concatenate(filenames, outputname):
+    '''Join elementary stream chunks losslessly'''
+    with open(outputname, 'wb') as output:
+        for filename in filenames:
+            with open(filename, 'rb') as f:
+                shutil.copyfileobj(f, output, 1024 * 1024)
+
+def LoadIndex(outputname):
+    '''Return the chunk index of a previous incremental encode, None if missing
+
+    The index has the encoder 'command', the 'framecount' and a list of
+    'chunks', each one with its 'frames' range, 'output' and frame 'hashes'.
+    '''
+    try:
+        with open(outputname + INDEX_SUFFIX, 'rb') as f:
+            index = json.load(f)
+    except (IOError, ValueError):
+        return None
+    if not isinstance(index, dict) or 'chunks' not in index:
+        return None
+    return index
+
+def SaveIndex(outputname, command, framecount, chunks):
+    index = dict(command=command, framecount=framecount,
+                 chunks=[dict(frames=chunk['frames'], output=chunk['output'],
+                              hashes=chunk['hashes']) for chunk in chunks])
+    with open(outputname + INDEX_SUFFIX, 'wb') as f:
+        json.dump(index, f)
+
+def FindProgram(name):
+    for dirname in os.environ.get('PATH', '').split(os.pathsep):
+        for ext in ('', '.exe'):
+            path = os.path.join(dirname.strip('"'), name + ext)
+            if os.path.isfile(path):
+                return path
+    return None
+
+class ChunkedEncoder(object):
+    '''Encode the ranges of a script in parallel and join them
+
+    Every chunk is a render.py 'y4m' job: a worker process evaluates the
+    script with its own AviSynth environment and pipes the frames of the
+    range to an encoder instance.  Failed chunks are retried on their own up
+    to 'retries' times.  With a list of farm.py 'workers' the chunks are
+    distributed among them instead, the chunk files must then be on storage
+    shared with the workers.
+
+    An 'incremental' encode keeps the chunk files and the checksums of their
+    frames (see LoadIndex).  The next incremental encode with the same command
+    and ranges checks the frames of every chunk first and encodes again only
+    the chunks that changed.  Chunks start with a keyframe, so they can be
+    joined in any combination.  'notify' is called with the list of chunk dicts
+    (frames, status, progress, fps, attempts, message) on every update, and
+    'stopped' is polled to cancel the encode.
+    '''
+
+    def __init__(self, script, command, inputname, outputname, ranges, framerate=None,
+                 processes=None, retries=2, notify=None, stopped=None, workers=None,
+                 incremental=False):
+        self.script = script
+        self.command = command
+        self.incremental = incremental
+        self.outputname = outputname
+        self.framerate = framerate
+        self.processes = processes
+        self.retries = retries
+        self.notify = notify
+        self.stopped = stopped
+        self.workers = workers
+        encoder = EncoderName(command)
+        root, ext = os.path.splitext(outputname)
+        self.rawname = outputname if ext.lower() in RAW_OUTPUTS else root + RAW_EXTENSIONS.get(encoder, '.264')
+        self.chunks = []
+        for i, frames in enumerate(ranges):
+            chunkname = '%s.chunk%03i%s' % (root, i, RAW_EXTENSIONS.get(encoder, '.264'))
+            self.chunks.append(dict(frames=list(frames), output=chunkname, status='queued',
+                                    progress=0.0, fps=None, attempts=0, message='', hashes=None,
+                                    command=ChunkCommand(command, inputname, outputname, chunkname)))
+        index = LoadIndex(outputname) if incremental else None
+        if index is not None and index.get('command') == command:
+            previous = dict((tuple(chunk['frames']), chunk) for chunk in index['chunks'])
+            for chunk in self.chunks:
+                old = previous.get(tuple(chunk['frames']))
+                if (old and old['output'] == chunk['output'] and old.get('hashes') and
+                        os.path.isfile(chunk['output'])):
+                    chunk.update(status='checking', hashes=old['hashes'])
+
+    def Notify(self):
+        if self.notify is not None:
+            self.notify(self.chunks)
+
+    def RunJobs(self, chunks, jobs, finish):
+        '''Run a render.py job for each chunk, in local processes or on the workers
+
+        Updates the progress of the chunks and calls finish(chunk, event) on
+        their 'done' and 'error' events.  Return False if stopped.
+        '''
+        import render
+        if self.workers:
+            import farm
+            events = farm.DispatchEvents(jobs, self.workers, retries=0)
+        else:
+            options = {'errormessagefont': global_vars.options.get('errormessagefont')}
+            events = render.RenderEvents(jobs, self.processes,
+                                         global_vars.avisynth_library_dir, options)
+        try:
+            for event in events:
+                if self.stopped is not None and self.stopped():
+                    return False
+                if event['event'] == 'finished':
+                    break
+                chunk = chunks[event['job']]
+                if event['event'] == 'progress':
+                    chunk['progress'] = float(event['frame']) / max(1, event['total'])
+                    chunk['fps'] = event['fps']
+                elif event['event'] in ('done', 'error'):
+                    finish(chunk, event)
+                self.Notify()
+        finally:
+            events.close()
+        return True
+
+    def Check(self):
+        '''Find the chunks of the previous encode whose frames didn't change.
+        Return False if stopped'''
+        checking = [chunk for chunk in self.chunks if chunk['status'] == 'checking']
+        if not checking:
+            return True
+        jobs = [dict(action='hashes', script=self.script, frames=chunk['frames'],
+                     expect=chunk['hashes']) for chunk in checking]
+        def finish(chunk, event):
+            if event['event'] == 'done' and event['result']['changed'] is None:
+                chunk.update(status='kept', progress=1.0)
+            else:
+                chunk.update(status='queued', progress=0.0, hashes=None)
+        self.Notify()
+        if not self.RunJobs(checking, jobs, finish):
+            return False
+        for chunk in checking:
+            if chunk['status'] == 'checking':
+                chunk.update(status='queued', progress=0.0, hashes=None)
+        return True
+
+    def Run(self):
+        '''Encode all the chunks and join them.  Return an error message or None'''
+        import render
+        if not self.Check():
+            return _('Stopped')
+        while True:
+            pending = [chunk for chunk in self.chunks if chunk['status'] not in ('done', 'kept')
+                       and chunk['attempts'] <= self.retries]
+            if not pending:
+                break
+            jobs = []
+            for chunk in pending:
+                chunk.update(status='running', progress=0.0, fps=None, message='')
+                chunk['attempts'] += 1
+                jobs.append(dict(action='y4m', script=self.script, frames=chunk['frames'],
+                                 output='|' + render.EscapeOutput(chunk['command']), hashes=self.incremental))
+            def finish(chunk, event):
+                if event['event'] == 'done':
+                    chunk.update(status='done', progress=1.0, hashes=event['result'].get('hashes'))
+                else:
+                    chunk.update(status='failed', message=event['message'])
+            self.Notify()
+            if not self.RunJobs(pending, jobs, finish):
+                return _('Stopped')
+            for chunk in pending:
+                # Jobs lost by a crashed worker
+                if chunk['status'] == 'running':
+                    chunk.update(status='failed', message=_('No result'))
+        failed = [i for i, chunk in enumerate(self.chunks) if chunk['status'] not in ('done', 'kept')]
+        if failed:
+            chunk = self.chunks[failed[0]]
+            return _('Chunk %(index)i of %(count)i failed: %(message)s') % dict(
+                        index=failed[0] + 1, count=len(self.chunks), message=chunk['message'])
+        Concatenate([chunk['output'] for chunk in self.chunks], self.rawname)
+        if self.incremental:
+            SaveIndex(self.outputname, self.command, self.chunks[-1]['frames'][1] + 1,
+                      self.chunks)
+        else:
+            for chunk in self.chunks:
+                os.remove(chunk['output'])
+        if self.rawname != self.outputname:
+            return self.Mux()
+
+    def Mux(self):
+        '''Put the joined stream in the container of the output, with ffmpeg'''
+        ffmpeg = FindProgram('ffmpeg')
+        if ffmpeg is None:
+            return _('ffmpeg not found, the video was saved as %s') % self.rawname
+        args = [ffmpeg, '-y', '-loglevel', 'error']
+        if self.framerate:
+            args += ['-r', '%.6f' % self.framerate]
+        args += ['-i', self.rawname, '-c', 'copy', self.outputname]
+        if subprocess.call(args):
+            return _('Error muxing %s') % self.rawname
+        os.remove(self.rawname)
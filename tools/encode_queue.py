@@ -0,0 +1,588 @@
+import os
+import re
+import sys
+import time
+import signal
+import cPickle
+import threading
+import subprocess
+import wx
+
+import global_vars
+
+# Windows process priority classes and the equivalent Unix niceness
+PRIORITY_CLASSES = {
+    'low': 0x40, 'belownormal': 0x4000, 'normal': 0x20,
+    'abovenormal': 0x8000, 'high': 0x80, 'realtime': 0x100,
+}
+NICENESS = {'low': 19, 'belownormal': 10}
+# Minimum time between two progress notifications of a job (seconds)
+NOTIFY_INTERVAL = 0.5
+
+STATUS_LABELS = {
+    'queued': _('Queued'),
+    'running': _('Running'),
+    'done': _('Done'),
+    'failed': _('Failed'),
+    'stopped': _('Stopped'),
+    'checking': _('Checking'),
+    'kept': _('Unchanged'),
+}
+
+def ParseProgress(line, framecount=None):
+    '''Return the fraction done from a line of encoder output, None if unknown'''
+    # x264/x265: "[12.3%] 1234/10000 frames, ..."
+    match = re.search(r'\b(\d+)/(\d+) frames', line)
+    if match and int(match.group(2)):
+        return min(1.0, float(match.group(1)) / int(match.group(2)))
+    match = re.search(r'(\d+(?:\.\d+)?)%', line)
+    if match:
+        return min(1.0, float(match.group(1)) / 100)
+    # xvid_encraw: "  1234: key=...", ffmpeg: "frame= 1234 fps=..."
+    if framecount:
+        match = re.match(r'\s*(?:frame=\s*)?(\d+)(?::|\s+fps)', line)
+        if match:
+            return min(1.0, float(match.group(1)) / framecount)
+    return None
+
+def ParseFPS(line):
+    match = re.search(r'(\d+(?:\.\d+)?)\s*fps', line)
+    if match:
+        return float(match.group(1))
+    return None
+
+class EncodeQueue(object):
+    '''Persistent list of encoding jobs, run by up to 'slots' at the same time
+
+    A job is a dict with a name, a list of (command line, working directory)
+    run in order, the input and output files and its state.  Jobs run in
+    worker threads; 'notify' is called from them with the updated job.
+    '''
+
+    def __init__(self, filename, notify=None):
+        self.filename = filename
+        self.notify = notify
+        self.lock = threading.RLock()
+        self.jobs = []
+        self.slots = 1
+        self.running = False
+        self.closed = False
+        self.processes = {}
+        self.next_id = 1
+        self.Load()
+
+    def Load(self):
+        if not os.path.isfile(self.filename):
+            return
+        try:
+            f = open(self.filename, mode='rb')
+            data = cPickle.load(f)
+            f.close()
+        except (IOError, EOFError, cPickle.UnpicklingError):
+            return
+        self.jobs = data.get('jobs', [])
+        self.slots = data.get('slots', 1)
+        self.running = data.get('running', False)
+        for job in self.jobs:
+            # Jobs interrupted by closing the program start again
+            if job['status'] == 'running':
+                job.update(status='queued', progress=0.0, message=_('Interrupted'))
+            self.next_id = max(self.next_id, job['id'] + 1)
+
+    def Save(self):
+        with self.lock:
+            data = {'jobs': self.jobs, 'slots': self.slots, 'running': self.running}
+            f = open(self.filename, mode='wb')
+            cPickle.dump(data, f, protocol=0)
+            f.close()
+
+    def Notify(self, job=None):
+        if self.notify is not None:
+            self.notify(job)
+
+    def Add(self, name, commands, input='', output='', framecount=None, priority='normal',
+            chunks=None):
+        '''Queue a job.  'chunks' are the settings of a chunked encode, see _RunChunks'''
+        with self.lock:
+            job = dict(id=self.next_id, name=name, commands=list(commands), input=input,
+                       output=output, framecount=framecount, priority=priority,
+                       chunks=chunks, chunk_status=None,
+                       status='queued', progress=0.0, fps=None, message='', elapsed=0)
+            self.next_id += 1
+            self.jobs.append(job)
+            self.Save()
+        self.Notify()
+        self.Schedule()
+        return job
+
+    def Clone(self, job, input, output):
+        '''Queue a copy of a job for other input and output files'''
+        commands = []
+        for command, cwd in job['commands']:
+            if job['input']:
+                command = command.replace(job['input'], input)
+            if job['output']:
+                command = command.replace(job['output'], output)
+            commands.append((command, cwd))
+        chunks = job.get('chunks')
+        if chunks:
+            chunks = dict(chunks, boundaries=[],
+                          command=chunks['command'].replace(job['input'], input)
+                                                   .replace(job['output'], output))
+            if chunks['split'] == 'bookmarks':
+                chunks['split'] = 'even'
+        return self.Add(os.path.basename(input), commands, input, output, None, job['priority'],
+                        chunks)
+
+    def Start(self):
+        self.running = True
+        self.Save()
+        self.Schedule()
+
+    def Pause(self):
+        '''Don't start more jobs, the running ones continue'''
+        self.running = False
+        self.Save()
+        self.Notify()
+
+    def SetSlots(self, slots):
+        self.slots = max(1, slots)
+        self.Save()
+        self.Schedule()
+
+    def Schedule(self):
+        '''Start queued jobs while there are free slots'''
+        with self.lock:
+            if not self.running or self.closed:
+                return
+            active = len([job for job in self.jobs if job['status'] == 'running'])
+            for job in self.jobs:
+                if active >= self.slots:
+                    break
+                if job['status'] == 'queued':
+                    job.update(status='running', progress=0.0, fps=None, message='')
+                    thread = threading.Thread(target=self._Run, args=(job,),
+                                              name='EncodeJob')
+                    thread.daemon = True
+                    thread.start()
+                    active += 1
+            self.Save()
+        self.Notify()
+
+    def _Popen(self, command, cwd, priority):
+        kwargs = dict(shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                      stderr=subprocess.STDOUT, cwd=cwd or None)
+        if os.name == 'nt':
+            kwargs['creationflags'] = PRIORITY_CLASSES.get(priority, 0)
+        else:
+            niceness = NICENESS.get(priority, 0)
+            def preexec():
+                # New process group, to stop the encoder and not only the shell
+                os.setsid()
+                if niceness:
+                    os.nice(niceness)
+            kwargs['preexec_fn'] = preexec
+        if isinstance(command, unicode):
+            command = command.encode(sys.getfilesystemencoding())
+        return subprocess.Popen(command, **kwargs)
+
+    def _Run(self, job):
+        '''Run the commands of a job in order, in a worker thread'''
+        if job.get('chunks'):
+            return self._RunChunks(job)
+        start = time.time()
+        count = len(job['commands'])
+        error = None
+        for i, (command, cwd) in enumerate(job['commands']):
+            try:
+                process = self._Popen(command, cwd, job['priority'])
+            except OSError as err:
+                error = unicode(err)
+                break
+            process.stdin.close()
+            with self.lock:
+                if job['status'] != 'running':
+                    self._Kill(process)
+                    break
+                self.processes[job['id']] = process
+            last = 0
+            pending = ''
+            while True:
+                data = os.read(process.stdout.fileno(), 4096)
+                if not data:
+                    break
+                # Encoders rewrite their progress line with carriage returns
+                lines = re.split(r'[\r\n]+', pending + data)
+                pending = lines.pop()
+                for line in lines:
+                    fraction = ParseProgress(line, job['framecount'])
+                    if fraction is not None:
+                        job['progress'] = (i + fraction) / count
+                        job['fps'] = ParseFPS(line)
+                    elif line.strip():
+                        job['message'] = line.strip()
+                now = time.time()
+                if now - last >= NOTIFY_INTERVAL:
+                    last = now
+                    job['elapsed'] = now - start
+                    self.Notify(job)
+            returncode = process.wait()
+            with self.lock:
+                self.processes.pop(job['id'], None)
+            if job['status'] != 'running':
+                break
+            if returncode:
+                error = _('Command %(index)i of %(count)i returned %(code)i') % dict(
+                            index=i + 1, count=count, code=returncode)
+                if job['message']:
+                    error += ': ' + job['message']
+                break
+        self._Finish(job, start, error)
+
+    def _RunChunks(self, job):
+        '''Encode ranges of the input in parallel and join them, in a worker thread
+
+        The 'chunks' settings of the job are: the encoder 'command' (a single
+        pass reading job['input'] and writing job['output']), the number of
+        chunks 'count', 'split' ('even', 'bookmarks' or 'scenes'), the
+        bookmark 'boundaries', 'processes', 'retries', 'framerate', the
+        addresses of the render 'workers' to use instead of local processes and
+        'incremental', to keep the chunks and encode again only those that
+        changed.  An incremental encode of a clip with the same length reuses
+        the ranges of the previous one.
+        '''
+        import render
+        import farm
+        import encode_chunks
+        settings = job['chunks']
+        start = time.time()
+        last = [0]
+
+        def notify(chunks):
+            frames = [chunk['frames'][1] - chunk['frames'][0] + 1 for chunk in chunks]
+            job['chunk_status'] = [(chunk['frames'], chunk['status'], chunk['progress'],
+                                    chunk['fps'], chunk['attempts']) for chunk in chunks]
+            job['progress'] = (sum(n * chunk['progress'] for n, chunk in zip(frames, chunks)) /
+                               float(sum(frames)))
+            job['fps'] = sum(chunk['fps'] or 0 for chunk in chunks
+                             if chunk['status'] == 'running') or None
+            now = time.time()
+            if now - last[0] >= NOTIFY_INTERVAL:
+                last[0] = now
+                job['elapsed'] = now - start
+                self.Notify(job)
+
+        try:
+            framecount = job['framecount']
+            if not framecount:
+                info = render.Render([dict(action='info', script=job['input'])], 1,
+                                     global_vars.avisynth_library_dir)[0]
+                if info is None:
+                    raise encode_chunks.ChunkError(_('Error loading %s') % job['input'])
+                framecount = info['Framecount']
+            boundaries = settings.get('boundaries') or []
+            index = None
+            if settings.get('incremental'):
+                index = encode_chunks.LoadIndex(job['output'])
+                if (index is None or index.get('command') != settings['command'] or
+                        index.get('framecount') != framecount):
+                    index = None
+            if index is not None:
+                ranges = [chunk['frames'] for chunk in index['chunks']]
+            elif settings['split'] == 'scenes':
+                job['message'] = _('Detecting scene changes...')
+                self.Notify(job)
+                boundaries = encode_chunks.DetectSceneChanges(
+                    job['input'], framecount, settings['count'],
+                    library_dir=global_vars.avisynth_library_dir)
+                job['message'] = ''
+            if index is None:
+                ranges = encode_chunks.SplitRange(framecount, settings['count'], boundaries)
+            encoder = encode_chunks.ChunkedEncoder(
+                job['input'], settings['command'], job['input'], job['output'], ranges,
+                settings.get('framerate'), settings['processes'], settings['retries'],
+                notify, lambda: job['status'] != 'running', settings.get('workers'),
+                settings.get('incremental', False))
+            error = encoder.Run()
+        except (encode_chunks.ChunkError, farm.FarmError, EnvironmentError) as err:
+            error = unicode(err)
+        self._Finish(job, start, error)
+
+    def _Finish(self, job, start, error=None):
+        with self.lock:
+            job['elapsed'] = time.time() - start
+            if job['status'] == 'running':
+                if error is None:
+                    job.update(status='done', progress=1.0, message='')
+                else:
+                    job.update(status='failed', message=error)
+            self.Save()
+        self.Schedule()
+
+    def _Kill(self, process):
+        try:
+            if os.name == 'nt':
+                subprocess.call('taskkill /F /T /PID %i' % process.pid, shell=True)
+            else:
+                os.killpg(process.pid, signal.SIGTERM)
+        except OSError:
+            pass
+
+    def Stop(self, job):
+        with self.lock:
+            if job['status'] == 'queued':
+                job['status'] = 'stopped'
+            elif job['status'] == 'running':
+                job['status'] = 'stopped'
+                process = self.processes.get(job['id'])
+                if process is not None:
+                    self._Kill(process)
+            self.Save()
+        self.Notify()
+
+    def Retry(self, job):
+        with self.lock:
+            if job['status'] != 'running':
+                job.update(status='queued', progress=0.0, fps=None, message='')
+            self.Save()
+        self.Notify()
+        self.Schedule()
+
+    def Remove(self, job):
+        with self.lock:
+            if job['status'] == 'running':
+                return False
+            self.jobs.remove(job)
+            self.Save()
+        self.Notify()
+        return True
+
+    def Move(self, job, offset):
+        with self.lock:
+            index = self.jobs.index(job)
+            new_index = min(max(index + offset, 0), len(self.jobs) - 1)
+            self.jobs.insert(new_index, self.jobs.pop(index))
+            self.Save()
+        self.Notify()
+
+    def ClearFinished(self):
+        with self.lock:
+            self.jobs = [job for job in self.jobs if job['status'] not in ('done', 'stopped')]
+            self.Save()
+        self.Notify()
+
+    def Shutdown(self):
+        '''Stop the running jobs, they are queued again on the next start'''
+        with self.lock:
+            for job in self.jobs:
+                if job['status'] == 'running':
+                    process = self.processes.get(job['id'])
+                    if process is not None:
+                        self._Kill(process)
+                    job.update(status='queued', progress=0.0, message=_('Interrupted'))
+            self.notify = None
+            self.closed = True
+            self.Save()
+
+class EncodeQueueFrame(wx.Frame):
+    '''Window managing the encode queue, kept while the program runs'''
+
+    def __init__(self, parent):
+        wx.Frame.__init__(self, parent, wx.ID_ANY, _('Encode queue'), size=(700, 350))
+        self.queue = EncodeQueue(QueueFilename(parent), self.OnQueueNotify)
+        self.updatePending = False
+        self.CreateInterface()
+        self.UpdateList()
+        self.Bind(wx.EVT_CLOSE, self.OnClose)
+        self.Bind(wx.EVT_WINDOW_DESTROY, self.OnDestroy)
+        # Resume the queue if it was running when the program was closed
+        if self.queue.running:
+            self.queue.Schedule()
+
+    def CreateInterface(self):
+        panel = wx.Panel(self, wx.ID_ANY)
+        self.listCtrl = wx.ListCtrl(panel, wx.ID_ANY, style=wx.LC_REPORT|wx.LC_SINGLE_SEL)
+        for col, (label, width) in enumerate((
+                (_('Job'), 160), (_('Status'), 80), (_('Progress'), 130), (_('Output'), 300))):
+            self.listCtrl.InsertColumn(col, label, width=width)
+        self.listCtrl.Bind(wx.EVT_LIST_ITEM_SELECTED, self.OnSelectJob)
+        buttonSizer = wx.BoxSizer(wx.HORIZONTAL)
+        self.startButton = wx.Button(panel, wx.ID_ANY, _('Start'))
+        self.Bind(wx.EVT_BUTTON, self.OnButtonStart, self.startButton)
+        buttonSizer.Add(self.startButton, 0, wx.RIGHT, 5)
+        for label, handler in (
+                (_('Stop'), self.OnButtonStop),
+                (_('Retry'), self.OnButtonRetry),
+                (_('Remove'), self.OnButtonRemove),
+                (_('Move up'), lambda event: self.MoveSelected(-1)),
+                (_('Move down'), lambda event: self.MoveSelected(1)),
+                (_('Clear finished'), lambda event: self.queue.ClearFinished()),
+                (_('Add scripts...'), self.OnButtonAddScripts),
+            ):
+            button = wx.Button(panel, wx.ID_ANY, label)
+            self.Bind(wx.EVT_BUTTON, handler, button)
+            buttonSizer.Add(button, 0, wx.RIGHT, 5)
+        slotsSizer = wx.BoxSizer(wx.HORIZONTAL)
+        staticText = wx.StaticText(panel, wx.ID_ANY, _('Concurrent jobs:'))
+        self.slotsCtrl = wx.SpinCtrl(panel, wx.ID_ANY, size=(50, -1), min=1, max=64,
+                                     initial=self.queue.slots)
+        self.slotsCtrl.Bind(wx.EVT_SPINCTRL, self.OnSpinSlots)
+        self.slotsCtrl.Bind(wx.EVT_TEXT, self.OnSpinSlots)
+        self.messageText = wx.TextCtrl(panel, wx.ID_ANY, '', size=(-1, 80),
+                                       style=wx.TE_MULTILINE|wx.TE_READONLY|wx.TE_DONTWRAP)
+        slotsSizer.Add(staticText, 0, wx.ALIGN_CENTER_VERTICAL|wx.RIGHT, 5)
+        slotsSizer.Add(self.slotsCtrl, 0, wx.RIGHT, 15)
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(self.listCtrl, 1, wx.EXPAND|wx.ALL, 5)
+        sizer.Add(self.messageText, 0, wx.EXPAND|wx.LEFT|wx.RIGHT|wx.BOTTOM, 5)
+        sizer.Add(slotsSizer, 0, wx.EXPAND|wx.LEFT|wx.RIGHT, 5)
+        sizer.Add(buttonSizer, 0, wx.ALL, 5)
+        panel.SetSizer(sizer)
+
+    def OnQueueNotify(self, job=None):
+        # Called from the worker threads, coalesce the updates
+        if not self.updatePending:
+            self.updatePending = True
+            wx.CallAfter(self.UpdateList)
+
+    def UpdateList(self):
+        self.updatePending = False
+        if not self:
+            return
+        jobs = self.queue.jobs[:]
+        selected = self.GetSelectedJob()
+        if self.listCtrl.GetItemCount() != len(jobs):
+            self.listCtrl.DeleteAllItems()
+            for i in range(len(jobs)):
+                self.listCtrl.InsertStringItem(i, '')
+        for i, job in enumerate(jobs):
+            progress = ''
+            if job['status'] == 'running' or job['progress']:
+                progress = '%.1f%%' % (job['progress'] * 100)
+                if job['status'] == 'running' and job['fps']:
+                    progress += '  (%.2f fps)' % job['fps']
+            for col, text in enumerate((job['name'], STATUS_LABELS[job['status']],
+                                        progress, job['output'])):
+                self.listCtrl.SetStringItem(i, col, text)
+            if job is selected:
+                self.listCtrl.SetItemState(i, wx.LIST_STATE_SELECTED, wx.LIST_STATE_SELECTED)
+        self.startButton.SetLabel(_('Pause') if self.queue.running else _('Start'))
+        running = len([job for job in jobs if job['status'] == 'running'])
+        queued = len([job for job in jobs if job['status'] == 'queued'])
+        self.SetTitle(_('Encode queue') + ' - ' +
+                      _('%(running)i running, %(queued)i queued') % locals())
+        self.ShowJobMessage(self.GetSelectedJob())
+
+    def ShowJobMessage(self, job):
+        '''Show the last message of a job and the state of its chunks'''
+        lines = []
+        if job is not None:
+            if job['message']:
+                lines.append(job['message'])
+            for i, (frames, status, progress, fps, attempts) in enumerate(job.get('chunk_status') or ()):
+                line = _('Chunk %(index)i [%(first)i-%(last)i]: %(status)s') % dict(
+                           index=i + 1, first=frames[0], last=frames[1],
+                           status=STATUS_LABELS.get(status, status))
+                if status in ('running', 'checking'):
+                    line += '  %.1f%%' % (progress * 100)
+                    if fps:
+                        line += '  (%.2f fps)' % fps
+                if attempts > 1:
+                    line += '  ' + _('attempt %i') % attempts
+                lines.append(line)
+        text = '\n'.join(lines)
+        if text != self.messageText.GetValue():
+            self.messageText.SetValue(text)
+
+    def GetSelectedJob(self):
+        index = self.listCtrl.GetFirstSelected()
+        if 0 <= index < len(self.queue.jobs):
+            return self.queue.jobs[index]
+        return None
+
+    def MoveSelected(self, offset):
+        job = self.GetSelectedJob()
+        if job is not None:
+            self.queue.Move(job, offset)
+
+    def OnSelectJob(self, event):
+        self.ShowJobMessage(self.GetSelectedJob())
+
+    def OnButtonStart(self, event):
+        if self.queue.running:
+            self.queue.Pause()
+        else:
+            self.queue.Start()
+
+    def OnButtonStop(self, event):
+        job = self.GetSelectedJob()
+        if job is not None:
+            self.queue.Stop(job)
+
+    def OnButtonRetry(self, event):
+        job = self.GetSelectedJob()
+        if job is not None:
+            self.queue.Retry(job)
+
+    def OnButtonRemove(self, event):
+        job = self.GetSelectedJob()
+        if job is not None and not self.queue.Remove(job):
+            wx.MessageBox(_('Stop the job before removing it'), _('Error'),
+                          style=wx.OK|wx.ICON_ERROR)
+
+    def OnButtonAddScripts(self, event):
+        job = self.GetSelectedJob()
+        if job is None or not job['input']:
+            wx.MessageBox(_('Select a job to use as template for the new scripts'),
+                          _('Error'), style=wx.OK|wx.ICON_ERROR)
+            return
+        title = _('Open AviSynth scripts')
+        filefilter = _('AviSynth script') + ' (*.avs, *.avsi)|*.avs;*.avsi'
+        dlg = wx.FileDialog(self, title, os.path.dirname(job['input']), '', filefilter,
+                            wx.OPEN|wx.MULTIPLE)
+        if dlg.ShowModal() == wx.ID_OK:
+            ext = os.path.splitext(job['output'])[1]
+            for filename in dlg.GetPaths():
+                self.queue.Clone(job, filename, os.path.splitext(filename)[0] + ext)
+        dlg.Destroy()
+
+    def OnSpinSlots(self, event):
+        self.queue.SetSlots(self.slotsCtrl.GetValue())
+
+    def OnClose(self, event):
+        # Only hide the window, the jobs keep running
+        self.Hide()
+
+    def OnDestroy(self, event):
+        if event.GetEventObject() is self:
+            self.queue.Shutdown()
+        event.Skip()
+
+_queueFrame = None
+
+def QueueFilename(parent):
+    return os.path.join(parent.toolsfolder, __name__ + '.dat')
+
+def GetQueueFrame(parent):
+    '''Return the encode queue window of the program, creating it if needed'''
+    global _queueFrame
+    if not _queueFrame:
+        _queueFrame = EncodeQueueFrame(parent)
+    return _queueFrame
+
+def ResumeQueue(parent):
+    '''Load the queue saved when the program was closed if it was running or
+    has jobs queued, without showing its window
+
+    A running queue goes on with its jobs, the interrupted ones included.
+    '''
+    if _queueFrame or not os.path.isfile(QueueFilename(parent)):
+        return
+    queue = EncodeQueue(QueueFilename(parent))
+    if queue.running or [job for job in queue.jobs if job['status'] == 'queued']:
+        GetQueueFrame(parent)
+
+def avsp_run():
+    frame = GetQueueFrame(avsp.GetWindow())
+    frame.Show()
+    frame.Raise()
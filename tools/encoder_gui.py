@@ -2,12 +2,13 @@ import string
 import re
 import os
 import os.path
-import stat
 import sys
 import subprocess
 import cPickle
 import wx
 import MP3Info
+import encode_queue
+import encode_chunks
 
 class CompressVideoDialog(wx.Dialog):
     def __init__(self, parent, inputname='', framecount=None, framerate=None):
@@ -46,6 +47,11 @@ class CompressVideoDialog(wx.Dialog):
         self.options['audio_compress'] = self.bitrateDialog.ctrlDict['audio_compress'].GetValue()
         self.options['audio_bitrate'] = self.bitrateDialog.ctrlDict['audio_bitrate'].GetValue()
         self.options['audio_format'] = self.bitrateDialog.ctrlDict['audio_format'].GetStringSelection()
+        self.options['chunks'] = self.ctrlDict['chunks'].GetValue()
+        self.options['chunk_processes'] = self.ctrlDict['chunk_processes'].GetValue()
+        self.options['chunk_split'] = self.chunkSplitChoices[self.ctrlDict['chunk_split'].GetSelection()][0]
+        self.options['chunk_workers'] = self.ctrlDict['chunk_workers'].GetValue().strip()
+        self.options['chunk_incremental'] = self.ctrlDict['chunk_incremental'].GetValue()
         # Delete unused exe options
         deleteList = []
         for exeName, exeDict in self.options['exe_options'].items():
@@ -147,11 +153,51 @@ class CompressVideoDialog(wx.Dialog):
         sizer3.Add(wx.StaticText(self, wx.ID_ANY, ':'), 0, wx.ALIGN_CENTER_VERTICAL|wx.LEFT|wx.RIGHT, 5)
         sizer3.Add(textCtrl2, 0, wx.ALL, 0)
         sizer3.Add(button, 0, wx.LEFT, 5)
+        # Chunked encoding, 0 chunks to encode the whole script in one instance
+        staticTextChunks = wx.StaticText(self, wx.ID_ANY, _('Parallel chunks:'))
+        spinCtrlChunks = wx.SpinCtrl(self, size=(50,-1), min=0, max=256)
+        spinCtrlChunks.SetToolTipString(_('Split the script in this number of chunks, encoded '
+            'at the same time by separate processes and joined at the end. 0 to disable'))
+        self.ctrlDict['chunks'] = spinCtrlChunks
+        spinCtrlProcesses = wx.SpinCtrl(self, size=(50,-1), min=0, max=64)
+        spinCtrlProcesses.SetToolTipString(_('Maximum number of chunks encoded at the same '
+                                             'time. 0 for the number of CPUs'))
+        self.ctrlDict['chunk_processes'] = spinCtrlProcesses
+        staticTextSplit = wx.StaticText(self, wx.ID_ANY, _('Split at:'))
+        self.chunkSplitChoices = (('even', _('Even lengths')), ('bookmarks', _('Bookmarks')),
+                                  ('scenes', _('Scene changes')))
+        choiceSplit = wx.Choice(self, wx.ID_ANY, choices=[label for key, label in self.chunkSplitChoices])
+        self.ctrlDict['chunk_split'] = choiceSplit
+        checkBoxIncremental = wx.CheckBox(self, wx.ID_ANY, _('Incremental'))
+        checkBoxIncremental.SetToolTipString(_('Keep the chunks and the checksums of their '
+            'frames. The next encode to the same output only encodes again the chunks whose '
+            'frames changed. More chunks make touch-up encodes faster'))
+        self.ctrlDict['chunk_incremental'] = checkBoxIncremental
+        sizer5 = wx.BoxSizer(wx.HORIZONTAL)
+        sizer5.Add(choiceSplit, 0, wx.ALL, 0)
+        sizer5.Add(checkBoxIncremental, 0, wx.ALIGN_CENTER_VERTICAL|wx.LEFT, 10)
+        staticTextWorkers = wx.StaticText(self, wx.ID_ANY, _('Render workers:'))
+        textCtrlWorkers = wx.TextCtrl(self, size=(150, -1))
+        textCtrlWorkers.SetToolTipString(_('Comma-separated addresses (host:port) of farm.py '
+            'workers to encode the chunks on other machines. The encoder and the script '
+            'sources must be found at the same paths by the workers, started with '
+            '--allow-commands and the secret of the AVSP_FARM_SECRET environment variable'))
+        self.ctrlDict['chunk_workers'] = textCtrlWorkers
+        sizer4 = wx.BoxSizer(wx.HORIZONTAL)
+        sizer4.Add(spinCtrlChunks, 0, wx.ALL, 0)
+        sizer4.Add(wx.StaticText(self, wx.ID_ANY, _('processes:')), 0, wx.ALIGN_CENTER_VERTICAL|wx.LEFT|wx.RIGHT, 5)
+        sizer4.Add(spinCtrlProcesses, 0, wx.ALL, 0)
         gridsizer = wx.GridBagSizer(hgap=5, vgap=10)
         gridsizer.Add(staticTextCredits, pos=(0,0), flag=wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
         gridsizer.Add(staticTextPAR, pos=(1,0), flag=wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
         gridsizer.Add(textCtrl, pos=(0,1))
         gridsizer.Add(sizer3, pos=(1,1))
+        gridsizer.Add(staticTextChunks, pos=(2,0), flag=wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
+        gridsizer.Add(sizer4, pos=(2,1))
+        gridsizer.Add(staticTextSplit, pos=(3,0), flag=wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
+        gridsizer.Add(sizer5, pos=(3,1))
+        gridsizer.Add(staticTextWorkers, pos=(4,0), flag=wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
+        gridsizer.Add(textCtrlWorkers, pos=(4,1))
         sizer_CompressionB.Add(gridsizer, 0, wx.ALL, 5)
         sizer_Compression.Add(sizer_CompressionA, 1, wx.ALIGN_CENTER|wx.EXPAND|wx.RIGHT, 5)
         sizer_Compression.Add(sizer_CompressionB, 0, wx.EXPAND|wx.ALL, 0)
@@ -175,12 +221,17 @@ class CompressVideoDialog(wx.Dialog):
         # Run
         button = wx.Button(self, wx.ID_ANY, _('Run'))
         self.Bind(wx.EVT_BUTTON, self.OnButtonRun, button)
+        queueButton = wx.Button(self, wx.ID_ANY, _('Add to queue'))
+        self.Bind(wx.EVT_BUTTON, self.OnButtonQueue, queueButton)
+        runSizer = wx.BoxSizer(wx.HORIZONTAL)
+        runSizer.Add(button, 0, wx.RIGHT, 10)
+        runSizer.Add(queueButton, 0)
         # Total
         dlgSizer = wx.BoxSizer(wx.VERTICAL)
         dlgSizer.Add(sizer_System, 0, wx.EXPAND|wx.ALL, 5)
         dlgSizer.Add(sizer_Compression, 0, wx.EXPAND|wx.LEFT|wx.RIGHT, 5)
         dlgSizer.Add(sizer_Command_line, 0, wx.EXPAND|wx.ALL, 5)
-        dlgSizer.Add(button, 0, wx.ALIGN_CENTER|wx.ALL, 10)
+        dlgSizer.Add(runSizer, 0, wx.ALIGN_CENTER|wx.ALL, 10)
         self.SetSizer(dlgSizer)
         dlgSizer.Fit(self)
 
@@ -265,6 +316,13 @@ class CompressVideoDialog(wx.Dialog):
         self.ctrlDict['credits_frame'].SetValue(str(self.framecount-1))
         self.ctrlDict['par_x'].SetValue('1')
         self.ctrlDict['par_y'].SetValue('1')
+        self.ctrlDict['chunks'].SetValue(self.options.setdefault('chunks', 0))
+        self.ctrlDict['chunk_processes'].SetValue(self.options.setdefault('chunk_processes', 0))
+        split = self.options.setdefault('chunk_split', 'scenes')
+        self.ctrlDict['chunk_split'].SetSelection(
+            [key for key, label in self.chunkSplitChoices].index(split))
+        self.ctrlDict['chunk_workers'].SetValue(self.options.setdefault('chunk_workers', ''))
+        self.ctrlDict['chunk_incremental'].SetValue(self.options.setdefault('chunk_incremental', False))
         self.SetDefaultValuesBitrateCalc()
         bitrate = self.bitrateDialog.ComputeBitrate()
         boolAudio = self.bitrateDialog.ctrlDict['audio_input'].GetValue().strip() != '' or self.bitrateDialog.ctrlDict['audio_compress'].GetValue()
@@ -572,7 +630,8 @@ class CompressVideoDialog(wx.Dialog):
     def OnButtonConfigure(self, event):
         self.ConfigureOptions()
 
-    def OnButtonRun(self, event):
+    def GetCommands(self):
+        '''Return the list of (command line, working directory) to run, None on errors'''
         unknownPathKeys = []
         commandline = self.ctrlDict['commandline'].GetValue().strip()
         unreplacedList = re.findall(r'\$.+?\b', commandline.replace('$$', ''))
@@ -581,12 +640,12 @@ class CompressVideoDialog(wx.Dialog):
             s2 = '\n'.join(unreplacedList)
             wx.MessageBox('%s\n\n%s' % (s1, s2), _('Error'), style=wx.OK|wx.ICON_ERROR)
             return
-        if os.name == 'nt':
-            lines = ['@echo off\n']
-            startline = 'start /%s /b /w' % self.options['priority']
-            for s in commandline.split('\n'):
-                s2 = s.split(None, 1)
-                key = s2[0].lower()
+        commands = []
+        for s in commandline.split('\n'):
+            s2 = s.split(None, 1)
+            key = s2[0].lower()
+            args = s2[1] if len(s2) == 2 else ''
+            if os.name == 'nt':
                 if key.endswith('.exe'):
                     try:
                         path = self.options['exe_options'][key]['path']
@@ -595,53 +654,76 @@ class CompressVideoDialog(wx.Dialog):
                     except KeyError:
                         path = key
                         unknownPathKeys.append(key)
-                    dirname, exename = os.path.split(path)
-                    if len(s2) == 2:
-                        lines.append('%s /d "%s" %s %s\n' % (startline, dirname, exename, s2[1]))
-                    else:
-                        lines.append('%s /d "%s" %s\n' % (startline, dirname, exename))
+                    # Run from the exe directory, like 'start /d' did
+                    commands.append(('"%s" %s' % (path, args), os.path.dirname(path)))
                 else:
-                    lines.append('%s %s\n' % (startline, s))
-        else:
-            lines = []
-            ret = 'if [ "$?" -ne "0" ]\nthen\n  exit\nfi\n'
-            for s in commandline.split('\n'):
-                s2 = s.split(None, 1)
-                key = s2[0].lower()
+                    commands.append((s, None))
+            else:
                 if key.endswith('.exe'):
                     key = key[:-4]
-                args = s2[1].replace('NUL ', '/dev/null ')  
-                lines.append('"%s" %s\n%s' % (key, args, ret))
+                args = args.replace('NUL ', '/dev/null ')
+                commands.append(('"%s" %s' % (key, args), None))
         if unknownPathKeys != []:
             wx.MessageBox(_('Unknown exe paths!'), _('Error'), style=wx.OK|wx.ICON_ERROR)
             return
-        else:
-            batchname = os.path.join(self.GetParent().toolsfolder, 
-                                     'encode' + ('.bat' if os.name == 'nt' else '.sh'))
-            f = open(batchname, 'w')
-            for line in lines:
-                if type(line) == unicode:
-                    line = line.encode(sys.getfilesystemencoding())
-                f.write(line)
-            f.close()
-            if self.options['append_comments']:
-                avsname = self.ctrlDict['video_input'].GetValue()
-                if os.path.isfile(avsname) and os.path.splitext(avsname)[1] == '.avs':
-                    #~ f = open(avsname, 'a')
-                    #~ f.write('\n\n')
-                    #~ for line in lines:
-                        #~ f.write('#~ %s' % line)
-                    #~ f.close()
-                    avsp.InsertText('\n\n')
-                    for line in lines:
-                        avsp.InsertText('#~ %s' % line)
-                    avsp.SaveScript(avsname)
-            #~ os.startfile(batchname)
-            if os.name == 'nt':
-                os.system('start "AvsP encoding" "%s"' % batchname.encode(sys.getfilesystemencoding()))
-            else:
-                os.chmod(batchname, os.stat(batchname).st_mode | stat.S_IXUSR)
-                os.system('"%s"' % batchname.encode(sys.getfilesystemencoding()))
+        return commands
+
+    def QueueJob(self):
+        '''Add the current settings to the encode queue, return the queue window'''
+        commands = self.GetCommands()
+        if commands is None:
+            return
+        if self.options['append_comments']:
+            avsname = self.ctrlDict['video_input'].GetValue()
+            if os.path.isfile(avsname) and os.path.splitext(avsname)[1] == '.avs':
+                avsp.InsertText('\n\n')
+                for command, cwd in commands:
+                    avsp.InsertText('#~ %s\n' % command)
+                avsp.SaveScript(avsname)
+        inputname = self.ctrlDict['video_input'].GetValue().strip()
+        outputname = self.ctrlDict['video_output'].GetValue().strip()
+        chunks = self.GetChunkSettings(commands, inputname, outputname)
+        if chunks is False:
+            return
+        queueFrame = encode_queue.GetQueueFrame(self.GetParent())
+        queueFrame.queue.Add(os.path.basename(inputname), commands, inputname, outputname,
+                             self.framecount, self.options['priority'], chunks)
+        queueFrame.Show()
+        return queueFrame
+
+    def GetChunkSettings(self, commands, inputname, outputname):
+        '''Return the settings of a chunked encode, None if disabled, False on errors'''
+        count = self.ctrlDict['chunks'].GetValue()
+        if not count:
+            return None
+        try:
+            if len(commands) != 1:
+                raise encode_chunks.ChunkError(_('Chunked encoding requires a single pass preset'))
+            # Check that the command line can be adapted
+            encode_chunks.ChunkCommand(commands[0][0], inputname, outputname, outputname)
+        except encode_chunks.ChunkError as err:
+            wx.MessageBox(unicode(err), _('Error'), style=wx.OK|wx.ICON_ERROR)
+            return False
+        split = self.chunkSplitChoices[self.ctrlDict['chunk_split'].GetSelection()][0]
+        boundaries = []
+        if split == 'bookmarks':
+            boundaries = avsp.GetBookmarkList()
+        workers = [address.strip() for address in
+                   self.ctrlDict['chunk_workers'].GetValue().split(',') if address.strip()]
+        return dict(command=commands[0][0], count=count, split=split, boundaries=boundaries,
+                    processes=self.ctrlDict['chunk_processes'].GetValue() or None,
+                    retries=2, framerate=self.framerate, workers=workers,
+                    incremental=self.ctrlDict['chunk_incremental'].GetValue())
+
+    def OnButtonQueue(self, event):
+        # Keep the dialog open to queue other scripts or settings
+        self.QueueJob()
+
+    def OnButtonRun(self, event):
+        queueFrame = self.QueueJob()
+        if queueFrame is not None:
+            queueFrame.queue.Start()
+            queueFrame.Raise()
             self.Close()
 
     def OnButtonCalculate(self, event):
@@ -47,18 +47,7 @@ try:
 except:
     pass
     # or import threading??
-try:
-    from StringIO import StringIO
-except ImportError:
-    from io import StringIO # not 100% the same, ComvertError can occur
-    # Python 3: The StringIO and cStringIO modules are gone.
-    # Instead, import the io module and use io.StringIO or io.BytesIO for text and data respectively.
-
-try:
-    import cPickle # Python 2
-except ImportError:
-    import pickle as cPickle # Python 3
-
+import remote
 from icons import checked_icon, unchecked_icon
 
 OPT_ELEM_CHECK = 0
@@ -288,12 +277,10 @@ class SingleInstanceApp(wx.App):
             self.IsFirstInstance = False
             if self.boolSingleInstance:
                 # Send data to the main instance via socket
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.connect(('localhost', self.port))
-                pickledstring = StringIO.StringIO()
-                cPickle.dump(sys.argv[1:],pickledstring)
-                sock.sendall(pickledstring.getvalue())
-                response = sock.recv(8192)
+                client = remote.RemoteClient(('localhost', self.port))
+                client.Call('args', *[arg.decode(sys.getfilesystemencoding())
+                                      for arg in sys.argv[1:]])
+                client.Close()
             # Start the wx.App (typically check self.IsFirstInstance flag and return False)
             wx.App.__init__(self, *args, **kwargs)
         else:
@@ -314,8 +301,15 @@ class SingleInstanceApp(wx.App):
                 time.sleep(0.1)
 
 class ArgsPosterThread:
-    def __init__(self, app):
+    '''Server for other instances and remote control clients, see remote.py
+
+    The 'args' command posts a PostArgsEvent with the arguments and raises
+    the window.  Other commands are run by app.RemoteCommand(command, args)
+    if the app defines it.  Every connection is served by its own thread.
+    '''
+    def __init__(self, app, address=None):
         self.app = app
+        self.address = address or ('localhost', self.app.port)
         
     def Start(self):
         self.keepGoing = self.running = True
@@ -323,13 +317,34 @@ class ArgsPosterThread:
         
     def Stop(self):
         self.keepGoing = False
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect(('localhost', self.app.port))
-        sock.close()
+        try:
+            remote.Connect(self.address).close()
+        except remote.FarmError:
+            pass
         
     def IsRunning(self):
         return self.running
         
+    def RunCommand(self, command, args):
+        if command == 'args':
+            wx.PostEvent(self.app, PostArgsEvent(data=list(args)))
+            wx.CallAfter(self.RaiseApp)
+            return True
+        if hasattr(self.app, 'RemoteCommand'):
+            return self.app.RemoteCommand(command, args)
+        raise remote.RemoteError('Unknown command: {0}'.format(command))
+        
+    def RaiseApp(self):
+        if self.app.IsIconized():
+            self.app.Iconize(False)
+        else:
+            self.app.Raise()
+        if self.app.separatevideowindow and self.app.videoDialog.IsShown():
+            if self.app.videoDialog.IsIconized():
+                self.app.videoDialog.Iconize(False)
+            else:
+                self.app.videoDialog.Raise()
+
     def Run(self):
         
         # Prevent open sockets from being inherited by child processes
@@ -382,33 +397,21 @@ class ArgsPosterThread:
                 old_flags = fcntl.fcntl(fd, fcntl.F_GETFD)
                 fcntl.fcntl(fd, fcntl.F_SETFD, old_flags | fcntl.FD_CLOEXEC)
 
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock = remote.Listen(self.address)
+        except socket.error:
+            # Another program is using the address
+            self.running = False
+            return
         prevent_socket_inheritance(sock)
-        sock.bind(('localhost',self.app.port))
-        sock.listen(5)
         try:
             while self.keepGoing:
                 newSocket, address = sock.accept()
+                if not self.keepGoing:
+                    newSocket.close()
+                    break
                 prevent_socket_inheritance(newSocket)
-                while True:
-                    receivedData = newSocket.recv(8192)
-                    if not receivedData: break
-                    # Post a wxPython event with the unpickled data
-                    pickledstring = StringIO.StringIO(receivedData)
-                    unpickled = cPickle.load(pickledstring)
-                    evt = PostArgsEvent(data=unpickled)
-                    wx.PostEvent(self.app, evt)
-                    newSocket.sendall(receivedData)
-                newSocket.close()
-                if self.app.IsIconized():
-                    self.app.Iconize(False)
-                else:
-                    self.app.Raise()
-                if self.app.separatevideowindow and self.app.videoDialog.IsShown():
-                    if self.app.videoDialog.IsIconized():
-                        self.app.videoDialog.Iconize(False)
-                    else:
-                        self.app.videoDialog.Raise()
+                thread.start_new_thread(remote.ServeConnection, (newSocket, self.RunCommand))
         finally:
             sock.close()
         self.running = False